@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Выбор обработчика и разбор callback_data для 10 000 нажатий кнопок:
+прежняя цепочка if/elif со split, фильтры aiogram (Factory.filter() на каждом обработчике,
+перебор по порядку регистрации) и CallbackRouter (словарь по префиксу).
+
+Обработчики не вызываются, БД и Telegram не нужны:
+    python -m benchmarks.bench_callback_routing --callbacks 10000 --repeat 5
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from bot.callbacks import (MAIN_MENU, NEWS_CATEGORIES, SEARCH_NEWS, CallbackRouter, Category, MainMenu,
+                           NewsCategories, NewsNav, SearchMore, SearchPrompt, ShowPost)
+from utils.pagination import NAV_FORWARD, encode_cursor
+
+
+def handler(name):
+    async def handle(callback, data, state):
+        pass
+    handle.__name__ = name
+    return handle
+
+
+HANDLERS = {factory: handler(factory.__name__)
+            for factory in (MainMenu, NewsCategories, Category, NewsNav, SearchPrompt, SearchMore, ShowPost)}
+
+
+def make_callbacks(count: int, legacy: bool, rnd: random.Random):
+    """Смесь нажатий, похожая на живую: в основном листание новостей и открытие постов"""
+    started = datetime(2024, 1, 1)
+    result = []
+    for _ in range(count):
+        roll = rnd.random()
+        offset = rnd.randrange(0, 500, 5)
+        cursor = encode_cursor(started + timedelta(minutes=rnd.randrange(10 ** 6)), rnd.randrange(1, 10 ** 6))
+        key = f"{rnd.getrandbits(64):016x}"
+        if roll < 0.45:
+            result.append(f"news_nav:{key}:{offset}:{NAV_FORWARD}:{cursor}" if legacy
+                          else NewsNav(key=key, offset=offset, direction=NAV_FORWARD, cursor=cursor).pack())
+        elif roll < 0.65:
+            qr_id = f"peak{rnd.randrange(300)}"
+            result.append(f"show_post_{qr_id}" if legacy else ShowPost(qr_id=qr_id).pack())
+        elif roll < 0.80:
+            result.append(f"news_category:{key}" if legacy else Category(key=key).pack())
+        elif roll < 0.88:
+            search_cursor = f"t{rnd.getrandbits(32):08x}{rnd.randrange(10 ** 5):x}"
+            result.append(f"search_more:n:{key[:8]}:{offset}:{search_cursor}" if legacy
+                          else SearchMore(kind='n', query=key[:8], offset=offset, cursor=search_cursor).pack())
+        elif roll < 0.95:
+            result.append("main_menu" if legacy else MAIN_MENU)
+        elif roll < 0.98:
+            result.append("show_categories_menu" if legacy else NEWS_CATEGORIES)
+        else:
+            result.append("search_news" if legacy else SEARCH_NEWS)
+    return result
+
+
+def route_chain(data: str):
+    """Цепочка из прежнего TelegramBot.callback_handler: те же сравнения в том же порядке"""
+    if data == "main_menu":
+        return HANDLERS[MainMenu], ()
+    elif data == "show_news":
+        return HANDLERS[NewsCategories], ()
+    elif data == "show_categories_menu":
+        return HANDLERS[NewsCategories], ()
+    elif data.startswith("news_category:"):
+        return HANDLERS[Category], (data.split(":")[1],)
+    elif data.startswith("news_nav:"):
+        parts = data.split(':')
+        direction = parts[3] if len(parts) > 4 else NAV_FORWARD
+        cursor = parts[4] if len(parts) > 4 else None
+        return HANDLERS[NewsNav], (parts[1], int(parts[2]), direction, cursor)
+    elif data == "search_news":
+        return HANDLERS[SearchPrompt], ('n',)
+    elif data.startswith("search_more:"):
+        _, search_type, query_key, offset, cursor = data.split(':', 4)
+        return HANDLERS[SearchMore], (search_type, query_key, int(offset), cursor)
+    elif data.startswith("next_"):
+        return None, ()
+    elif data.startswith("show_post_"):
+        return HANDLERS[ShowPost], (data.replace("show_post_", ""),)
+    return None, ()
+
+
+def route_filters(data: str):
+    """Как dp.callback_query.register(h, Factory.filter()): каждый фильтр пробует unpack по очереди"""
+    for factory, handle in HANDLERS.items():
+        if not data.startswith(factory.__prefix__ + factory.__separator__) and data != factory.__prefix__:
+            continue # CallbackQueryFilter тоже отбрасывает чужой префикс до разбора
+        try:
+            return handle, factory.unpack(data)
+        except (TypeError, ValueError):
+            continue
+    return None, None
+
+
+def measure(route, callbacks, repeat: int):
+    rounds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for data in callbacks:
+            handle, _ = route(data)
+            if handle is None:
+                raise AssertionError(f"не найден обработчик для {data!r}")
+        rounds.append(time.perf_counter() - started)
+    best = min(rounds)
+    return best, best / len(callbacks) * 1e6, statistics.median(rounds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--callbacks', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    legacy = make_callbacks(args.callbacks, legacy=True, rnd=rnd)
+    typed = make_callbacks(args.callbacks, legacy=False, rnd=random.Random(1))
+    router = CallbackRouter()
+    for factory, handle in HANDLERS.items():
+        router.register(factory, handle)
+
+    longest = max(typed, key=lambda data: len(data.encode()))
+    print(f"Нажатий: {args.callbacks}, самая длинная callback_data: {len(longest.encode())} байт ({longest})")
+    print(f"{'маршрутизация':<40}{'лучший, мс':>12}{'мкс/нажатие':>13}{'медиана, мс':>13}")
+    for title, route, callbacks in (
+            ("if/elif + split (прежний)", route_chain, legacy),
+            ("фильтры aiogram Factory.filter()", route_filters, typed),
+            ("CallbackRouter: словарь префиксов", router.resolve, typed),
+            ("CallbackRouter: старые кнопки", router.resolve, legacy),
+    ):
+        best, per_item, median = measure(route, callbacks, args.repeat)
+        print(f"{title:<40}{best * 1000:>12.1f}{per_item:>13.2f}{median * 1000:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
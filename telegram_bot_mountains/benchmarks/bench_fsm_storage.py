@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+FSM-хранилища на типичном апдейте поиска (get_state, get_data x2, update_data, set_state):
+MemoryStorage aiogram против PostgresStorage с буфером апдейта и без него.
+
+Запуск (из каталога telegram_bot_mountains, настройки БД берутся из .env):
+    python -m benchmarks.bench_fsm_storage --updates 5000 --users 500
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from dotenv import load_dotenv
+
+from benchmarks.common import make_db
+from database.fsm_storage import PostgresStorage
+from database.migrate import migrate
+
+BOT_ID = 1
+
+
+async def one_update(storage, key):
+    await storage.get_state(key)
+    data = await storage.get_data(key)
+    await storage.get_data(key)
+    data['page'] = data.get('page', 0) + 1
+    await storage.set_data(key, data)
+    await storage.set_state(key, 'SearchStates:waiting_for_news_keyword')
+
+
+async def run(storage, keys, buffered: bool):
+    timings = []
+    for key in keys:
+        started = time.perf_counter()
+        if buffered:
+            token = storage.begin()
+            await one_update(storage, key)
+            await storage.flush(token)
+        else:
+            await one_update(storage, key)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99) - 1], sum(timings) / 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--updates', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=500)
+    args = parser.parse_args()
+
+    load_dotenv()
+    db = make_db()
+    await db.connect()
+    rnd = random.Random(1)
+    keys = [StorageKey(bot_id=BOT_ID, chat_id=user, user_id=user)
+            for user in (rnd.randrange(args.users) for _ in range(args.updates))]
+    try:
+        await migrate(db)
+        print(f"Апдейтов: {args.updates}, пользователей: {args.users}")
+        print(f"{'хранилище':<34}{'медиана, мс':>12}{'p99, мс':>10}{'всего, с':>10}{'чтений':>8}{'записей':>9}")
+
+        median, p99, total = await run(MemoryStorage(), keys, buffered=False)
+        print(f"{'MemoryStorage':<34}{median:>12.3f}{p99:>10.3f}{total:>10.2f}{'-':>8}{'-':>9}")
+
+        for title, buffered in (('PostgresStorage без буфера', False), ('PostgresStorage + буфер апдейта', True)):
+            await db.execute("DELETE FROM fsm_states WHERE key LIKE $1", f"fsm:{BOT_ID}:%")
+            storage = PostgresStorage()
+            await storage.start(db)
+            median, p99, total = await run(storage, keys, buffered)
+            await storage.close()
+            print(f"{title:<34}{median:>12.3f}{p99:>10.3f}{total:>10.2f}{storage.reads:>8}{storage.writes:>9}")
+    finally:
+        await db.execute("DELETE FROM fsm_states WHERE key LIKE $1", f"fsm:{BOT_ID}:%")
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
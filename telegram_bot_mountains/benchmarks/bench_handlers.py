@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Горячие методы TelegramBot по отдельности: БД в памяти (benchmarks/fake_db.py) и сессия
+Bot API без сети, которая собирает форму запроса, как настоящая, и отвечает готовым
+Message. Остаётся только CPU и память кода обработчиков: клавиатуры, md5 ключей,
+сборка HTML, разбор callback_data, кэши.
+
+Postgres и Telegram не нужны:
+    python -m benchmarks.bench_handlers --iterations 5000
+    python -m benchmarks.bench_handlers --json handlers.json
+
+Те же случаи (HandlerCases) под pytest-benchmark с сохранением по коммитам - benchmarks/test_handlers.py.
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from urllib.parse import quote_plus
+
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.enums import ParseMode
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.methods import SendMessage, SendPhoto, EditMessageText
+from aiogram.types import CallbackQuery, Chat, Message, PhotoSize, User
+
+import main
+from benchmarks.fake_db import FakeDatabase
+from bot.callbacks import MAIN_MENU, Category
+from bot.templates import PrebuiltMarkupSession
+from services.interaction_logger import BatchedEventWriter
+from services.media_cache import PostMediaCache
+from services.news_catalog import NewsCategoryCatalog
+from services.news_page_cache import NewsPageCache
+from services.post_cache import PostCache
+from services.search import SearchEngine
+from services.search_index import InMemorySearchIndex
+
+TOKEN = '123456:offline-bench'
+USER = User(id=1001, is_bot=False, first_name='Иван', username='ivan')
+CHAT = Chat(id=1001, type='private')
+
+
+class FakeBotSession(PrebuiltMarkupSession):
+    """Собирает форму запроса (как перед отправкой в Telegram) и возвращает ответ без сети"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.requests = Counter()
+        self._message_id = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        self.build_form_data(bot, method)
+        self.requests[type(method).__name__] += 1
+        if not isinstance(method, (SendMessage, SendPhoto, EditMessageText)):
+            return True
+        self._message_id += 1
+        photo = None
+        if isinstance(method, SendPhoto):
+            photo = [PhotoSize(file_id=f"photo-{self._message_id}", file_unique_id=f"u{self._message_id}",
+                               width=800, height=600)]
+        return Message(message_id=self._message_id, date=datetime.now(), chat=CHAT,
+                       text=getattr(method, 'text', None), photo=photo).as_(bot)
+
+
+async def make_app():
+    """TelegramBot с сервисами поверх FakeDatabase - как после setup_database, но без фоновых задач"""
+    app = main.TelegramBot()
+    app.db = FakeDatabase()
+    app.bot = Bot(token=TOKEN, session=FakeBotSession(), default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    app.news_catalog = NewsCategoryCatalog(app.db)
+    await app.news_catalog.reconcile()
+    app.news_pages = NewsPageCache()
+    app.post_cache = PostCache(app.db)
+    app.media_cache = PostMediaCache(app.db)
+    app.search_engine = SearchEngine(app.db)
+    app.search_index = InMemorySearchIndex(app.db)
+    await app.search_index.start()
+    # Не запущен: события копятся в очереди, стоимость log() та же, что в проде
+    app.interaction_log = BatchedEventWriter(
+        None, 'user_interactions',
+        ('user_id', 'username', 'first_name', 'last_name', 'qr_id', 'post_id', 'interaction_type'), max_queue=0,
+    )
+    app.callbacks = app.create_callback_router()
+    return app
+
+
+def message(app, text: str) -> Message:
+    return Message(message_id=1, date=datetime.now(), chat=CHAT, from_user=USER, text=text).as_(app.bot)
+
+
+def callback(app, data: str) -> CallbackQuery:
+    return CallbackQuery(id='1', from_user=USER, chat_instance='1', data=data,
+                         message=message(app, '...')).as_(app.bot)
+
+
+class HandlerCases:
+    """
+    Операции бенчмарка над одним TelegramBot: каждый публичный метод без аргументов - один вызов
+    обработчика. Общие для CLI и benchmarks/test_handlers.py.
+    """
+
+    def __init__(self, app, state, news_type, category_key, forward):
+        self.app = app
+        self.state = state
+        self.news_type = news_type
+        self.cached_pages, self.uncached_pages = app.news_pages, NewsPageCache(max_items=0)
+        self.start = message(app, '/start')
+        self.start_qr = message(app, f"/start {quote_plus('mountain:post-0001')}")
+        self.plain = message(app, 'эльбрус')
+        self.to_menu, self.to_category, self.to_next = (callback(app, data) for data in
+                                                        (MAIN_MENU, Category(key=category_key).pack(), forward))
+
+    @classmethod
+    async def create(cls, app=None):
+        app = app or await make_app()
+        state = FSMContext(storage=MemoryStorage(), key=StorageKey(bot_id=app.bot.id, chat_id=CHAT.id, user_id=USER.id))
+        news_type, _, category_key = (await app.news_catalog.categories())[0]
+        _, first_page = await app.render_news_page(news_type, 0)
+        forward = [button.callback_data for row in first_page.inline_keyboard for button in row
+                   if button.text.startswith("Вперёд")][0]
+        return cls(app, state, news_type, category_key, forward)
+
+    async def close(self):
+        await self.app.bot.session.close()
+
+    async def start_command(self):
+        await self.app.start_command(self.start)
+
+    async def start_command_qr(self):
+        await self.app.start_command(self.start_qr)
+
+    async def qr_found(self):
+        await self.app.handle_qr_url(self.plain, 'mountain:post-0002')
+
+    async def qr_unknown(self):
+        await self.app.handle_qr_url(self.plain, 'mountain:missing-1')
+
+    async def news_categories(self):
+        await self.app.show_news_categories(self.plain, self.state)
+
+    async def news_page_cached(self):
+        await self._paginated(self.cached_pages)
+
+    async def news_page_uncached(self):
+        await self._paginated(self.uncached_pages)
+
+    async def search_news(self):
+        await self.app.search_news(self.plain, 'эльбрус')
+
+    async def search_posts_many(self):
+        await self.app.search_posts(self.plain, 'эльбрус') # Полная страница результатов
+
+    async def search_posts_one(self):
+        await self.app.search_posts(self.plain, '#7') # Единственный результат - сразу карточка поста
+
+    async def search_posts_not_found(self):
+        await self.app.search_posts(self.plain, 'эверест')
+
+    async def callback_main_menu(self):
+        await self.app.callbacks.dispatch(self.to_menu, self.state)
+
+    async def callback_category(self):
+        await self.app.callbacks.dispatch(self.to_category, self.state)
+
+    async def callback_news_nav(self):
+        await self.app.callbacks.dispatch(self.to_next, self.state)
+
+    async def _paginated(self, pages):
+        self.app.news_pages = pages
+        try:
+            await self.app.send_paginated_news(self.plain, self.news_type, 0)
+        finally:
+            self.app.news_pages = self.cached_pages
+
+
+CASES = tuple(name for name, value in vars(HandlerCases).items()
+              if not name.startswith('_') and name != 'close' and inspect.iscoroutinefunction(value))
+
+
+async def measure(operation, iterations: int):
+    """(мкс на операцию, байт памяти на пике одной операции)"""
+    for _ in range(100):
+        await operation()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await operation()
+    per_op = (time.perf_counter() - started) / iterations * 1e6
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    await operation()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return per_op, peak - before
+
+
+async def main_async():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=5000)
+    parser.add_argument('--json', help='записать результаты в файл JSON')
+    args = parser.parse_args()
+
+    cases = await HandlerCases.create()
+    app = cases.app
+    print(f"Итераций: {args.iterations}, новостей {len(app.db.news)}, постов {len(app.db.posts)}")
+    print(f"{'обработчик':<34}{'мкс':>10}{'байт':>10}{'запросов API':>14}")
+    results = {}
+    for name in CASES:
+        requests = app.bot.session.requests
+        before = sum(requests.values())
+        per_op, allocated = await measure(getattr(cases, name), args.iterations)
+        per_call = (sum(requests.values()) - before) / (args.iterations + 101)
+        results[name] = {'us': round(per_op, 2), 'bytes': allocated}
+        print(f"{name:<34}{per_op:>10.1f}{allocated:>10}{per_call:>14.1f}")
+    print("Время - код обработчика и сборка формы запроса Bot API, без сети и БД.")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'iterations': args.iterations, 'results': results}, f, ensure_ascii=False, indent=2)
+    await cases.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main_async())
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Накладные расходы метрик (bot/metrics.py): каждая точка записи отдельно - middleware апдейта
+и обработчика, CallbackRouter, middleware вызова Bot API, acquire пула, гистограмма - и выдача
+/metrics. Апдейт целиком через Dispatcher.feed_update (~200 мкс в aiogram) для сравнения:
+разница в нём тонет в шуме, поэтому накладные расходы видны по строкам middleware.
+
+Сеть, БД и Telegram не нужны:
+    python -m benchmarks.bench_metrics --iterations 50000
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime
+
+from aiogram import Bot, Dispatcher
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.methods import SendMessage
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+from bot.callbacks import MAIN_MENU, CallbackRouter, MainMenu
+from bot.metrics import BotAPIMetricsMiddleware, BotMetrics, HandlerMetricsMiddleware, UpdateMetricsMiddleware
+from database.postgres_VR2 import MeteredPool
+
+TOKEN = '123456:offline-bench'
+ROUNDS = 5
+
+
+async def start(message: Message):
+    pass
+
+
+def make_dispatcher(metrics):
+    dp = Dispatcher()
+    if metrics:
+        dp.update.outer_middleware(UpdateMetricsMiddleware(metrics))
+        dp.message.middleware(HandlerMetricsMiddleware(metrics))
+    dp.message.register(start, Command("start"))
+    return dp
+
+
+async def compare(without, with_metrics, iterations: int):
+    """Лучший из ROUNDS прогонов каждого варианта, мкс на операцию; варианты чередуются, чтобы шум делился поровну"""
+    best = [float('inf'), float('inf')]
+    for _ in range(ROUNDS):
+        for i, operation in enumerate((without, with_metrics)):
+            started = time.perf_counter()
+            for _ in range(iterations):
+                await operation()
+            best[i] = min(best[i], (time.perf_counter() - started) / iterations * 1e6)
+    return best
+
+
+class _Context:
+    async def __aenter__(self):
+        return None
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _Pool:
+    def acquire(self):
+        return _Context()
+
+
+async def main_async():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=50000)
+    args = parser.parse_args()
+    n = args.iterations
+
+    bot = Bot(token=TOKEN)
+    user, chat = User(id=1, is_bot=False, first_name='Иван'), Chat(id=1, type='private')
+    update = Update(update_id=1, message=Message(message_id=1, date=datetime.now(), chat=chat, from_user=user,
+                                                 text='/start'))
+    plain_dp, metered_dp = make_dispatcher(None), make_dispatcher(BotMetrics())
+
+    async def noop(callback, data, state):
+        pass
+
+    plain_router, metered_router = CallbackRouter(), CallbackRouter()
+    metered_router.metrics = BotMetrics()
+    for router in (plain_router, metered_router):
+        router.register(MainMenu, noop)
+    callback = CallbackQuery(id='1', from_user=user, chat_instance='1', data=MAIN_MENU)
+    state = FSMContext(storage=MemoryStorage(), key=StorageKey(bot_id=bot.id, chat_id=1, user_id=1))
+
+    metrics = BotMetrics()
+    api_middleware = BotAPIMetricsMiddleware(metrics)
+    method = SendMessage(chat_id=1, text='x')
+
+    async def make_request(bot, method):
+        return None
+
+    update_middleware, handler_middleware = UpdateMetricsMiddleware(metrics), HandlerMetricsMiddleware(metrics)
+    data = {'handler': HandlerObject(start)}
+
+    async def handler(event, data):
+        return None
+
+    raw_pool, metered_pool = _Pool(), MeteredPool(_Pool(), metrics.db_pool_wait)
+
+    async def acquire(pool):
+        async with pool.acquire():
+            pass
+
+    pairs = [
+        ("апдейт /start (feed_update)", lambda: plain_dp.feed_update(bot, update),
+         lambda: metered_dp.feed_update(bot, update)),
+        ("middleware апдейта", lambda: handler(update, data), lambda: update_middleware(handler, update, data)),
+        ("middleware обработчика", lambda: handler(update.message, data),
+         lambda: handler_middleware(handler, update.message, data)),
+        ("кнопка (CallbackRouter.dispatch)", lambda: plain_router.dispatch(callback, state),
+         lambda: metered_router.dispatch(callback, state)),
+        ("вызов Bot API (middleware сессии)", lambda: make_request(bot, method),
+         lambda: api_middleware(make_request, bot, method)),
+        ("acquire пула", lambda: acquire(raw_pool), lambda: acquire(metered_pool)),
+    ]
+
+    print(f"Итераций: {n}, лучший из {ROUNDS} прогонов")
+    print(f"{'операция':<38}{'без, мкс':>10}{'с метриками':>13}{'разница':>10}")
+    for title, without, with_metrics in pairs:
+        base, metered = await compare(without, with_metrics, n)
+        print(f"{title:<38}{base:>10.2f}{metered:>13.2f}{metered - base:>+10.2f}")
+    started = time.perf_counter()
+    for _ in range(n):
+        metrics.db_query_seconds.observe(('post_by_qr_id',), 0.0012)
+    print(f"{'запись в гистограмму':<38}{'':>10}{(time.perf_counter() - started) / n * 1e6:>13.2f}")
+
+    for i in range(30): # Типичный набор: обработчики, методы API и запросы
+        metrics.handler_seconds.observe((f"handler_{i}",), 0.003)
+        metrics.api_seconds.observe((f"method_{i % 6}",), 0.05)
+    started = time.perf_counter()
+    body = metrics.render()
+    print(f"выдача /metrics: {(time.perf_counter() - started) * 1000:.2f} мс, {len(body)} байт")
+    await bot.session.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main_async())
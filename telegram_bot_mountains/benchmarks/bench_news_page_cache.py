@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Кэш готовых страниц новостей: листание первых страниц категорий, как в живом боте
+(популярные категории чаще, первые страницы чаще дальних). Сравниваются прогон без кэша
+и с кэшем; --invalidate-every имитирует добавление новостей (сброс версии категории).
+
+Запуск (из каталога telegram_bot_mountains, настройки БД берутся из .env):
+    python -m benchmarks.bench_news_page_cache --taps 20000 --invalidate-every 2000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from dotenv import load_dotenv
+
+import main
+from benchmarks.common import make_db
+from bot.callbacks import NewsNav
+from database.migrate import migrate
+from services.news_catalog import NewsCategoryCatalog
+from services.news_page_cache import NewsPageCache
+from utils.pagination import decode_cursor
+
+MAX_PAGES = 10
+
+
+async def walk_positions(bot, news_type: str):
+    """(offset, cursor) первых MAX_PAGES страниц категории - по кнопкам "Вперёд"""
+    positions, offset, cursor = [], 0, None
+    for _ in range(MAX_PAGES):
+        page = await bot.render_news_page(news_type, offset, cursor)
+        if page is None:
+            break
+        positions.append((offset, cursor))
+        forward = [button for row in page[1].inline_keyboard for button in row if button.text.startswith("Вперёд")]
+        if not forward:
+            break
+        data = NewsNav.unpack(forward[0].callback_data)
+        offset, cursor = data.offset, decode_cursor(data.cursor) if data.cursor else None
+    return positions
+
+
+def make_taps(categories, positions, count: int, rnd: random.Random):
+    weights = [n for _, n, _ in categories]
+    names = [name for name, _, _ in categories]
+    taps = []
+    for news_type in rnd.choices(names, weights=weights, k=count):
+        pages = positions[news_type]
+        depth = min(int(rnd.expovariate(0.7)), len(pages) - 1) # Большинство смотрит 1-2 страницы
+        taps.append((news_type, *pages[depth]))
+    return taps
+
+
+async def run(bot, taps, invalidate_every: int):
+    hits, misses = [], []
+    for i, (news_type, offset, cursor) in enumerate(taps, 1):
+        before = bot.news_pages.hits
+        started = time.perf_counter()
+        await bot.render_news_page(news_type, offset, cursor)
+        elapsed = (time.perf_counter() - started) * 1000
+        (hits if bot.news_pages.hits > before else misses).append(elapsed)
+        if invalidate_every and i % invalidate_every == 0:
+            bot.news_pages.invalidate(news_type)
+    return hits, misses
+
+
+def percentiles(values):
+    if not values:
+        return "-", "-"
+    values = sorted(values)
+    return f"{statistics.median(values):.3f}", f"{values[int(len(values) * 0.95) - 1]:.3f}"
+
+
+async def main_async():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--taps', type=int, default=20000)
+    parser.add_argument('--invalidate-every', type=int, default=0, help='сбрасывать категорию каждые N нажатий')
+    args = parser.parse_args()
+
+    load_dotenv()
+    db = make_db()
+    await db.connect()
+    try:
+        await migrate(db)
+        bot = main.TelegramBot()
+        bot.db = db
+        bot.news_catalog = NewsCategoryCatalog(db)
+        await bot.news_catalog.reconcile()
+        categories = await bot.news_catalog.categories()
+        if not categories:
+            print("В таблице news нет новостей: python -m database.importer seed")
+            return
+
+        bot.news_pages = NewsPageCache(max_items=0) # Без кэша: страница удаляется сразу после записи
+        positions = {name: await walk_positions(bot, name) for name, _, _ in categories}
+        taps = make_taps(categories, positions, args.taps, random.Random(1))
+
+        print(f"Нажатий: {args.taps}, категорий: {len(categories)}, сброс каждые {args.invalidate_every or '-'}")
+        print(f"{'режим':<12}{'hit rate':>10}{'всего, с':>10}{'hit p50':>10}{'hit p95':>10}{'miss p50':>10}{'miss p95':>10}")
+        for title, cache in (("без кэша", NewsPageCache(max_items=0)), ("с кэшем", NewsPageCache())):
+            bot.news_pages = cache
+            started = time.perf_counter()
+            hits, misses = await run(bot, taps, args.invalidate_every)
+            total = time.perf_counter() - started
+            print(f"{title:<12}{cache.stats['hit_rate']:>10.1%}{total:>10.2f}"
+                  f"{percentiles(hits)[0]:>10}{percentiles(hits)[1]:>10}"
+                  f"{percentiles(misses)[0]:>10}{percentiles(misses)[1]:>10}")
+        print("Задержки в мс на сборку страницы (без отправки в Telegram).")
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main_async())
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Сравнение OFFSET- и keyset-пагинации новостей: страница 1 против страницы 1000.
+
+Запуск (из каталога telegram_bot_mountains, настройки БД берутся из .env):
+    python -m benchmarks.bench_news_pagination --rows 200000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+
+from benchmarks.common import make_db
+from database.postgres_VR2 import Database
+
+BENCH_NEWS_TYPE = "__bench_pagination__"
+PER_PAGE = 5
+
+
+async def seed(db: Database, rows: int):
+    """Заполняет таблицу news синтетическими записями отдельной категории"""
+    existing = await db.fetchval("SELECT COUNT(*) FROM news WHERE news_type = $1", BENCH_NEWS_TYPE)
+    if existing >= rows:
+        return
+    start = datetime(2020, 1, 1)
+    records = (
+        (f"https://t.me/bench/{i}", BENCH_NEWS_TYPE, f"Новость #{i}", start + timedelta(seconds=i))
+        for i in range(existing, rows)
+    )
+    async with db.pool.acquire() as conn:
+        await conn.copy_records_to_table(
+            'news', records=records, columns=('telegram_url', 'news_type', 'title', 'created_at')
+        )
+        await conn.execute("ANALYZE news")
+
+
+async def measure(func, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--page', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--keep', action='store_true', help='не удалять синтетические новости')
+    args = parser.parse_args()
+
+    load_dotenv()
+    db = make_db()
+    await db.connect()
+    try:
+        await seed(db, args.rows)
+        deep_offset = (args.page - 1) * PER_PAGE
+
+        # Курсор для глубокой страницы: последняя новость предыдущей страницы (вне замера)
+        boundary = await db.fetchrow("""
+            SELECT created_at, id FROM news WHERE news_type = $1
+            ORDER BY created_at DESC, id DESC OFFSET $2 LIMIT 1
+        """, BENCH_NEWS_TYPE, deep_offset - 1)
+        deep_cursor = (boundary['created_at'], boundary['id'])
+
+        async def offset_page(offset):
+            await db.get_news_by_type(BENCH_NEWS_TYPE, offset, PER_PAGE)
+
+        async def cursor_page(cursor):
+            # Счётчик берётся из кэша Database, как и в боте
+            await db.get_news_page_after(BENCH_NEWS_TYPE, cursor, PER_PAGE)
+            await db.get_news_count(BENCH_NEWS_TYPE)
+
+        results = {
+            ('offset', 1): await measure(lambda: offset_page(0), args.repeat),
+            ('offset', args.page): await measure(lambda: offset_page(deep_offset), args.repeat),
+            ('cursor', 1): await measure(lambda: cursor_page(None), args.repeat),
+            ('cursor', args.page): await measure(lambda: cursor_page(deep_cursor), args.repeat),
+        }
+
+        print(f"Новостей в категории: {args.rows}, на странице: {PER_PAGE}, повторов: {args.repeat}")
+        print(f"{'режим':<8}{'страница':>10}{'медиана, мс':>14}")
+        for (mode, page), ms in results.items():
+            print(f"{mode:<8}{page:>10}{ms:>14.2f}")
+    finally:
+        if not args.keep:
+            await db.execute("DELETE FROM news WHERE news_type = $1", BENCH_NEWS_TYPE)
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Поиск по синтетической таблице новостей (по умолчанию 1 млн строк):
+старые запросы LOWER(...) LIKE '%kw%' против tsvector + GIN и нечёткого поиска pg_trgm.
+
+Запуск (из каталога telegram_bot_mountains, настройки БД берутся из .env):
+    python -m benchmarks.bench_search --rows 1000000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from dotenv import load_dotenv
+
+from benchmarks.common import make_db
+
+TABLE = "bench_news_search"
+WORDS = [
+    'Эльбрус', 'Эльбруса', 'восхождение', 'восхождения', 'экспедиция', 'экспедиции', 'ледник', 'ледника',
+    'вершина', 'вершины', 'Казбек', 'Белуха', 'альпинисты', 'маршрут', 'склон', 'перевал', 'лавина',
+    'история', 'культура', 'природа', 'экология', 'рекорд', 'спасатели', 'гид', 'лагерь', 'снаряжение',
+]
+QUERIES = [('эльбрус', 'Эльбрус'), ('экспедиц', 'экспедиция'), ('ледник', 'ледники'), ('эльбрусс', 'Эльбрусс')]
+
+
+async def prepare(db, rows: int):
+    exists = await db.fetchval("SELECT to_regclass($1) IS NOT NULL", TABLE)
+    if exists and await db.fetchval(f"SELECT COUNT(*) FROM {TABLE}") >= rows:
+        return
+    async with db.pool.acquire() as conn:
+        await conn.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        await conn.execute(f"""
+            CREATE TABLE {TABLE} (
+                id SERIAL PRIMARY KEY,
+                telegram_url TEXT NOT NULL,
+                news_type TEXT NOT NULL,
+                title TEXT,
+                search_vector tsvector
+            )
+        """)
+        # Заголовок из трёх случайных слов словаря
+        await conn.execute(f"""
+            INSERT INTO {TABLE} (telegram_url, news_type, title)
+            SELECT 'https://t.me/bench/' || g,
+                   (ARRAY['История восхождений и экспедиций', 'Природа и экология Эльбруса'])[1 + g % 2],
+                   w[1 + (random() * {len(WORDS) - 1})::int] || ' ' ||
+                   w[1 + (random() * {len(WORDS) - 1})::int] || ' ' ||
+                   w[1 + (random() * {len(WORDS) - 1})::int]
+            FROM generate_series(1, $1) g, (SELECT $2::text[] AS w) words
+        """, rows, WORDS)
+        await conn.execute(f"""
+            UPDATE {TABLE} SET search_vector =
+                setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('russian', news_type), 'B')
+        """)
+        await conn.execute(f"CREATE INDEX ON {TABLE} USING gin (search_vector)")
+        await conn.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        await conn.execute(f"CREATE INDEX ON {TABLE} USING gin (title gin_trgm_ops)")
+        await conn.execute(f"ANALYZE {TABLE}")
+
+
+async def timed(conn, repeat, query, *args):
+    timings, found = [], 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        found = len(await conn.fetch(query, *args))
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), found
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--drop', action='store_true', help='удалить синтетическую таблицу после замера')
+    args = parser.parse_args()
+
+    load_dotenv()
+    db = make_db()
+    await db.connect()
+    try:
+        await prepare(db, args.rows)
+        print(f"Строк: {args.rows}, повторов: {args.repeat}")
+        print(f"{'запрос':<14}{'LIKE, мс':>12}{'FTS, мс':>12}{'trgm, мс':>12}{'найдено LIKE/FTS/trgm':>24}")
+        async with db.pool.acquire() as conn:
+            for like_kw, fts_kw in QUERIES:
+                like_ms, like_found = await timed(conn, args.repeat, f"""
+                    SELECT telegram_url, news_type, title FROM {TABLE}
+                    WHERE LOWER(title) LIKE $1 OR LOWER(news_type) LIKE $1
+                    ORDER BY id DESC LIMIT 15
+                """, f"%{like_kw}%")
+                fts_ms, fts_found = await timed(conn, args.repeat, f"""
+                    SELECT id, title, ts_rank(search_vector, q) AS rank
+                    FROM {TABLE}, websearch_to_tsquery('russian', $1) q
+                    WHERE search_vector @@ q
+                    ORDER BY rank DESC, id DESC LIMIT 6
+                """, fts_kw)
+                trgm_ms, trgm_found = await timed(conn, args.repeat, f"""
+                    SELECT id, title, similarity(title, $1) AS rank
+                    FROM {TABLE} WHERE title % $1
+                    ORDER BY rank DESC, id DESC LIMIT 6
+                """, fts_kw)
+                print(f"{fts_kw:<14}{like_ms:>12.2f}{fts_ms:>12.2f}{trgm_ms:>12.2f}"
+                      f"{f'{like_found}/{fts_found}/{trgm_found}':>24}")
+    finally:
+        if args.drop:
+            await db.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Память и скорость поискового индекса в памяти на синтетических новостях (БД не нужна).
+
+Запуск (из каталога telegram_bot_mountains):
+    python -m benchmarks.bench_search_index --docs 100000
+"""
+import argparse
+import random
+import statistics
+import time
+import tracemalloc
+
+from services.search_index import _Corpus
+
+WORDS = [
+    'Эльбрус', 'Эльбруса', 'восхождение', 'восхождения', 'экспедиция', 'экспедиции', 'ледник', 'ледника',
+    'вершина', 'вершины', 'Казбек', 'Белуха', 'альпинисты', 'маршрут', 'склон', 'перевал', 'лавина',
+    'история', 'культура', 'природа', 'экология', 'рекорд', 'спасатели', 'гид', 'лагерь', 'снаряжение',
+]
+TYPES = ['История восхождений и экспедиций', 'Культурное и историческое значение горы',
+         'Природа и экология Эльбруса', 'Современные достижения связанные с Эльбрусом']
+QUERIES = ['эльбрус', 'экспедиции ледник', 'восх', 'казбек перевал', 'несуществующее']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--docs', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    rnd = random.Random(42)
+    docs = []
+    for i in range(1, args.docs + 1):
+        # Уникальный номер в заголовке даёт реалистичный длинный хвост редких терминов
+        title = f"{' '.join(rnd.choices(WORDS, k=4))} #{i}"
+        docs.append((i, f"https://t.me/TopRussiaBrand/{i}", rnd.choice(TYPES), title))
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    corpus = _Corpus()
+    for doc_id, url, news_type, title in docs:
+        corpus.add(doc_id, f"{title} {news_type}", (url, news_type, title))
+    build_s = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    postings = sum(len(posting) for posting in corpus.postings.values())
+    postings_bytes = sum(posting.itemsize * len(posting) for posting in corpus.postings.values())
+    print(f"Документов: {args.docs}, терминов: {len(corpus.postings)}, вхождений: {postings}")
+    print(f"Построение: {build_s:.2f} с")
+    print(f"Память индекса (tracemalloc): {current / 2**20:.1f} МиБ, "
+          f"на 100k документов: {current / args.docs * 100_000 / 2**20:.1f} МиБ")
+    print(f"Из них данные posting-списков: {postings_bytes / 2**20:.1f} МиБ")
+
+    print(f"{'запрос':<20}{'медиана, мкс':>14}{'p99, мкс':>12}{'найдено':>10}")
+    for query in QUERIES:
+        timings = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            found = corpus.search(query, limit=6)
+            timings.append((time.perf_counter() - t0) * 1e6)
+        timings.sort()
+        print(f"{query:<20}{statistics.median(timings):>14.1f}{timings[int(len(timings) * 0.99) - 1]:>12.1f}{len(found):>10}")
+
+
+if __name__ == "__main__":
+    main()
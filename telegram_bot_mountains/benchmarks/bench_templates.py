@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Сборка клавиатур и формы запроса Bot API: как было (клавиатура заново на каждое сообщение,
+reply_markup сериализуется aiogram) и с bot/templates.py (готовые клавиатуры, их JSON
+и LRU клавиатуры категорий).
+
+Сеть, БД и Telegram не нужны:
+    python -m benchmarks.bench_templates --iterations 20000
+"""
+import argparse
+import time
+import tracemalloc
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.methods import SendMessage, SendPhoto
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from bot.callbacks import MAIN_MENU, NEWS_CATEGORIES, Category
+from bot.templates import (CATEGORIES_TEXT, MAIN_MENU_MARKUP, POST_MARKUP, START_TEXT, KeyboardCache,
+                           PrebuiltMarkupSession, build_categories_markup)
+from services.category_registry import category_key
+
+CATEGORIES = tuple(
+    (news_type, count, category_key(news_type)) for news_type, count in (
+        ("История восхождений и экспедиций", 120), ("Новости альпинизма", 64),
+        ("Снаряжение и подготовка", 41), ("Горы России", 25),
+    )
+)
+
+
+def old_main_menu_markup():
+    """Прежний TelegramBot.create_main_menu_markup"""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text="💬 Общий чат", url="https://t.me/topofrussia"),
+            InlineKeyboardButton(text="📢 Наш канал", url="https://t.me/TopRussiaBrand")
+        ],
+        [
+            InlineKeyboardButton(text="📸 Фотомарафон", url="https://t.me/TopRussiaBrand/618"),
+            InlineKeyboardButton(text="📰 Новости", callback_data=NEWS_CATEGORIES)
+        ],
+        [
+            InlineKeyboardButton(text="🌟 Официальный сайт", url="https://xn--80adjmba6ajodma8f.xn--p1ai/")
+        ]
+    ])
+
+
+def old_post_markup(post_id):
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text="💬 Обсудить в чате", url="https://t.me/topofrussia"),
+            InlineKeyboardButton(text="📢 Больше новостей", url="https://t.me/TopRussiaBrand")
+        ],
+        [InlineKeyboardButton(text="🏠 Главное меню", callback_data=MAIN_MENU)]
+    ])
+
+
+def old_categories_markup(categories):
+    """Прежняя сборка в show_news_categories через InlineKeyboardBuilder"""
+    builder = InlineKeyboardBuilder()
+    for news_type, count, key in categories:
+        builder.button(text=f"📂 {news_type} ({count})", callback_data=Category(key=key).pack())
+    builder.adjust(1)
+    builder.row(InlineKeyboardButton(text="🏠 Главное меню", callback_data=MAIN_MENU))
+    return builder.as_markup()
+
+
+def measure(operation, iterations: int):
+    """(мкс на операцию, байт памяти на пике одной операции)"""
+    for _ in range(100):
+        operation()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        operation()
+    per_op = (time.perf_counter() - started) / iterations * 1e6
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    operation()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return per_op, peak - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    bot = Bot(token='123456:offline-bench')
+    plain, prebuilt = AiohttpSession(), PrebuiltMarkupSession()
+    keyboards = KeyboardCache()
+
+    cases = [
+        ("клавиатура главного меню", [
+            ("заново", old_main_menu_markup),
+            ("готовая", lambda: MAIN_MENU_MARKUP),
+        ]),
+        ("клавиатура категорий", [
+            ("InlineKeyboardBuilder", lambda: old_categories_markup(CATEGORIES)),
+            ("KeyboardCache", lambda: keyboards.get(CATEGORIES, lambda: build_categories_markup(CATEGORIES))),
+        ]),
+        ("/start: клавиатура + форма sendMessage", [
+            ("как было", lambda: plain.build_form_data(
+                bot, SendMessage(chat_id=1, text=START_TEXT, reply_markup=old_main_menu_markup()))),
+            ("templates", lambda: prebuilt.build_form_data(
+                bot, SendMessage(chat_id=1, text=START_TEXT, reply_markup=MAIN_MENU_MARKUP))),
+        ]),
+        ("карточка поста: форма sendPhoto", [
+            ("как было", lambda: plain.build_form_data(
+                bot, SendPhoto(chat_id=1, photo='AgACAgIAAxkBAAI', caption='<b>Эльбрус</b>',
+                               reply_markup=old_post_markup(1)))),
+            ("templates", lambda: prebuilt.build_form_data(
+                bot, SendPhoto(chat_id=1, photo='AgACAgIAAxkBAAI', caption='<b>Эльбрус</b>',
+                               reply_markup=POST_MARKUP))),
+        ]),
+        ("категории: клавиатура + форма sendMessage", [
+            ("как было", lambda: plain.build_form_data(
+                bot, SendMessage(chat_id=1, text=CATEGORIES_TEXT, reply_markup=old_categories_markup(CATEGORIES)))),
+            ("templates", lambda: prebuilt.build_form_data(
+                bot, SendMessage(chat_id=1, text=CATEGORIES_TEXT, reply_markup=keyboards.get(
+                    CATEGORIES, lambda: build_categories_markup(CATEGORIES))))),
+        ]),
+    ]
+
+    print(f"Итераций: {args.iterations}")
+    print(f"{'операция':<42}{'вариант':<24}{'мкс':>9}{'байт':>9}")
+    for title, variants in cases:
+        baseline = None
+        for name, operation in variants:
+            per_op, allocated = measure(operation, args.iterations)
+            speedup = f"  x{baseline / per_op:.1f}" if baseline else ""
+            baseline = baseline or per_op
+            print(f"{title:<42}{name:<24}{per_op:>9.2f}{allocated:>9}{speedup}")
+            title = ""
+
+
+if __name__ == "__main__":
+    main()
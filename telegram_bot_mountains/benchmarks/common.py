@@ -0,0 +1,7 @@
+"""Общие помощники для бенчмарков."""
+from database.postgres_VR2 import Database
+
+
+def make_db():
+    """Database с теми же настройками из окружения, что и у бота"""
+    return Database.from_env()
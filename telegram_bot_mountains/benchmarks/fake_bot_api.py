@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Заглушка Telegram Bot API для нагрузочных прогонов: отдаёт боту апдейты через getUpdates
+и принимает его ответы (sendMessage, sendPhoto, editMessageText, editMessageMedia,
+answerCallbackQuery, deleteMessage ...), запоминая, когда и в какой чат они пришли.
+
+Бот подключается к ней через TELEGRAM_API_URL=http://127.0.0.1:<порт>.
+Отдельно (апдейты подаёт внешний скрипт через POST /__push):
+    python -m benchmarks.fake_bot_api --port 8081
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter, defaultdict, deque
+
+from aiohttp import web
+
+BOT_USER = {'id': 123456, 'is_bot': True, 'first_name': 'Load test', 'username': 'loadtest_bot'}
+
+# Методы, ответ на которые - сообщение; остальные возвращают True
+_MESSAGE_METHODS = {'sendMessage', 'sendPhoto', 'editMessageText', 'editMessageMedia', 'editMessageCaption',
+                    'editMessageReplyMarkup', 'copyMessage', 'forwardMessage'}
+
+
+class Reply:
+    """Вызов метода Bot API, адресованный чату"""
+    __slots__ = ('method', 'params', 'at')
+
+    def __init__(self, method, params, at):
+        self.method = method
+        self.params = params
+        self.at = at
+
+    @property
+    def markup(self):
+        return self.params.get('reply_markup') or {}
+
+    def buttons(self):
+        """[(текст, callback_data), ...] инлайн-кнопок ответа"""
+        return [(button.get('text'), button.get('callback_data'))
+                for row in self.markup.get('inline_keyboard', ()) for button in row]
+
+
+class FakeBotAPI:
+    """
+    api_latency - искусственная задержка каждого ответа (сек), чтобы моделировать сеть до Telegram.
+    Ожидание ответа бота: expect(chat_id, условие) до отправки апдейта, затем await future.
+    """
+
+    def __init__(self, api_latency: float = 0.0):
+        self.api_latency = api_latency
+        self.calls = Counter()
+        self.delivered_at = {} # update_id -> время, когда бот забрал апдейт
+        self._updates = deque()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._new_updates = asyncio.Event()
+        self.polling = asyncio.Event() # Бот начал забирать апдейты - можно подавать нагрузку
+        self._waiters = defaultdict(list) # chat_id -> [(условие, future), ...]
+        self._callback_chats = {} # callback_query_id -> chat_id
+
+    # --- Апдейты для бота ---
+    def push_message(self, user_id: int, text: str) -> int:
+        update_id = next(self._update_ids)
+        self._push({'update_id': update_id, 'message': {
+            'message_id': next(self._message_ids), 'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'}, 'from': self._user(user_id), 'text': text,
+        }})
+        return update_id
+
+    def push_callback(self, user_id: int, data: str, message_id: int = 1) -> int:
+        update_id = next(self._update_ids)
+        query_id = f"{user_id}-{update_id}"
+        self._callback_chats[query_id] = user_id
+        self._push({'update_id': update_id, 'callback_query': {
+            'id': query_id, 'from': self._user(user_id), 'chat_instance': str(user_id), 'data': data,
+            'message': {'message_id': message_id, 'date': int(time.time()),
+                        'chat': {'id': user_id, 'type': 'private'}, 'text': '...'},
+        }})
+        return update_id
+
+    def _push(self, update: dict):
+        self._updates.append(update)
+        self._new_updates.set()
+
+    @staticmethod
+    def _user(user_id: int) -> dict:
+        return {'id': user_id, 'is_bot': False, 'first_name': f"user{user_id}", 'language_code': 'ru'}
+
+    # --- Ожидание ответов ---
+    def expect(self, chat_id: int, condition) -> asyncio.Future:
+        """Future с первым Reply в чат chat_id, для которого condition(reply) истинно"""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[chat_id].append((condition, future))
+        return future
+
+    def _notify(self, chat_id, reply: Reply):
+        waiters = self._waiters.get(chat_id)
+        if not waiters:
+            return
+        for item in list(waiters):
+            condition, future = item
+            if future.done():
+                waiters.remove(item)
+            elif condition(reply):
+                future.set_result(reply)
+                waiters.remove(item)
+
+    # --- HTTP ---
+    def make_app(self) -> web.Application:
+        app = web.Application(client_max_size=20 * 1024 * 1024)
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        app.router.add_post('/__push', self.handle_push)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        params = {key: _decode(value) for key, value in (await request.post()).items()}
+        self.calls[method] += 1
+        if method == 'getUpdates':
+            self.polling.set()
+            return web.json_response({'ok': True, 'result': await self._get_updates(params)})
+        if self.api_latency:
+            await asyncio.sleep(self.api_latency)
+        if method == 'getMe':
+            return web.json_response({'ok': True, 'result': BOT_USER})
+
+        chat_id = params.get('chat_id')
+        if method == 'answerCallbackQuery':
+            chat_id = self._callback_chats.pop(params.get('callback_query_id'), None)
+        reply = Reply(method, params, time.perf_counter())
+        if chat_id is not None:
+            self._notify(int(chat_id), reply)
+        if method in _MESSAGE_METHODS:
+            return web.json_response({'ok': True, 'result': self._message(method, params)})
+        return web.json_response({'ok': True, 'result': True})
+
+    async def handle_push(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        update_id = (self.push_callback(body['user_id'], body['data']) if 'data' in body
+                     else self.push_message(body['user_id'], body['text']))
+        return web.json_response({'update_id': update_id})
+
+    async def _get_updates(self, params) -> list:
+        offset = int(params.get('offset') or 0)
+        while self._updates and self._updates[0]['update_id'] < offset:
+            self._updates.popleft() # Подтверждены ботом
+        if not self._updates:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout=min(float(params.get('timeout') or 0), 1.0))
+            except asyncio.TimeoutError:
+                return []
+        limit = int(params.get('limit') or 100)
+        batch = list(itertools.islice(self._updates, limit))
+        now = time.perf_counter()
+        for update in batch:
+            self.delivered_at.setdefault(update['update_id'], now)
+        return batch
+
+    def _message(self, method: str, params: dict) -> dict:
+        chat_id = int(params.get('chat_id') or 0)
+        message = {
+            'message_id': int(params.get('message_id') or next(self._message_ids)),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': BOT_USER,
+        }
+        if 'text' in params:
+            message['text'] = params['text']
+        if 'caption' in params:
+            message['caption'] = params['caption']
+        if method in ('sendPhoto', 'editMessageMedia'):
+            file_id = f"fake-photo-{message['message_id']}"
+            message['photo'] = [{'file_id': file_id, 'file_unique_id': file_id, 'width': 800, 'height': 600}]
+        if params.get('reply_markup'):
+            message['reply_markup'] = params['reply_markup']
+        return message
+
+
+def _decode(value):
+    """Поля формы aiogram: сложные значения приходят строкой JSON"""
+    if isinstance(value, str) and value[:1] in '{[':
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--api-latency-ms', type=float, default=0.0)
+    args = parser.parse_args()
+
+    api = FakeBotAPI(api_latency=args.api_latency_ms / 1000)
+    runner = web.AppRunner(api.make_app())
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    print(f"Заглушка Bot API: http://{args.host}:{args.port} (TELEGRAM_API_URL для бота)")
+    try:
+        while True:
+            await asyncio.sleep(10)
+            print(f"Вызовы: {dict(api.calls)}")
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
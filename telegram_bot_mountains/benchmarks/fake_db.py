@@ -0,0 +1,134 @@
+"""
+Database в памяти для бенчмарков без Postgres: те же именованные запросы реестра
+(database/queries.py) и те же классы строк, данные детерминированы (seed).
+"""
+import random
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+from database.postgres_VR2 import Database
+from database.queries import CategoryCountRow, NewsRow, PostRow
+
+CATEGORIES = (
+    ("История восхождений и экспедиций", 120), ("Новости альпинизма", 64), ("Снаряжение и подготовка", 41),
+    ("Горы России", 25), ("Соревнования", 12), ("Фотомарафон", 5),
+)
+WORDS = ("Эльбрус", "Казбек", "Белуха", "восхождение", "экспедиция", "маршрут", "ледник", "вершина",
+         "снаряжение", "лагерь", "перевал", "Кавказ", "Алтай", "сборы", "спасатели", "погода")
+
+# Запросы services/search_index.py при построении индекса
+NEWS_INDEX_SQL = "SELECT id, telegram_url, news_type, title FROM news"
+POSTS_INDEX_SQL = "SELECT * FROM posts WHERE is_active = TRUE"
+
+
+class FakeDatabase(Database):
+    """
+    Реализует Database.run для всех запросов реестра; fetch - только запросы построения
+    поискового индекса, execute ничего не пишет (запись file_id, служебные UPDATE).
+    Методы Database поверх run (get_news_page_after, get_news_count ...) унаследованы как есть.
+    """
+
+    def __init__(self, seed: int = 1, posts: int = 50, categories=CATEGORIES):
+        super().__init__(user=None, password=None, database='memory', host=None, port=None)
+        rnd = random.Random(seed)
+        started = datetime(2024, 1, 1)
+        self.news = []
+        for news_type, count in categories:
+            for _ in range(count):
+                news_id = len(self.news) + 1
+                title = " ".join(rnd.sample(WORDS, 4)).capitalize()
+                created_at = started + timedelta(hours=news_id * 7 + rnd.randrange(5))
+                self.news.append(NewsRow(news_id, f"https://t.me/TopRussiaBrand/{news_id}", news_type, title, created_at))
+        self.news.sort(key=lambda row: (row.created_at, row.id))
+        self._by_type = {} # news_type -> новости по возрастанию (created_at, id)
+        for row in self.news:
+            self._by_type.setdefault(row.news_type, []).append(row)
+        self._keys = {news_type: [(row.created_at, row.id) for row in rows] for news_type, rows in self._by_type.items()}
+        self._by_type_id = {news_type: sorted(rows, key=lambda row: row.id, reverse=True)
+                            for news_type, rows in self._by_type.items()}
+        self._all_by_id = sorted(self.news, key=lambda row: row.id, reverse=True)
+
+        self.posts = {}
+        for i in range(1, posts + 1):
+            mountain = WORDS[i % 4]
+            self.posts[f"post-{i:04d}"] = PostRow(
+                i, f"post-{i:04d}", f"{mountain} #{i}", " ".join(rnd.sample(WORDS, 8)) + ".",
+                f"https://example.com/posts/{i}.jpg", None, True, started,
+            )
+        self.subscribers = set()
+        self.executed = 0
+        self._queries = {
+            'post_by_qr_id': self._post_by_qr_id,
+            'news_page_by_type': self._news_page_by_type,
+            'news_page_by_type_id': self._news_page_by_type_id,
+            'news_page_all': self._news_page_all,
+            'news_first': self._news_first,
+            'news_before': self._news_before,
+            'news_after': self._news_after,
+            'news_count': self._news_count,
+            'news_category_counts': self._news_category_counts,
+            'subscriber_add': self._subscriber_add,
+        }
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    async def run(self, name: str, *args, conn=None):
+        return self._queries[name](*args)
+
+    async def execute(self, query, *args):
+        self.executed += 1
+        return "OK"
+
+    async def fetch(self, query, *args):
+        if query == NEWS_INDEX_SQL:
+            return [{'id': row.id, 'telegram_url': row.telegram_url, 'news_type': row.news_type, 'title': row.title}
+                    for row in self.news]
+        if query == POSTS_INDEX_SQL:
+            return [{field: getattr(post, field) for field in PostRow.__slots__} for post in self.posts.values()]
+        raise NotImplementedError(f"FakeDatabase.fetch: {query.split()[:6]}")
+
+    # --- Запросы реестра ---
+    def _post_by_qr_id(self, qr_id):
+        post = self.posts.get(qr_id)
+        return post if post is not None and post.is_active else None
+
+    def _news_page_by_type(self, news_type, limit, offset):
+        rows = self._by_type.get(news_type, [])
+        end = len(rows) - offset
+        return rows[max(0, end - limit):max(0, end)][::-1], len(rows)
+
+    def _news_page_by_type_id(self, news_type, limit, offset):
+        rows = self._by_type_id.get(news_type, [])
+        return rows[offset:offset + limit], len(rows)
+
+    def _news_page_all(self, limit, offset):
+        return self._all_by_id[offset:offset + limit], len(self._all_by_id)
+
+    def _news_first(self, news_type, limit):
+        return self._by_type.get(news_type, [])[-limit:][::-1]
+
+    def _news_before(self, news_type, created_at, news_id, limit):
+        rows = self._by_type.get(news_type, [])
+        end = bisect_left(self._keys.get(news_type, []), (created_at, news_id))
+        return rows[max(0, end - limit):end][::-1]
+
+    def _news_after(self, news_type, created_at, news_id, limit):
+        rows = self._by_type.get(news_type, [])
+        start = bisect_right(self._keys.get(news_type, []), (created_at, news_id))
+        return rows[start:start + limit]
+
+    def _news_count(self, news_type):
+        return len(self._by_type.get(news_type, []))
+
+    def _news_category_counts(self):
+        return [CategoryCountRow(news_type, len(rows)) for news_type, rows in self._by_type.items()]
+
+    def _subscriber_add(self, user_id):
+        if user_id in self.subscribers:
+            return "INSERT 0 0"
+        self.subscribers.add(user_id)
+        return "INSERT 0 1"
@@ -0,0 +1,429 @@
+# -*- coding: utf-8 -*-
+"""
+Нагрузочный прогон бота целиком без Telegram: бот работает как в проде (polling, FSM,
+кэши, журнал взаимодействий), а вместо api.telegram.org - заглушка benchmarks/fake_bot_api.py.
+Заглушка и виртуальные пользователи живут в отдельном процессе, чтобы их работа
+не занимала цикл событий бота.
+
+Сценарии (доли задаёт --mix):
+  qr     - сканирование QR: /start mountain:<код>, часть кодов неизвестна (--unknown-share),
+           --burst пользователей сканируют один код одновременно (группа у вершины);
+  browse - /news, категория, несколько нажатий "Вперёд";
+  search - "Поиск новостей" и ключевое слово.
+
+Нужна та же БД, что и у бота (.env). Перед прогоном применяются миграции, пустая таблица
+news заполняется стартовыми новостями, добавляются тестовые посты lt-0001...; после прогона
+тестовые посты и данные виртуальных пользователей удаляются (--keep-fixture - оставить).
+
+Запуск (из каталога telegram_bot_mountains):
+    python -m benchmarks.loadtest --users 200 --duration 60 --mix qr=5,browse=3,search=2
+    python -m benchmarks.loadtest --users 500 --burst 5 --mix qr=1 --fail-p99 qr_scan=150
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import random
+import re
+import sys
+import time
+from collections import defaultdict
+from urllib.parse import quote_plus
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery
+from aiohttp import web
+from dotenv import load_dotenv
+
+from benchmarks.common import make_db
+from benchmarks.fake_bot_api import BOT_USER, FakeBotAPI
+from bot.callbacks import (SEARCH_NEWS, Category, MainMenu, NewsCategories, NewsNav, SearchMore, SearchPrompt,
+                           ShowPost)
+
+TOKEN = f"{BOT_USER['id']}:loadtest"
+USER_BASE = 9_000_000 # id виртуальных пользователей: [USER_BASE, USER_BASE + USER_SPAN)
+USER_SPAN = 1_000_000
+BURST_STRIDE = 100_000 # Спутники пользователя в QR-всплеске: user_id + k * BURST_STRIDE
+FIXTURE_PREFIX = 'lt-'
+FALLBACK_KEYWORDS = ('эльбрус', 'восхождение', 'снаряжение', 'экспедиция', 'казбек')
+CALLBACK_NAMES = {cls.__prefix__: cls.__name__ for cls in
+                  (MainMenu, NewsCategories, SearchPrompt, Category, NewsNav, SearchMore, ShowPost)}
+CATEGORY_PREFIX = f"{Category.__prefix__}{Category.__separator__}"
+
+
+def percentile(values, p: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def _ms(value):
+    return f"{value:.1f}" if value is not None else "-"
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - {'qr', 'browse', 'search'}
+    if unknown:
+        raise argparse.ArgumentTypeError(f"неизвестные сценарии: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def parse_limits(items) -> dict:
+    limits = {}
+    for item in items or ():
+        step, _, ms = item.partition('=')
+        limits[step] = float(ms)
+    return limits
+
+
+# --- Процесс заглушки: Bot API и виртуальные пользователи ---
+class StepTimeout(Exception):
+    pass
+
+
+def _photo(reply):
+    return reply.method == 'sendPhoto'
+
+
+def _not_found(reply):
+    return reply.method == 'sendMessage' and 'не найдена' in reply.params.get('text', '')
+
+
+def _edited(reply):
+    return reply.method == 'editMessageText'
+
+
+def _menu(reply):
+    return reply.method == 'sendMessage' and bool(reply.buttons())
+
+
+def _sent(reply):
+    return reply.method == 'sendMessage'
+
+
+class VirtualUsers:
+    """Виртуальные пользователи: шлют апдейты в заглушку и ждут ответа бота на каждый шаг"""
+
+    def __init__(self, api: FakeBotAPI, options: dict, qr_ids, keywords):
+        self.api = api
+        self.qr_ids = qr_ids
+        self.keywords = keywords
+        self.timeout = options['timeout']
+        self.think = options['think_ms'] / 1000
+        self.burst = options['burst']
+        self.unknown_share = options['unknown_share']
+        self.max_pages = options['max_pages']
+        mix = options['mix']
+        self.scenarios = [getattr(self, f"scenario_{name}") for name in mix]
+        self.weights = list(mix.values())
+        self.samples = defaultdict(list) # шаг -> задержки, мс
+        self.timeouts = defaultdict(int)
+        self.delivery = [] # От отправки апдейта до того, как бот его забрал, мс
+        self.completed = 0
+
+    async def step(self, name: str, user_id: int, push, condition):
+        """Отправляет апдейт и ждёт первого подходящего ответа бота в чат user_id"""
+        future = self.api.expect(user_id, condition)
+        started = time.perf_counter()
+        update_id = push()
+        try:
+            reply = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts[name] += 1
+            raise StepTimeout(name)
+        self.samples[name].append((reply.at - started) * 1000)
+        delivered = self.api.delivered_at.pop(update_id, None)
+        if delivered is not None:
+            self.delivery.append((delivered - started) * 1000)
+        return reply
+
+    async def scenario_qr(self, user_id: int, rnd: random.Random):
+        unknown = rnd.random() < self.unknown_share or not self.qr_ids
+        code = f"{FIXTURE_PREFIX}missing-{rnd.randrange(10 ** 6)}" if unknown else rnd.choice(self.qr_ids)
+        text = f"/start {quote_plus('mountain:' + code)}"
+        name, condition = ('qr_unknown', _not_found) if unknown else ('qr_scan', _photo)
+        await asyncio.gather(*(
+            self.step(name, uid, lambda uid=uid: self.api.push_message(uid, text), condition)
+            for uid in range(user_id, user_id + self.burst * BURST_STRIDE, BURST_STRIDE)
+        ))
+
+    async def scenario_browse(self, user_id: int, rnd: random.Random):
+        reply = await self.step('news_menu', user_id, lambda: self.api.push_message(user_id, '/news'), _menu)
+        categories = [data for _, data in reply.buttons() if data and data.startswith(CATEGORY_PREFIX)]
+        if not categories:
+            return
+        data = rnd.choice(categories)
+        reply = await self.step('category', user_id, lambda: self.api.push_callback(user_id, data), _edited)
+        for _ in range(min(int(rnd.expovariate(0.7)), self.max_pages)): # Большинство смотрит 1-2 страницы
+            forward = [data for text, data in reply.buttons() if text and text.startswith("Вперёд")]
+            if not forward:
+                break
+            reply = await self.step('news_nav', user_id, lambda: self.api.push_callback(user_id, forward[0]), _edited)
+
+    async def scenario_search(self, user_id: int, rnd: random.Random):
+        await self.step('search_prompt', user_id, lambda: self.api.push_callback(user_id, SEARCH_NEWS), _edited)
+        keyword = rnd.choice(self.keywords)
+        await self.step('search', user_id, lambda: self.api.push_message(user_id, keyword), _sent)
+
+    async def user_loop(self, index: int, deadline: float, ramp: float):
+        rnd = random.Random(index)
+        user_id = USER_BASE + index
+        await asyncio.sleep(rnd.random() * ramp) # Пользователи приходят не все в одну миллисекунду
+        while time.monotonic() < deadline:
+            scenario = rnd.choices(self.scenarios, weights=self.weights)[0]
+            try:
+                await scenario(user_id, rnd)
+                self.completed += 1
+            except StepTimeout:
+                pass
+            if self.think:
+                await asyncio.sleep(rnd.expovariate(1 / self.think))
+
+    def report(self, elapsed: float) -> dict:
+        return {'samples': dict(self.samples), 'timeouts': dict(self.timeouts), 'delivery': self.delivery,
+                'completed': self.completed, 'elapsed': elapsed, 'calls': dict(self.api.calls)}
+
+
+async def _drive(conn, options: dict, qr_ids, keywords):
+    api = FakeBotAPI(api_latency=options['api_latency_ms'] / 1000)
+    runner = web.AppRunner(api.make_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    conn.send(site._server.sockets[0].getsockname()[1])
+    try:
+        await api.polling.wait()
+        users = VirtualUsers(api, options, qr_ids, keywords)
+        started = time.monotonic()
+        deadline = started + options['duration']
+        await asyncio.gather(*(users.user_loop(i, deadline, options['ramp']) for i in range(options['users'])))
+        conn.send(users.report(time.monotonic() - started))
+    finally:
+        await runner.cleanup()
+
+
+def drive(conn, options: dict, qr_ids, keywords):
+    """Точка входа процесса заглушки"""
+    asyncio.run(_drive(conn, options, qr_ids, keywords))
+
+
+# --- Процесс бота: замеры обработчиков и ожидания соединений пула ---
+class HandlerTimer(BaseMiddleware):
+    """Время обработчика по имени; все кнопки идут в один dispatch, поэтому для них - класс CallbackData"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    async def __call__(self, handler, event, data):
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.samples[self._name(event, data)].append((time.perf_counter() - started) * 1000)
+
+    @staticmethod
+    def _name(event, data) -> str:
+        if isinstance(event, CallbackQuery):
+            prefix = (event.data or '').split(Category.__separator__, 1)[0]
+            return f"callback:{CALLBACK_NAMES.get(prefix, prefix)}"
+        handler = data.get('handler')
+        return getattr(getattr(handler, 'callback', None), '__name__', 'message')
+
+
+class _TimedAcquire:
+    def __init__(self, context, waits: list):
+        self._context = context
+        self._waits = waits
+
+    def __await__(self):
+        return self._acquire().__await__()
+
+    async def _acquire(self):
+        started = time.perf_counter()
+        conn = await self._context
+        self._waits.append((time.perf_counter() - started) * 1000)
+        return conn
+
+    async def __aenter__(self):
+        started = time.perf_counter()
+        conn = await self._context.__aenter__()
+        self._waits.append((time.perf_counter() - started) * 1000)
+        return conn
+
+    async def __aexit__(self, *exc):
+        return await self._context.__aexit__(*exc)
+
+
+class TimedPool:
+    """Пул asyncpg, который запоминает, сколько ждали свободного соединения"""
+
+    def __init__(self, pool):
+        self._pool = pool
+        self.waits = []
+
+    def acquire(self, *args, **kwargs):
+        return _TimedAcquire(self._pool.acquire(*args, **kwargs), self.waits)
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+
+async def prepare_fixture(db, posts: int):
+    """Стартовые новости (если таблица пуста) и тестовые посты; возвращает их qr_id"""
+    from database.importer import SEED_PATH, NewsImporter, iter_csv
+
+    if not await db.fetchval("SELECT EXISTS (SELECT 1 FROM news)"):
+        result = await NewsImporter(db).load(iter_csv(SEED_PATH))
+        print(f"Загружены стартовые новости: {result['written']}")
+    await db.execute('''
+        INSERT INTO posts (qr_id, title, description, image_url)
+        SELECT $1 || lpad(n::text, 4, '0'), 'Нагрузочный пост ' || n,
+               'Описание вершины для нагрузочного прогона.', 'https://example.com/loadtest/' || n || '.jpg'
+        FROM generate_series(1, $2::int) AS n
+        ON CONFLICT (qr_id) DO NOTHING
+    ''', FIXTURE_PREFIX, posts)
+    rows = await db.fetch("SELECT qr_id FROM posts WHERE qr_id LIKE $1 AND is_active ORDER BY qr_id LIMIT $2",
+                          FIXTURE_PREFIX + '%', posts)
+    return [row['qr_id'] for row in rows]
+
+
+async def pick_keywords(db, limit: int = 50):
+    """Слова из заголовков новостей - поиск, который что-то находит"""
+    words = set()
+    for row in await db.fetch("SELECT title FROM news WHERE title IS NOT NULL ORDER BY id DESC LIMIT 500"):
+        words.update(word.lower() for word in re.findall(r"\w{6,}", row['title']))
+    return sorted(words)[:limit] or list(FALLBACK_KEYWORDS)
+
+
+async def cleanup_fixture():
+    db = make_db()
+    await db.connect()
+    try:
+        low, high = USER_BASE, USER_BASE + USER_SPAN
+        await db.execute("DELETE FROM user_interactions WHERE user_id >= $1 AND user_id < $2", low, high)
+        await db.execute("DELETE FROM subscribers WHERE user_id >= $1 AND user_id < $2", low, high)
+        await db.execute("DELETE FROM fsm_states WHERE key LIKE $1", f"fsm:{BOT_USER['id']}:%")
+        await db.execute("DELETE FROM posts WHERE qr_id LIKE $1", FIXTURE_PREFIX + '%')
+    finally:
+        await db.disconnect()
+
+
+def print_report(result: dict, timer: HandlerTimer, waits: list, limits: dict) -> bool:
+    """Печатает отчёт; False, если p99 какого-то шага выше порога --fail-p99"""
+    elapsed = result['elapsed']
+    total = sum(len(values) for values in result['samples'].values())
+    print(f"\nДлительность {elapsed:.1f} с, сценариев {result['completed']}, шагов {total} "
+          f"({total / elapsed:.1f}/с), таймаутов {sum(result['timeouts'].values())}")
+
+    print(f"\n{'шаг (от апдейта до ответа)':<28}{'кол-во':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'таймауты':>10}")
+    passed = True
+    for name in sorted(set(result['samples']) | set(result['timeouts'])):
+        values = result['samples'].get(name, [])
+        p99 = percentile(values, 99)
+        mark = ""
+        if name in limits and (p99 is None or p99 > limits[name]):
+            mark, passed = f"  > {limits[name]:g} мс", False
+        print(f"{name:<28}{len(values):>8}{_ms(percentile(values, 50)):>9}{_ms(percentile(values, 95)):>9}"
+              f"{_ms(p99):>9}{result['timeouts'].get(name, 0):>10}{mark}")
+    delivery = result['delivery']
+    print(f"{'доставка апдейта боту':<28}{len(delivery):>8}{_ms(percentile(delivery, 50)):>9}"
+          f"{_ms(percentile(delivery, 95)):>9}{_ms(percentile(delivery, 99)):>9}")
+
+    print(f"\n{'обработчик (внутри бота)':<28}{'кол-во':>8}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for name, values in sorted(timer.samples.items()):
+        print(f"{name:<28}{len(values):>8}{_ms(percentile(values, 50)):>9}{_ms(percentile(values, 95)):>9}"
+              f"{_ms(percentile(values, 99)):>9}")
+    print(f"{'ожидание соединения пула':<28}{len(waits):>8}{_ms(percentile(waits, 50)):>9}"
+          f"{_ms(percentile(waits, 95)):>9}{_ms(percentile(waits, 99)):>9}")
+
+    calls = ", ".join(f"{method} {count}" for method, count in sorted(result['calls'].items()))
+    print(f"\nВызовы Bot API: {calls}")
+    print("Задержки в мс.")
+    return passed
+
+
+async def run(args) -> int:
+    import main # Здесь, а не в начале модуля: процесс заглушки импортирует этот модуль заново
+
+    logging.getLogger().setLevel(args.log_level)
+    load_dotenv()
+    db = make_db()
+    await db.connect()
+    from database.migrate import migrate
+    await migrate(db)
+    qr_ids = await prepare_fixture(db, args.posts)
+    keywords = await pick_keywords(db)
+    db.pool = TimedPool(db.pool)
+
+    options = {key: getattr(args, key) for key in ('users', 'duration', 'ramp', 'think_ms', 'burst', 'unknown_share',
+                                                   'max_pages', 'timeout', 'api_latency_ms', 'mix')}
+    context = multiprocessing.get_context('spawn')
+    conn, child_conn = context.Pipe()
+    process = context.Process(target=drive, args=(child_conn, options, qr_ids, keywords), daemon=True)
+    process.start()
+    loop = asyncio.get_running_loop()
+
+    app = None
+    try:
+        port = await loop.run_in_executor(None, conn.recv)
+        app = main.TelegramBot()
+        app.db = db # setup_database возьмёт эту БД с замеряемым пулом
+        app.build(TOKEN, api_url=f"http://127.0.0.1:{port}")
+        timer = HandlerTimer()
+        app.dp.message.middleware(timer)
+        app.dp.callback_query.middleware(timer)
+        print(f"Пользователей {args.users}, {args.duration:g} с, сценарии {args.mix}, "
+              f"тестовых постов {len(qr_ids)}, ключевых слов {len(keywords)}")
+
+        polling = asyncio.create_task(app.dp.start_polling(app.bot, handle_signals=False))
+        receive = loop.run_in_executor(None, conn.recv)
+        await asyncio.wait({polling, receive}, return_when=asyncio.FIRST_COMPLETED)
+        if not receive.done():
+            print("Бот остановился до конца прогона, см. bot.log")
+            process.terminate()
+            return 1
+        result = receive.result()
+        await app.dp.stop_polling()
+        await polling
+    finally:
+        process.join(5)
+        if process.is_alive():
+            process.terminate()
+        if app is None:
+            await db.disconnect() # Иначе пул закрывает on_shutdown бота
+        if not args.keep_fixture:
+            await cleanup_fixture()
+
+    return 0 if print_report(result, timer, db.pool.waits, parse_limits(args.fail_p99)) else 1
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=30, help='секунд нагрузки')
+    parser.add_argument('--ramp', type=float, default=1.0, help='за сколько секунд подключаются все пользователи')
+    parser.add_argument('--think-ms', type=float, default=500, help='средняя пауза пользователя между сценариями')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('qr=5,browse=3,search=2'))
+    parser.add_argument('--burst', type=int, default=1, help='сколько пользователей сканируют один QR одновременно')
+    parser.add_argument('--unknown-share', type=float, default=0.05, help='доля сканов неизвестных кодов')
+    parser.add_argument('--max-pages', type=int, default=5, help='максимум нажатий "Вперёд" в категории')
+    parser.add_argument('--posts', type=int, default=50, help='тестовых постов с QR-кодами')
+    parser.add_argument('--timeout', type=float, default=10, help='сколько ждать ответа бота на шаг, с')
+    parser.add_argument('--api-latency-ms', type=float, default=0, help='задержка ответов заглушки Bot API')
+    parser.add_argument('--fail-p99', action='append', metavar='ШАГ=МС',
+                        help='код выхода 1, если p99 шага выше порога (можно несколько раз)')
+    parser.add_argument('--log-level', default='WARNING', help='уровень логов бота на время прогона')
+    parser.add_argument('--keep-fixture', action='store_true', help='не удалять тестовые посты и данные пользователей')
+    args = parser.parse_args()
+    if not 0 < args.users <= BURST_STRIDE or not 1 <= args.burst <= USER_SPAN // BURST_STRIDE:
+        parser.error(f"--users от 1 до {BURST_STRIDE}, --burst от 1 до {USER_SPAN // BURST_STRIDE}")
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Прогон вебхука записанными или синтетическими апдейтами: пропускная способность и задержка ответа.
+
+Апдейты записывает сам бот в режиме вебхука при WEBHOOK_RECORD=updates.jsonl.
+
+Запуск (из каталога telegram_bot_mountains):
+    # против запущенного бота (BOT_MODE=webhook)
+    python -m benchmarks.replay_webhook --url http://127.0.0.1:8080/webhook --secret $WEBHOOK_SECRET updates.jsonl
+    # полностью офлайн: WebhookServer с тестовым диспетчером в этом же процессе
+    python -m benchmarks.replay_webhook --local --updates 20000 --work-ms 5
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from collections import Counter
+
+from aiohttp import ClientSession, TCPConnector, web
+
+from bot.webhook import SECRET_HEADER
+
+TEXTS = ['/start', '/help', '/news', 'Эльбрус', '/start mountain%3Aelbrus']
+
+
+def synthetic_updates(count: int):
+    for i in range(count):
+        user = {'id': 100000 + i % 5000, 'is_bot': False, 'first_name': 'Тест'}
+        if i % 3 == 2:
+            yield {'update_id': i, 'callback_query': {
+                'id': str(i), 'from': user, 'chat_instance': '1', 'data': 'news_categories',
+                'message': {'message_id': i, 'date': 0, 'chat': {'id': user['id'], 'type': 'private'}, 'text': 'меню'},
+            }}
+        else:
+            yield {'update_id': i, 'message': {
+                'message_id': i, 'date': 0, 'chat': {'id': user['id'], 'type': 'private'},
+                'from': user, 'text': TEXTS[i % len(TEXTS)],
+            }}
+
+
+def load_updates(path: str, count: int):
+    with open(path, encoding='utf-8') as f:
+        updates = [json.loads(line) for line in f if line.strip()]
+    # Повторяем запись по кругу до нужного количества, с уникальными update_id
+    for i in range(count or len(updates)):
+        update = dict(updates[i % len(updates)])
+        update['update_id'] = i
+        yield update
+
+
+async def replay(url: str, secret: str, updates, concurrency: int):
+    headers = {SECRET_HEADER: secret} if secret else {}
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    timings, statuses = [], Counter()
+
+    async def sender(session):
+        while True:
+            update = await queue.get()
+            if update is None:
+                return
+            started = time.perf_counter()
+            async with session.post(url, json=update, headers=headers) as response:
+                await response.read()
+                statuses[response.status] += 1
+            timings.append((time.perf_counter() - started) * 1000)
+
+    async with ClientSession(connector=TCPConnector(limit=concurrency)) as session:
+        started = time.perf_counter()
+        senders = [asyncio.create_task(sender(session)) for _ in range(concurrency)]
+        for update in updates:
+            await queue.put(update)
+        for _ in senders:
+            await queue.put(None)
+        await asyncio.gather(*senders)
+        elapsed = time.perf_counter() - started
+    return timings, statuses, elapsed
+
+
+def local_server(work_ms: float, max_concurrency: int, max_pending: int):
+    """WebhookServer с диспетчером, чьи обработчики только имитируют работу - без Telegram и БД"""
+    from aiogram import Bot, Dispatcher
+    from bot.webhook import WebhookServer
+
+    dp = Dispatcher()
+    handled = Counter()
+
+    async def handler(event):
+        await asyncio.sleep(work_ms / 1000)
+        handled['done'] += 1
+
+    dp.message.register(handler)
+    dp.callback_query.register(handler)
+    bot = Bot(token='123456:offline-replay')
+    return WebhookServer(dp, bot, secret_token='replay', max_concurrency=max_concurrency,
+                         max_pending=max_pending), handled
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('recorded', nargs='?', help='JSONL с записанными апдейтами; без него - синтетические')
+    parser.add_argument('--url', default='http://127.0.0.1:8080/webhook')
+    parser.add_argument('--secret', default=None)
+    parser.add_argument('--updates', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=50, help='одновременных запросов к вебхуку')
+    parser.add_argument('--local', action='store_true', help='поднять тестовый вебхук в этом процессе')
+    parser.add_argument('--work-ms', type=float, default=5.0, help='--local: время "обработки" апдейта')
+    parser.add_argument('--server-concurrency', type=int, default=100, help='--local: max_concurrency сервера')
+    args = parser.parse_args()
+
+    updates = load_updates(args.recorded, args.updates) if args.recorded else synthetic_updates(args.updates)
+
+    server = handled = runner = None
+    if args.local:
+        server, handled = local_server(args.work_ms, args.server_concurrency, max_pending=args.updates + 1)
+        runner = web.AppRunner(server.make_app())
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', 0).start()
+        port = runner.addresses[0][1]
+        args.url, args.secret = f"http://127.0.0.1:{port}{server.path}", server.secret_token
+
+    timings, statuses, elapsed = await replay(args.url, args.secret, updates, args.concurrency)
+
+    if server is not None:
+        drain_started = time.perf_counter()
+        await server.drain()
+        drain_s = time.perf_counter() - drain_started
+        await runner.cleanup()
+        await server.bot.session.close()
+        print(f"Обработано диспетчером: {handled['done']}, дорабатывали после прогона {drain_s:.2f} с")
+
+    timings.sort()
+    print(f"Апдейтов: {len(timings)} за {elapsed:.2f} с ({len(timings) / elapsed:.0f} в секунду)")
+    print(f"Ответы: {dict(statuses)}")
+    print(f"Задержка ответа, мс: p50 {statistics.median(timings):.2f}, "
+          f"p95 {timings[int(len(timings) * 0.95) - 1]:.2f}, p99 {timings[int(len(timings) * 0.99) - 1]:.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
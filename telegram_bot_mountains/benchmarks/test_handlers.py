@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Горячие обработчики (HandlerCases из bench_handlers) под pytest-benchmark: результаты сохраняются
+в .benchmarks с id коммита, и каждый следующий прогон сравнивается с сохранённым.
+
+    pip install -r requirements-dev.txt
+    python -m pytest benchmarks/test_handlers.py --benchmark-autosave
+    python -m pytest benchmarks/test_handlers.py --benchmark-compare --benchmark-compare-fail=mean:10%
+
+Один раунд - BATCH вызовов в одном run_until_complete: запуск цикла событий на каждый вызов
+исказил бы микросекунды. Время в отчёте - на раунд: при BATCH = 100 1 мс на раунд - это 10 мкс на вызов.
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from benchmarks.bench_handlers import CASES, HandlerCases  # noqa: E402
+
+BATCH = 100
+
+
+@pytest.fixture(scope='module')
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope='module')
+def cases(loop):
+    cases = loop.run_until_complete(HandlerCases.create())
+    yield cases
+    loop.run_until_complete(cases.close())
+
+
+async def _repeat(operation, times: int):
+    for _ in range(times):
+        await operation()
+
+
+@pytest.mark.parametrize('name', CASES)
+def test_handler(benchmark, loop, cases, name):
+    operation = getattr(cases, name)
+    requests = cases.app.bot.session.requests
+    before = sum(requests.values())
+    loop.run_until_complete(_repeat(operation, 10)) # Прогрев кэшей (file_id фото, страницы новостей)
+    assert sum(requests.values()) > before, f"{name}: обработчик не обратился к Bot API"
+
+    benchmark.extra_info['batch'] = BATCH
+    benchmark.pedantic(loop.run_until_complete, setup=lambda: ((_repeat(operation, BATCH),), {}),
+                       rounds=50, warmup_rounds=2)
+
+
+def test_search_posts_branches(loop, cases):
+    """Случаи поиска постов действительно идут по разным веткам: один результат, ничего, страница"""
+    app = cases.app
+    requests = app.bot.session.requests
+    before = dict(requests)
+    loop.run_until_complete(cases.search_posts_one())
+    assert requests['SendPhoto'] == before.get('SendPhoto', 0) + 1 # Карточка поста
+    results, _ = loop.run_until_complete(app.search_index.search_posts('эверест', None, 10))
+    assert results == []
+    results, next_cursor = loop.run_until_complete(app.search_index.search_posts('эльбрус', None, 10))
+    assert len(results) == 10 and next_cursor
@@ -0,0 +1,236 @@
+"""
+Типизированные callback_data инлайн-кнопок и маршрутизация по префиксу.
+
+Каждое действие - свой класс CallbackData с коротким префиксом и свой обработчик.
+Все кнопки обслуживает один обработчик aiogram: префикс (до первого ':') ищется в словаре,
+и разбирается только callback_data выбранного действия - без перебора фильтров и цепочки if/elif.
+"""
+import logging
+import time
+from datetime import datetime
+from typing import Optional
+
+from aiogram.filters.callback_data import MAX_CALLBACK_LENGTH, CallbackData
+
+from bot.log_setup import note_handler
+from utils.pagination import encode_cursor
+
+logger = logging.getLogger(__name__)
+
+
+class MainMenu(CallbackData, prefix='mm'):
+    pass
+
+
+class NewsCategories(CallbackData, prefix='nc'):
+    pass
+
+
+class SearchPrompt(CallbackData, prefix='sq'):
+    kind: str # 'n' - новости, 'p' - посты
+
+
+class Category(CallbackData, prefix='c'):
+    key: str # Ключ категории из NewsCategoryCatalog
+
+
+class NewsNav(CallbackData, prefix='n'):
+    key: str
+    offset: int
+    direction: Optional[str] = None # None - старые кнопки с OFFSET-пагинацией
+    cursor: Optional[str] = None
+
+
+class SearchMore(CallbackData, prefix='s'):
+    kind: str
+    query: str # Ключ запроса из SearchEngine.remember_query
+    offset: int
+    cursor: str
+
+
+class ShowPost(CallbackData, prefix='p'):
+    qr_id: str
+
+
+# Кнопки без параметров упаковываются один раз
+MAIN_MENU = MainMenu().pack()
+NEWS_CATEGORIES = NewsCategories().pack()
+SEARCH_NEWS = SearchPrompt(kind='n').pack()
+SEARCH_POSTS = SearchPrompt(kind='p').pack()
+
+# Самые длинные значения полей: регистрация действия проверяет, что они помещаются в 64 байта
+WIDEST = {
+    Category: Category(key='f' * 16),
+    NewsNav: NewsNav(key='f' * 16, offset=10 ** 6 - 1, direction='p',
+                     cursor=encode_cursor(datetime(2199, 12, 31), 2 ** 31 - 1)),
+    SearchMore: SearchMore(kind='p', query='f' * 8, offset=10 ** 6 - 1, cursor='t' + 'f' * 16),
+    ShowPost: ShowPost(qr_id='x' * 50), # posts.qr_id VARCHAR(50), ASCII
+    SearchPrompt: SearchPrompt(kind='p'),
+}
+
+# Кнопки, отправленные до перехода на префиксы, остаются в истории чатов
+_LEGACY_STATIC = {
+    'main_menu': (MainMenu.__prefix__,),
+    'show_news': (NewsCategories.__prefix__,),
+    'show_categories_menu': (NewsCategories.__prefix__,),
+    'search_news': (SearchPrompt.__prefix__, 'n'),
+    'search_posts': (SearchPrompt.__prefix__, 'p'),
+}
+
+
+def parse_legacy(data: str) -> Optional[list]:
+    """
+    Старые форматы: main_menu, news_category:{ключ}, news_nav:{ключ}:{offset}[:{n|p}:{курсор}],
+    search_more:{n|p}:{ключ запроса}:{offset}:{курсор}, show_post_{qr_id}.
+    Возвращает части в новом формате (префикс, поля...) для разбора тем же маршрутом.
+    """
+    static = _LEGACY_STATIC.get(data)
+    if static is not None:
+        return list(static)
+    if data.startswith('show_post_'):
+        return [ShowPost.__prefix__, data[len('show_post_'):]]
+    head, _, rest = data.partition(':')
+    if head == 'news_category':
+        return [Category.__prefix__, rest]
+    if head == 'news_nav':
+        parts = rest.split(':')
+        if len(parts) > 3:
+            return [NewsNav.__prefix__, parts[0], parts[1], parts[2], parts[3]]
+        if len(parts) == 2:
+            return [NewsNav.__prefix__, parts[0], parts[1], '', '']
+        return None
+    if head == 'search_more':
+        parts = rest.split(':', 3)
+        return [SearchMore.__prefix__, *parts] if len(parts) == 4 else None
+    return None
+
+
+def show_post_data(qr_id: str) -> Optional[str]:
+    """
+    callback_data кнопки поста. pack() отказывает, если в qr_id есть ':' - такой код уходит в старом
+    формате show_post_{qr_id}, его разбирает parse_legacy. None - кнопка не помещается в 64 байта.
+    """
+    try:
+        return ShowPost(qr_id=qr_id).pack()
+    except ValueError:
+        data = f"show_post_{qr_id}"
+        return data if len(data.encode()) <= MAX_CALLBACK_LENGTH else None
+
+
+SEPARATOR = ':' # Разделитель CallbackData по умолчанию, у всех действий он один
+
+
+def _optional_int(value: str) -> Optional[int]:
+    return int(value) if value else None
+
+
+def _optional_str(value: str) -> Optional[str]:
+    return value or None
+
+
+# Аннотация поля -> разбор его части callback_data (так же упаковывает CallbackData.pack: None -> '')
+_CONVERTERS = {int: int, Optional[int]: _optional_int, str: str, Optional[str]: _optional_str}
+
+
+def _field_converters(factory: type) -> tuple:
+    """(имя поля, разбор) по порядку полей; поддерживаются str и int, в том числе Optional"""
+    if factory.__separator__ != SEPARATOR:
+        raise ValueError(f"{factory.__name__}: разделитель должен быть {SEPARATOR!r}")
+    converters = []
+    for name, field in factory.model_fields.items():
+        convert = _CONVERTERS.get(field.annotation)
+        if convert is None:
+            raise TypeError(f"{factory.__name__}.{name}: поддерживаются только поля str и int")
+        converters.append((name, convert))
+    return tuple(converters)
+
+
+def parse_parts(factory: type, converters: tuple, parts: list):
+    """
+    CallbackData из уже разрезанной по SEPARATOR строки: части сопоставляются с полями по порядку
+    и приводятся по аннотации ('' у Optional -> None, как упаковывает pack). Валидация pydantic
+    остаётся: на готовых значениях она быстрее model_construct. Ошибки - ValueError (ValidationError тоже).
+    """
+    if len(parts) != len(converters) + 1:
+        raise ValueError(f"{factory.__name__}: ожидалось {len(converters) + 1} частей, получено {len(parts)}")
+    return factory(**{name: convert(value) for (name, convert), value in zip(converters, parts[1:])})
+
+
+class CallbackRouter:
+    """
+    Таблица префикс -> (разбор, обработчик). Обработчик вызывается
+    как handler(callback, callback_data, state).
+    """
+
+    def __init__(self):
+        self._routes = {} # префикс -> (класс CallbackData, обработчик)
+        self._parsers = {} # префикс -> (класс, разбор полей, обработчик): горячий путь resolve
+        self.dispatched = 0
+        self.legacy = 0
+        self.unknown = 0
+        self.metrics = None # BotMetrics: время и ошибки по обработчикам действий
+
+    def register(self, factory: type, handler):
+        prefix = factory.__prefix__
+        if prefix in self._routes:
+            raise ValueError(f"Префикс callback_data {prefix!r} уже занят {self._routes[prefix][0].__name__}")
+        widest = WIDEST.get(factory)
+        if widest is None:
+            widest = factory() # Действие без параметров
+        packed = widest.pack() # pack() сам отказывает при превышении лимита
+        logger.debug(f"callback {factory.__name__}: до {len(packed.encode())} из {MAX_CALLBACK_LENGTH} байт")
+        self._routes[prefix] = (factory, handler)
+        self._parsers[prefix] = (factory, _field_converters(factory), handler)
+
+    def resolve(self, data: str):
+        """(обработчик, callback_data) или (None, None), если действие неизвестно"""
+        parts = data.split(SEPARATOR)
+        route = self._parsers.get(parts[0])
+        if route is not None:
+            factory, converters, handler = route
+            try:
+                return handler, parse_parts(factory, converters, parts)
+            except ValueError:
+                pass # Совпал префикс, но не формат - возможно, это старая кнопка
+        parts = parse_legacy(data)
+        if parts is not None:
+            route = self._parsers.get(parts[0])
+            if route is not None:
+                factory, converters, handler = route
+                try:
+                    parsed = parse_parts(factory, converters, parts)
+                except ValueError:
+                    return None, None
+                self.legacy += 1
+                return handler, parsed
+        return None, None
+
+    async def dispatch(self, callback, state):
+        """Единственный обработчик callback_query в диспетчере"""
+        handler, callback_data = self.resolve(callback.data or '')
+        if handler is None:
+            self.unknown += 1
+            logger.warning(f"Неизвестный callback: {callback.data!r}")
+            await callback.answer("Неизвестное действие.")
+            return
+        self.dispatched += 1
+        note_handler(handler.__name__)
+        started = time.perf_counter()
+        try:
+            await handler(callback, callback_data, state)
+        except Exception as e:
+            logger.error(f"Ошибка обработки callback {callback.data!r}: {e}")
+            if self.metrics is not None:
+                self.metrics.handler_errors.inc((handler.__name__,))
+            await state.clear()
+            try:
+                await callback.answer("Произошла ошибка, попробуйте ещё раз.", show_alert=True)
+            except Exception:
+                pass # Коллбэк уже был отвечен обработчиком
+        if self.metrics is not None:
+            self.metrics.handler_seconds.observe((handler.__name__,), time.perf_counter() - started)
+
+    @property
+    def stats(self) -> dict:
+        return {'routes': len(self._routes), 'dispatched': self.dispatched,
+                'legacy': self.legacy, 'unknown': self.unknown}
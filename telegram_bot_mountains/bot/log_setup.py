@@ -0,0 +1,194 @@
+"""
+Логирование без блокировки цикла событий: записи уходят в очередь (QueueHandler), а файл
+и консоль пишет фоновый поток QueueListener. В файл - JSON по строке на запись с контекстом
+апдейта (update_id, user_id, handler, duration_ms), файл ротируется по размеру.
+
+Настройка через окружение:
+    LOG_LEVEL=INFO                              уровень корневого логгера
+    LOG_LEVELS=aiogram.event=WARNING,database=DEBUG   уровни по модулям (префиксам имён логгеров)
+    LOG_SAMPLE=bot.updates=0.1                  доля записей INFO и ниже, которая пишется, по модулям
+    LOG_FILE=bot.log, LOG_MAX_BYTES, LOG_BACKUPS  файл и ротация; LOG_FILE= (пусто) - без файла
+    LOG_CONSOLE=1, LOG_CONSOLE_FORMAT=text|json  вывод в консоль
+    LOG_SLOW_UPDATE_MS=1000                     апдейты дольше - WARNING, мимо выборки
+"""
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from aiogram import BaseMiddleware
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+CONTEXT_FIELDS = ('update_id', 'user_id', 'handler')
+
+# Контекст текущего апдейта: словарь, который заполняют middleware и CallbackRouter
+update_context = contextvars.ContextVar('update_context', default=None)
+updates_logger = logging.getLogger('bot.updates')
+
+
+def note_handler(name: str):
+    """Запоминает выбранный обработчик в контексте апдейта (для записи об апдейте и логов внутри него)"""
+    context = update_context.get()
+    if context is not None:
+        context['handler'] = name
+
+
+class ContextFilter(logging.Filter):
+    """Переносит контекст апдейта в запись - в потоке, где она создана: у фонового потока контекста нет"""
+
+    def filter(self, record):
+        context = update_context.get()
+        if context is not None:
+            for field in CONTEXT_FIELDS:
+                if field not in record.__dict__:
+                    setattr(record, field, context[field])
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает долю rate записей INFO и ниже по префиксу имени логгера; WARNING и выше - всегда"""
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        # Длинные префиксы первыми: 'aiogram.event' важнее 'aiogram'
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+        self._cache = {}
+        self.dropped = 0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self._cache.get(record.name)
+        if rate is None:
+            rate = self._cache[record.name] = next(
+                (rate for prefix, rate in self.rates if record.name == prefix or record.name.startswith(prefix + '.')),
+                1.0)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        self.dropped += 1
+        return False
+
+
+class _QueueHandler(QueueHandler):
+    """
+    Как QueueHandler, но сообщение и трассировка готовятся отдельно, а не склеиваются
+    в одну строку: JSON-форматтер в фоновом потоке кладёт их в разные поля.
+    """
+
+    def prepare(self, record):
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Компактная JSON-строка: время, уровень, логгер, сообщение и всё, что передано через extra"""
+
+    _standard = set(logging.makeLogRecord({}).__dict__) | {'message', 'asctime'}
+
+    def format(self, record):
+        entry = {
+            'ts': f"{time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created))}.{int(record.msecs):03d}",
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in self._standard and value is not None:
+                entry[key] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class UpdateLogMiddleware(BaseMiddleware):
+    """
+    Внешний middleware dp.update: открывает контекст апдейта и по завершении пишет одну запись
+    в bot.updates - пользователь, обработчик, длительность. Медленные и упавшие - WARNING.
+    """
+
+    def __init__(self, slow_ms: float = 1000):
+        self.slow = slow_ms / 1000
+
+    async def __call__(self, handler, event, data):
+        user = data.get('event_from_user')
+        context = {'update_id': event.update_id, 'user_id': user.id if user else None, 'handler': None}
+        token = update_context.set(context)
+        started = time.perf_counter()
+        error = None
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            level = logging.WARNING if error or duration >= self.slow else logging.INFO
+            if updates_logger.isEnabledFor(level):
+                message = f"Апдейт {event.update_id}: {context['handler'] or '-'}, {duration * 1000:.1f} мс"
+                updates_logger.log(level, message, extra={'duration_ms': round(duration * 1000, 2), 'error': error})
+            update_context.reset(token)
+
+
+class HandlerNameMiddleware(BaseMiddleware):
+    """Внутренний middleware dp.message: имя обработчика сообщения в контекст апдейта"""
+
+    async def __call__(self, handler, event, data):
+        note_handler(data['handler'].callback.__name__)
+        return await handler(event, data)
+
+
+def _pairs(value: str) -> dict:
+    """'a=1,b.c=2' -> {'a': '1', 'b.c': '2'}"""
+    pairs = {}
+    for item in value.split(','):
+        name, _, setting = item.partition('=')
+        if name.strip() and setting.strip():
+            pairs[name.strip()] = setting.strip()
+    return pairs
+
+
+def setup_logging() -> QueueListener:
+    """Настраивает корневой логгер по окружению и запускает фоновый поток записи; остановка - при выходе"""
+    handlers = []
+    log_file = os.getenv('LOG_FILE', 'bot.log')
+    if log_file:
+        file_handler = RotatingFileHandler(log_file, maxBytes=int(os.getenv('LOG_MAX_BYTES', 20 * 1024 * 1024)),
+                                           backupCount=int(os.getenv('LOG_BACKUPS', 5)), encoding='utf-8')
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+    if os.getenv('LOG_CONSOLE', '1') == '1':
+        console = logging.StreamHandler()
+        console.setFormatter(JsonFormatter() if os.getenv('LOG_CONSOLE_FORMAT') == 'json'
+                             else logging.Formatter(TEXT_FORMAT))
+        handlers.append(console)
+
+    records = queue.SimpleQueue()
+    queue_handler = _QueueHandler(records)
+    queue_handler.addFilter(SamplingFilter({name: float(rate) for name, rate
+                                            in _pairs(os.getenv('LOG_SAMPLE', '')).items()}))
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    # Об апдейтах пишет UpdateLogMiddleware, собственная запись aiogram на каждый апдейт - лишняя
+    levels = {'aiogram.event': 'WARNING'}
+    levels.update(_pairs(os.getenv('LOG_LEVELS', '')))
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop) # Дописывает очередь до конца
+    return listener
@@ -0,0 +1,97 @@
+"""
+Метрики бота: апдейты, обработчики, вызовы Bot API и БД. Запись - пара perf_counter
+и одна гистограмма на событие; выдача в формате Prometheus (services/metrics.py).
+"""
+import time
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+from services.metrics import Metrics
+
+
+class BotMetrics(Metrics):
+    def __init__(self):
+        super().__init__()
+        self.updates = self.counter('bot_updates_total', 'Полученные апдейты', ('type',))
+        self.update_errors = self.counter('bot_update_errors_total', 'Апдейты, завершившиеся исключением', ('type',))
+        self.update_seconds = self.histogram('bot_update_seconds', 'Обработка апдейта целиком', ('type',))
+        self.handler_seconds = self.histogram('bot_handler_seconds', 'Время обработчика или действия кнопки',
+                                              ('handler',))
+        self.handler_errors = self.counter('bot_handler_errors_total', 'Ошибки обработчиков', ('handler',))
+        self.api_seconds = self.histogram('bot_api_request_seconds', 'Вызовы Bot API', ('method',))
+        self.api_errors = self.counter('bot_api_errors_total', 'Неудачные вызовы Bot API', ('method',))
+        self.db_pool_wait = self.histogram('db_pool_acquire_seconds', 'Ожидание свободного соединения пула')
+        self.db_query_seconds = self.histogram('db_query_seconds', 'Именованные запросы реестра', ('query',))
+
+    def watch_pool(self, pool):
+        """Размер пула и занятые соединения - читаются в момент выдачи метрик"""
+        self.gauge('db_pool_size', 'Соединений в пуле', pool.get_size)
+        self.gauge('db_pool_in_use', 'Занятых соединений пула', lambda: pool.get_size() - pool.get_idle_size())
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Внешний middleware dp.update: количество, ошибки и полное время апдейта по типу"""
+
+    def __init__(self, metrics: BotMetrics):
+        self.metrics = metrics
+
+    async def __call__(self, handler, event, data):
+        key = _update_type(event)
+        self.metrics.updates.inc(key)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.metrics.update_errors.inc(key)
+            raise
+        finally:
+            self.metrics.update_seconds.observe(key, time.perf_counter() - started)
+
+
+def _update_type(update) -> tuple:
+    # Update.event_type кэшируется через lru_cache по хэшу модели - это несколько мкс; частые типы проверяем сами
+    if update.message is not None:
+        return ('message',)
+    if update.callback_query is not None:
+        return ('callback_query',)
+    return (update.event_type,)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Внутренний middleware наблюдателя (dp.message): время по имени выбранного обработчика.
+    Кнопки все идут в CallbackRouter.dispatch, их время по действиям пишет сам роутер.
+    """
+
+    def __init__(self, metrics: BotMetrics):
+        self.metrics = metrics
+
+    async def __call__(self, handler, event, data):
+        key = (data['handler'].callback.__name__,)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.metrics.handler_errors.inc(key)
+            raise
+        finally:
+            self.metrics.handler_seconds.observe(key, time.perf_counter() - started)
+
+
+class BotAPIMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии Bot API: время и ошибки каждого вызова по имени метода"""
+
+    def __init__(self, metrics: BotMetrics):
+        self.metrics = metrics
+
+    async def __call__(self, make_request, bot, method):
+        key = (method.__api_method__,)
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            self.metrics.api_errors.inc(key)
+            raise
+        finally:
+            self.metrics.api_seconds.observe(key, time.perf_counter() - started)
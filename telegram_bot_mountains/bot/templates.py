@@ -0,0 +1,165 @@
+"""
+Тексты и клавиатуры бота, собранные один раз при импорте.
+
+Статические клавиатуры - общие объекты на весь процесс, их нельзя изменять после создания.
+Их JSON для reply_markup тоже готовится один раз (PrebuiltMarkupSession). Клавиатуры
+с параметрами (список категорий) запоминаются в ограниченном LRU (KeyboardCache).
+"""
+from collections import OrderedDict
+
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from bot.callbacks import MAIN_MENU, NEWS_CATEGORIES, SEARCH_NEWS, SEARCH_POSTS, Category
+
+CHAT_URL = "https://t.me/topofrussia"
+CHANNEL_URL = "https://t.me/TopRussiaBrand"
+SITE_URL = "https://xn--80adjmba6ajodma8f.xn--p1ai/"
+
+# --- Тексты ---
+START_TEXT = (
+    "🏔️ <b>Добро пожаловать в бот сообщества \"Вершина России\"!</b>\n\n"
+    "Этот бот поможет вам узнать больше о горах России через QR-коды "
+    "и получить актуальные новости о восхождениях и экспедициях.\n\n"
+    "🔍 <b>Возможности:</b>\n"
+    "• Сканирование QR-кодов для получения информации о горах\n"
+    "• Поиск новостей и статей\n"
+    "• Доступ к сообществу любителей гор\n\n"
+    "📱 <b>Команды:</b>\n"
+    "/start - Главное меню\n"
+    "/news - Последние новости\n"
+    "/help - Подробная справка"
+)
+
+HELP_TEXT = (
+    "📖 <b>Справка по боту \"Вершины России\"</b>\n\n"
+    "🔍 <b>Основные функции:</b>\n"
+    "• Получение информации о горах через QR-коды\n"
+    "• Поиск новостей и статей о восхождениях\n"
+    "• Доступ к сообществу любителей гор\n\n"
+    "🎯 <b>Как работать с QR-кодами:</b>\n"
+    "1. Найдите QR-код рядом с информацией о горе\n"
+    "2. Отсканируйте его камерой телефона\n"
+    "3. Нажмите на ссылку - откроется этот бот\n"
+    "4. Получите подробную информацию\n\n"
+    "💬 <b>Сообщество:</b>\n"
+    f"• Общий чат: {CHAT_URL}\n"
+    f"• Канал новостей: {CHANNEL_URL}\n"
+    f"• Официальный сайт: {SITE_URL}"
+)
+
+MAIN_MENU_TEXT = "🏔️ Главное меню\nВыберите действие:"
+CATEGORIES_TEXT = "📰 <b>Категории новостей:</b>\n\nВыберите интересующую категорию:"
+QR_WELCOME_TEXT = (
+    "🏔️ <b>Добро пожаловать!</b>\n\n"
+    "Вы отсканировали QR-код!\n"
+    "📍 Информация о: <b>{title}</b>\n\n"
+    "Присоединяйтесь к нашему сообществу! 👇"
+)
+
+# --- Статические клавиатуры ---
+_MAIN_MENU_BUTTON = InlineKeyboardButton(text="🏠 Главное меню", callback_data=MAIN_MENU)
+MAIN_MENU_ROW = [_MAIN_MENU_BUTTON]
+
+MAIN_MENU_MARKUP = InlineKeyboardMarkup(inline_keyboard=[
+    [
+        InlineKeyboardButton(text="💬 Общий чат", url=CHAT_URL),
+        InlineKeyboardButton(text="📢 Наш канал", url=CHANNEL_URL)
+    ],
+    [
+        InlineKeyboardButton(text="📸 Фотомарафон", url=f"{CHANNEL_URL}/618"),
+        InlineKeyboardButton(text="📰 Новости", callback_data=NEWS_CATEGORIES)
+    ],
+    [
+        InlineKeyboardButton(text="🌟 Официальный сайт", url=SITE_URL)
+    ]
+])
+
+# Клавиатура поста пока не зависит от поста: кнопки "Следующий пост" и "Найти похожее" отключены
+POST_MARKUP = InlineKeyboardMarkup(inline_keyboard=[
+    [
+        InlineKeyboardButton(text="💬 Обсудить в чате", url=CHAT_URL),
+        InlineKeyboardButton(text="📢 Больше новостей", url=CHANNEL_URL)
+    ],
+    MAIN_MENU_ROW
+])
+
+BACK_TO_MENU_MARKUP = InlineKeyboardMarkup(inline_keyboard=[MAIN_MENU_ROW])
+
+NEWS_NOT_FOUND_MARKUP = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="📰 Все категории", callback_data=NEWS_CATEGORIES)],
+    MAIN_MENU_ROW
+])
+
+POSTS_NOT_FOUND_MARKUP = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="🔍 Новый поиск", callback_data=SEARCH_POSTS)],
+    MAIN_MENU_ROW
+])
+
+# Ряды, которые добавляются в конец клавиатур результатов поиска и страниц новостей
+SEARCH_NEWS_FOOTER = [InlineKeyboardButton(text="🔍 Новый поиск", callback_data=SEARCH_NEWS), _MAIN_MENU_BUTTON]
+NEWS_PAGE_FOOTER = [
+    [InlineKeyboardButton(text="◀️ В меню категорий", callback_data=NEWS_CATEGORIES)],
+    MAIN_MENU_ROW
+]
+
+PREBUILT_MARKUPS = (MAIN_MENU_MARKUP, POST_MARKUP, BACK_TO_MENU_MARKUP, NEWS_NOT_FOUND_MARKUP, POSTS_NOT_FOUND_MARKUP)
+
+
+def build_categories_markup(categories) -> InlineKeyboardMarkup:
+    """Список категорий (news_type, количество, ключ) по одной в ряд и кнопка главного меню"""
+    rows = [[InlineKeyboardButton(text=f"📂 {news_type} ({count})", callback_data=Category(key=key).pack())]
+            for news_type, count, key in categories]
+    rows.append(MAIN_MENU_ROW)
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+class KeyboardCache:
+    """LRU клавиатур с параметрами: ключ -> готовая InlineKeyboardMarkup"""
+
+    def __init__(self, max_items: int = 256):
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+
+    def get(self, key, build):
+        """Клавиатура по ключу; при промахе собирается build() и запоминается"""
+        markup = self._items.get(key)
+        if markup is not None:
+            self.hits += 1
+            self._items.move_to_end(key)
+            return markup
+        self.misses += 1
+        markup = build()
+        self._items[key] = markup
+        if len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+        return markup
+
+    @property
+    def stats(self) -> dict:
+        return {'cached': len(self._items), 'hits': self.hits, 'misses': self.misses}
+
+
+class PrebuiltMarkupSession(AiohttpSession):
+    """
+    Сессия Bot API, которая не сериализует статические клавиатуры на каждый запрос:
+    aiogram собирает reply_markup через model_dump и json, а для PREBUILT_MARKUPS
+    готовая строка JSON подставляется в форму напрямую.
+    """
+
+    def __init__(self, markups=PREBUILT_MARKUPS, **kwargs):
+        super().__init__(**kwargs)
+        # Ключ - id объекта: сами клавиатуры живут до конца процесса, id не переиспользуется
+        self._serialized = {id(markup): self.json_dumps(markup.model_dump(warnings=False, exclude_none=True))
+                            for markup in markups}
+
+    def build_form_data(self, bot, method):
+        markup = getattr(method, 'reply_markup', None)
+        serialized = self._serialized.get(id(markup)) if markup is not None else None
+        if serialized is None:
+            return super().build_form_data(bot, method)
+        form = super().build_form_data(bot, method.model_copy(update={'reply_markup': None}))
+        form.add_field('reply_markup', serialized)
+        return form
@@ -0,0 +1,137 @@
+import asyncio
+import hmac
+import json
+import logging
+import signal
+
+from aiogram.types import Update
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookServer:
+    """
+    Приём апдейтов Telegram через вебхук на aiohttp вместо long polling.
+    Ответ 200 отдаётся сразу, апдейт обрабатывается в фоне через Dispatcher.feed_update
+    не более чем max_concurrency штук одновременно. Если в работе уже max_pending апдейтов,
+    сервер отвечает 503 и Telegram повторит доставку позже. При остановке новые апдейты
+    не принимаются, а принятые дорабатываются до drain_timeout секунд.
+    """
+
+    def __init__(self, dp, bot, path: str = '/webhook', secret_token: str = None, max_concurrency: int = 100,
+                 max_pending: int = 1000, drain_timeout: float = 30, record_path: str = None):
+        self.dp = dp
+        self.bot = bot
+        self.path = path
+        self.secret_token = secret_token
+        self.max_pending = max_pending
+        self.drain_timeout = drain_timeout
+        self.record_path = record_path # Файл JSONL для записи апдейтов (для офлайн-прогона replay_webhook)
+        self.accepted = 0
+        self.rejected = 0
+        self.failed = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks = set()
+        self._closing = False
+        self._record = None
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        app.router.add_get('/healthz', self.healthz)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret_token and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ''), self.secret_token):
+            logger.warning(f"Вебхук: неверный секретный токен от {request.remote}")
+            return web.Response(status=401)
+        if self._closing or len(self._tasks) >= self.max_pending:
+            self.rejected += 1
+            return web.Response(status=503)
+
+        try:
+            data = await request.json()
+            update = Update.model_validate(data, context={'bot': self.bot})
+        except Exception as e:
+            logger.error(f"Вебхук: некорректный апдейт: {e}")
+            return web.Response(status=400)
+
+        if self._record is not None:
+            self._record.write(json.dumps(data, ensure_ascii=False) + '\n')
+        self.accepted += 1
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def healthz(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats, status=503 if self._closing else 200)
+
+    async def _process(self, update: Update):
+        async with self._semaphore:
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Вебхук: ошибка обработки апдейта {update.update_id}: {e}")
+
+    async def drain(self):
+        """Перестаёт принимать апдейты и ждёт обработки уже принятых"""
+        self._closing = True
+        if not self._tasks:
+            return
+        logger.info(f"Вебхук: дорабатываем {len(self._tasks)} апдейтов")
+        done, pending = await asyncio.wait(set(self._tasks), timeout=self.drain_timeout)
+        if pending:
+            logger.error(f"Вебхук: за {self.drain_timeout} с не обработано {len(pending)} апдейтов, отменяем")
+            for task in pending:
+                task.cancel()
+
+    @property
+    def stats(self) -> dict:
+        return {'in_progress': len(self._tasks), 'accepted': self.accepted,
+                'rejected': self.rejected, 'failed': self.failed}
+
+    async def serve(self, host: str = '0.0.0.0', port: int = 8080, webhook_url: str = None):
+        """
+        Запускает сервер и работает до SIGTERM/SIGINT (или отмены задачи).
+        Если задан webhook_url, регистрирует вебхук в Telegram.
+        """
+        await self.dp.emit_startup(bot=self.bot)
+        if self.record_path:
+            self._record = open(self.record_path, 'a', encoding='utf-8', buffering=1)
+        runner = web.AppRunner(self.make_app(), handle_signals=False)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        logger.info(f"Вебхук слушает {host}:{port}{self.path}")
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass # Windows: остаётся KeyboardInterrupt
+
+        try:
+            if webhook_url:
+                await self.bot.set_webhook(
+                    webhook_url, secret_token=self.secret_token,
+                    allowed_updates=self.dp.resolve_used_update_types(),
+                )
+                logger.info(f"Вебхук зарегистрирован: {webhook_url}")
+            await stop.wait()
+        finally:
+            # Сначала перестаём принимать соединения, затем дорабатываем принятые апдейты
+            await site.stop()
+            await self.drain()
+            await runner.cleanup()
+            if self._record is not None:
+                self._record.close()
+                self._record = None
+            await self.dp.emit_shutdown(bot=self.bot)
+            logger.info(f"Вебхук остановлен: {self.stats}")
@@ -0,0 +1,5 @@
+import os
+
+# main настраивает логирование при импорте: в тестах без файла bot.log
+os.environ.setdefault('LOG_FILE', '')
+os.environ.setdefault('LOG_CONSOLE', '0')
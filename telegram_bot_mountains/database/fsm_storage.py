@@ -0,0 +1,207 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from contextvars import ContextVar
+
+from aiogram import BaseMiddleware
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder
+
+logger = logging.getLogger(__name__)
+
+FSM_CHANNEL = 'fsm_changed'
+
+# Буфер состояний текущего апдейта: ключ -> _Entry. Заводится FSMFlushMiddleware.
+_update_buffer = ContextVar('fsm_update_buffer', default=None)
+
+
+class _Entry:
+    __slots__ = ('state', 'data', 'dirty', 'touched')
+
+    def __init__(self, state, data):
+        self.state = state
+        self.data = data
+        self.dirty = False
+        self.touched = time.monotonic()
+
+
+class PostgresStorage(BaseStorage):
+    """
+    FSM-хранилище aiogram в таблице fsm_states. Состояние переживает перезапуск
+    и доступно всем процессам бота.
+
+    Чтение идёт через локальный LRU-кэш процесса. Внутри апдейта (см. FSMFlushMiddleware)
+    все изменения копятся в буфере и пишутся одним запросом в конце, поэтому апдейт делает
+    не больше одного чтения и одной записи. Записи рассылают NOTIFY fsm_changed,
+    и другие процессы сбрасывают свою копию ключа.
+    """
+
+    def __init__(self, cache_size: int = 10000, ttl: float = 7 * 24 * 3600, cleanup_interval: float = 3600):
+        self.db = None
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_business_connection_id=True, with_destiny=True)
+        self.reads = 0
+        self.writes = 0
+        self.cache_hits = 0
+        self._cache = OrderedDict() # ключ -> _Entry, общий для всех апдейтов процесса
+        self._origin = uuid.uuid4().hex[:12] # Свои уведомления не сбрасывают свой же кэш
+        self._cleanup_task = None
+
+    async def start(self, db, events=None):
+        """Подключает пул БД; events (DatabaseEvents) - для сброса кэша при записи из других процессов"""
+        self.db = db
+        if events is not None:
+            events.subscribe(FSM_CHANNEL, self._on_changed)
+        self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+
+    async def close(self):
+        if self._cleanup_task:
+            self._cleanup_task.cancel()
+            self._cleanup_task = None
+
+    # --- Интерфейс BaseStorage ---
+    async def set_state(self, key, state=None):
+        entry = await self._entry(key)
+        entry.state = state.state if isinstance(state, State) else state
+        await self._changed(key, entry)
+
+    async def get_state(self, key):
+        return (await self._entry(key)).state
+
+    async def set_data(self, key, data):
+        entry = await self._entry(key)
+        entry.data = dict(data)
+        await self._changed(key, entry)
+
+    async def get_data(self, key):
+        return dict((await self._entry(key)).data)
+
+    # --- Буфер апдейта ---
+    def begin(self):
+        """Начинает буферизацию изменений текущего апдейта; возвращает токен для flush"""
+        return _update_buffer.set({})
+
+    async def flush(self, token):
+        """Пишет изменённые за апдейт ключи (обычно один) и закрывает буфер"""
+        buffer = _update_buffer.get()
+        _update_buffer.reset(token)
+        for db_key, entry in buffer.items():
+            if not entry.dirty:
+                continue
+            cached = self._cache.get(db_key)
+            if cached is not None and cached.state == entry.state and cached.data == entry.data:
+                continue # Изменения вернули прежнее значение - писать нечего
+            await self._write(db_key, entry)
+
+    async def _entry(self, key) -> _Entry:
+        db_key = self.key_builder.build(key)
+        buffer = _update_buffer.get()
+        if buffer is not None:
+            entry = buffer.get(db_key)
+            if entry is not None:
+                return entry
+
+        entry = self._cache.get(db_key)
+        if entry is not None:
+            self.cache_hits += 1
+            self._cache.move_to_end(db_key)
+            # В буфер апдейта - копия, чтобы незаписанные изменения не попали в общий кэш раньше БД
+            entry = _Entry(entry.state, dict(entry.data))
+        else:
+            entry = await self._read(db_key)
+            self._remember(db_key, _Entry(entry.state, dict(entry.data)))
+        if buffer is not None:
+            buffer[db_key] = entry
+        return entry
+
+    async def _changed(self, key, entry: _Entry):
+        entry.dirty = True
+        if _update_buffer.get() is None:
+            # Вне апдейта (фоновые задачи) - пишем сразу
+            await self._write(self.key_builder.build(key), entry)
+
+    # --- БД и кэш ---
+    async def _read(self, db_key: str) -> _Entry:
+        self.reads += 1
+        row = await self.db.fetchrow("SELECT state, data FROM fsm_states WHERE key = $1", db_key)
+        if row is None:
+            return _Entry(None, {})
+        return _Entry(row['state'], json.loads(row['data']) if row['data'] else {})
+
+    async def _write(self, db_key: str, entry: _Entry):
+        self.writes += 1
+        entry.dirty = False
+        payload = json.dumps({'key': db_key, 'origin': self._origin})
+        try:
+            if entry.state is None and not entry.data:
+                # state.clear() - строка больше не нужна
+                await self.db.execute('''
+                    WITH d AS (DELETE FROM fsm_states WHERE key = $1)
+                    SELECT pg_notify($2, $3)
+                ''', db_key, FSM_CHANNEL, payload)
+            else:
+                await self.db.execute('''
+                    WITH w AS (
+                        INSERT INTO fsm_states (key, state, data, updated_at)
+                        VALUES ($1, $2, $3::jsonb, CURRENT_TIMESTAMP)
+                        ON CONFLICT (key) DO UPDATE
+                        SET state = EXCLUDED.state, data = EXCLUDED.data, updated_at = EXCLUDED.updated_at
+                    )
+                    SELECT pg_notify($4, $5)
+                ''', db_key, entry.state, json.dumps(entry.data, ensure_ascii=False, default=str),
+                    FSM_CHANNEL, payload)
+        except Exception as e:
+            # Кэш не обновляем: следующий апдейт перечитает актуальное состояние из БД
+            self._cache.pop(db_key, None)
+            logger.error(f"Ошибка записи FSM-состояния {db_key}: {e}")
+            return
+        self._remember(db_key, _Entry(entry.state, dict(entry.data)))
+
+    def _remember(self, db_key: str, entry: _Entry):
+        self._cache[db_key] = entry
+        self._cache.move_to_end(db_key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _on_changed(self, payload: dict):
+        if payload.get('origin') != self._origin:
+            self._cache.pop(payload.get('key'), None)
+
+    async def _cleanup_loop(self):
+        """Удаляет брошенные состояния старше ttl"""
+        while True:
+            await asyncio.sleep(self.cleanup_interval)
+            try:
+                result = await self.db.execute(
+                    "DELETE FROM fsm_states WHERE updated_at < CURRENT_TIMESTAMP - make_interval(secs => $1)",
+                    float(self.ttl)
+                )
+                expired_before = time.monotonic() - self.ttl
+                for db_key in [k for k, entry in self._cache.items() if entry.touched < expired_before]:
+                    del self._cache[db_key]
+                logger.info(f"Очистка FSM-состояний: {result}")
+            except Exception as e:
+                logger.error(f"Ошибка очистки FSM-состояний: {e}")
+
+    @property
+    def stats(self) -> dict:
+        return {'cached': len(self._cache), 'cache_hits': self.cache_hits, 'reads': self.reads, 'writes': self.writes}
+
+
+class FSMFlushMiddleware(BaseMiddleware):
+    """Внешний middleware апдейтов: открывает буфер FSM на время обработки и сбрасывает его в БД в конце"""
+
+    def __init__(self, storage: PostgresStorage):
+        self.storage = storage
+
+    async def __call__(self, handler, event, data):
+        token = self.storage.begin()
+        try:
+            return await handler(event, data)
+        finally:
+            await self.storage.flush(token)
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+Загрузка новостей из CSV и SQL/TXT-дампов (INSERT INTO news ... VALUES (...), ...).
+
+Файл читается потоково, записи уходят в БД пачками через COPY во временную таблицу,
+затем переносятся в news одним INSERT ... ON CONFLICT.
+
+Запуск из каталога telegram_bot_mountains (настройки БД берутся из .env):
+    python -m database.importer seed
+    python -m database.importer import "INSERT INTO news (telegram_url, new.txt"
+    python -m database.importer import news.csv --update
+"""
+import argparse
+import asyncio
+import csv
+import itertools
+import logging
+import os
+import time
+from collections import Counter
+
+from dotenv import load_dotenv
+
+from database.migrate import migrate
+from database.postgres_VR2 import Database
+
+logger = logging.getLogger(__name__)
+
+NEWS_COLUMNS = ('telegram_url', 'news_type', 'title')
+SEED_PATH = os.path.join(os.path.dirname(__file__), 'seed_news.csv')
+
+
+def iter_csv(path: str):
+    """Записи (telegram_url, news_type, title) из CSV с заголовком; разделитель определяется по первой строке"""
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        dialect = csv.Sniffer().sniff(f.readline(), delimiters=',;\t')
+        f.seek(0)
+        for row in csv.DictReader(f, dialect=dialect):
+            yield tuple((row.get(column) or '').strip() or None for column in NEWS_COLUMNS)
+
+
+def _detect_wrap_width(lines):
+    """
+    Дамп, скопированный из терминала, разбит на строки фиксированной ширины, причём пробел
+    на месте переноса теряется. Ширина - самая частая длина строки, если таких строк большинство.
+    """
+    lengths = Counter(len(line) for line in lines[:-1])
+    if not lengths:
+        return None
+    width, count = lengths.most_common(1)[0]
+    return width if width >= 40 and count * 2 > len(lines) - 1 else None
+
+
+def _unwrap(lines, width: int = None):
+    """Склеивает строки дампа: строка короче ширины переноса потеряла пробел, полная - разрезана посреди текста"""
+    previous = None
+    for line in lines:
+        if previous is not None:
+            if width is None or len(previous) > width:
+                yield previous + '\n'
+            elif len(previous) < width:
+                yield previous + ' '
+            else:
+                yield previous
+        previous = line
+    if previous is not None:
+        yield previous + '\n'
+
+
+def _tokens(chunks):
+    """Лексемы SQL: ('s', строка), ('w', слово/число), ('p', знак). Строки и слова могут идти через границу кусков."""
+    in_string = in_comment = False
+    buf = []
+    pending = '' # Незакрытая кавычка или '-' в конце куска
+    for chunk in chunks:
+        text = pending + chunk
+        pending = ''
+        i, n = 0, len(text)
+        while i < n:
+            ch = text[i]
+            if in_comment:
+                if ch == '\n':
+                    in_comment = False
+                i += 1
+            elif in_string:
+                if ch == "'":
+                    if i + 1 == n:
+                        pending = ch # Не знаем, экранирование ('') или конец строки
+                        break
+                    if text[i + 1] == "'":
+                        buf.append("'")
+                        i += 2
+                        continue
+                    in_string = False
+                    yield 's', ''.join(buf)
+                    buf = []
+                else:
+                    buf.append(ch)
+                i += 1
+            elif ch == "'":
+                if buf:
+                    yield 'w', ''.join(buf)
+                    buf = []
+                in_string = True
+                i += 1
+            elif ch == '-' and not buf:
+                if i + 1 == n:
+                    pending = ch
+                    break
+                if text[i + 1] == '-':
+                    in_comment = True
+                    i += 2
+                    continue
+                buf.append(ch)
+                i += 1
+            elif ch in '(),;':
+                if buf:
+                    yield 'w', ''.join(buf)
+                    buf = []
+                yield 'p', ch
+                i += 1
+            elif ch.isspace():
+                if buf:
+                    yield 'w', ''.join(buf)
+                    buf = []
+                i += 1
+            else:
+                buf.append(ch)
+                i += 1
+    if buf and not in_string:
+        yield 'w', ''.join(buf)
+
+
+def iter_sql_values(chunks, table: str = 'news'):
+    """Строки (словарь колонка -> значение) из INSERT INTO <table> (...) VALUES (...), (...); прочие операторы пропускаются"""
+    tokens = _tokens(chunks)
+    for kind, value in tokens:
+        if kind != 'w' or value.upper() != 'INSERT':
+            continue
+        head = list(itertools.islice(tokens, 3)) # INTO, имя таблицы, '('
+        if len(head) < 3 or head[1][1].strip('"').split('.')[-1].lower() != table or head[2] != ('p', '('):
+            continue
+
+        columns = []
+        for kind, value in tokens:
+            if (kind, value) == ('p', ')'):
+                break
+            if kind == 'w':
+                columns.append(value.strip('"').lower())
+        keyword = next(tokens, ('', ''))
+        if keyword[0] != 'w' or keyword[1].upper() != 'VALUES':
+            continue # INSERT ... SELECT и прочее не поддерживаем
+
+        row = None
+        for kind, value in tokens:
+            if (kind, value) == ('p', '('):
+                if row:
+                    # Лишняя скобка внутри записи (встречается в ручных дампах) - продолжаем ту же запись
+                    logger.warning(f"Лишняя '(' в записи {row!r}, запись продолжается")
+                    continue
+                row = []
+            elif (kind, value) == ('p', ')'):
+                if row is not None:
+                    yield dict(zip(columns, row))
+                row = None
+            elif (kind, value) == ('p', ';'):
+                break
+            elif row is not None:
+                if kind == 's':
+                    row.append(value)
+                elif kind == 'w':
+                    row.append(None if value.upper() == 'NULL' else value)
+
+
+def iter_sql_dump(path: str, table: str = 'news', wrap_width='auto'):
+    """Записи (telegram_url, news_type, title) из SQL/TXT-дампа; wrap_width: 'auto', число или None"""
+    with open(path, encoding='utf-8-sig') as f:
+        lines = (line.rstrip('\r\n') for line in f)
+        if wrap_width == 'auto':
+            head = list(itertools.islice(lines, 200))
+            wrap_width = _detect_wrap_width(head)
+            lines = itertools.chain(head, lines)
+        if wrap_width:
+            logger.info(f"{path}: строки перенесены по ширине {wrap_width}, склеиваем")
+        for record in iter_sql_values(_unwrap(lines, wrap_width), table):
+            yield tuple(record.get(column) for column in NEWS_COLUMNS)
+
+
+def iter_file(path: str, file_format: str = None):
+    file_format = file_format or ('csv' if path.lower().endswith('.csv') else 'sql')
+    return iter_csv(path) if file_format == 'csv' else iter_sql_dump(path)
+
+
+class NewsImporter:
+    """Загрузка новостей пачками через COPY в временную таблицу и один INSERT ... ON CONFLICT"""
+
+    def __init__(self, db, batch_size: int = 5000):
+        self.db = db
+        self.batch_size = batch_size
+
+    async def load(self, records, update: bool = False) -> dict:
+        """
+        records - итерируемое (telegram_url, news_type, title). update=True перезаписывает
+        тип и заголовок существующих новостей, иначе они пропускаются.
+        """
+        started = time.perf_counter()
+        parsed = skipped = 0
+        async with self.db.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute('''
+                    CREATE TEMP TABLE news_staging (
+                        telegram_url TEXT, news_type TEXT, title TEXT
+                    ) ON COMMIT DROP
+                ''')
+                batch = []
+                for record in records:
+                    if not record[0] or not record[1]:
+                        skipped += 1
+                        continue
+                    batch.append(record)
+                    if len(batch) >= self.batch_size:
+                        await conn.copy_records_to_table('news_staging', records=batch, columns=NEWS_COLUMNS)
+                        parsed += len(batch)
+                        batch = []
+                if batch:
+                    await conn.copy_records_to_table('news_staging', records=batch, columns=NEWS_COLUMNS)
+                    parsed += len(batch)
+
+                on_conflict = ('DO UPDATE SET news_type = EXCLUDED.news_type, title = EXCLUDED.title'
+                               if update else 'DO NOTHING')
+                # DISTINCT ON: дубли внутри файла иначе ломают ON CONFLICT DO UPDATE; берём последнее вхождение
+                result = await conn.execute(f'''
+                    INSERT INTO news (telegram_url, news_type, title)
+                    SELECT DISTINCT ON (telegram_url) telegram_url, news_type, title
+                    FROM (SELECT *, ctid FROM news_staging) s
+                    ORDER BY telegram_url, ctid DESC
+                    ON CONFLICT (telegram_url) {on_conflict}
+                ''')
+        elapsed = time.perf_counter() - started
+        written = int(result.split()[-1])
+        return {'parsed': parsed, 'skipped': skipped, 'written': written, 'seconds': elapsed,
+                'rows_per_second': parsed / elapsed if elapsed else 0.0}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('seed', help='стартовые новости из database/seed_news.csv')
+    import_parser = commands.add_parser('import', help='загрузить CSV или SQL/TXT-дамп')
+    import_parser.add_argument('path')
+    import_parser.add_argument('--format', choices=('csv', 'sql'), help='по умолчанию - по расширению файла')
+    import_parser.add_argument('--update', action='store_true', help='обновлять тип и заголовок существующих новостей')
+    for sub in commands.choices.values():
+        sub.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    load_dotenv()
+    db = Database.from_env()
+    await db.connect()
+    try:
+        await migrate(db)
+        if args.command == 'seed':
+            records, update = iter_csv(SEED_PATH), False
+        else:
+            records, update = iter_file(args.path, args.format), args.update
+        stats = await NewsImporter(db, args.batch_size).load(records, update)
+        print(f"Прочитано: {stats['parsed']}, пропущено без ссылки/типа: {stats['skipped']}, "
+              f"записано в news: {stats['written']} за {stats['seconds']:.2f} с "
+              f"({stats['rows_per_second']:.0f} строк/с)")
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
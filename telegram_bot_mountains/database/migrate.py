@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Версионированные миграции схемы: SQL-файлы database/migrations/NNNN_имя.sql применяются
+по порядку один раз, применённые версии хранятся в schema_version.
+
+Запуск из каталога telegram_bot_mountains (настройки БД берутся из .env):
+    python -m database.migrate            # применить новые миграции
+    python -m database.migrate status     # какие версии применены
+    python -m database.migrate explain    # проверить по EXPLAIN, что горячие запросы идут по индексам
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import sys
+
+from dotenv import load_dotenv
+
+from database.postgres_VR2 import Database
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), 'migrations')
+_FILE_RE = re.compile(r'^(\d+)_([\w-]+)\.sql$')
+_LOCK_ID = 7041014 # pg_advisory_xact_lock: несколько процессов бота не применяют миграции одновременно
+
+# Горячие запросы и индексы, которыми они должны обслуживаться (любой из перечисленных)
+HOT_QUERIES = [
+    ("новости категории, OFFSET",
+     "SELECT telegram_url, news_type, title FROM news WHERE news_type = $1 ORDER BY id DESC OFFSET 0 LIMIT 5",
+     ('История восхождений и экспедиций',), ('idx_news_type_id',)),
+    ("новости категории, курсор",
+     "SELECT id, telegram_url, news_type, title, created_at FROM news "
+     "WHERE news_type = $1 AND (created_at, id) < (now()::timestamp, 2147483647) "
+     "ORDER BY created_at DESC, id DESC LIMIT 6",
+     ('История восхождений и экспедиций',), ('idx_news_type_created_id',)),
+    ("лента новостей по времени",
+     "SELECT id, title FROM news ORDER BY created_at DESC, id DESC LIMIT 5",
+     (), ('idx_news_created_id',)),
+    ("пост по QR",
+     "SELECT * FROM posts WHERE qr_id = $1 AND is_active = TRUE",
+     ('elbrus',), ('idx_posts_active_qr_id', 'posts_qr_id_key')),
+    ("взаимодействия за сутки",
+     "SELECT interaction_type, COUNT(*) FROM user_interactions "
+     "WHERE created_at >= now()::timestamp - interval '1 day' GROUP BY interaction_type",
+     (), ('idx_user_interactions_created',)),
+    ("взаимодействия пользователя",
+     "SELECT * FROM user_interactions WHERE user_id = $1 ORDER BY created_at DESC LIMIT 20",
+     (709108561,), ('idx_user_interactions_user',)),
+]
+
+
+def load_migrations(path: str = MIGRATIONS_DIR):
+    """Список (версия, имя, путь к файлу) по возрастанию версии"""
+    migrations = []
+    for filename in os.listdir(path):
+        match = _FILE_RE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(path, filename)))
+    migrations.sort()
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Повторяющиеся номера миграций в {path}")
+    return migrations
+
+
+async def applied_versions(conn) -> set:
+    if await conn.fetchval("SELECT to_regclass('schema_version') IS NULL"):
+        return set()
+    return {row['version'] for row in await conn.fetch("SELECT version FROM schema_version")}
+
+
+async def migrate(db, path: str = MIGRATIONS_DIR) -> list:
+    """
+    Применяет недостающие миграции, каждую в своей транзакции. Если схема актуальна,
+    выполняется один SELECT и никакого DDL. Возвращает список применённых версий.
+    """
+    migrations = load_migrations(path)
+    async with db.pool.acquire() as conn:
+        applied = await applied_versions(conn)
+        pending = [m for m in migrations if m[0] not in applied]
+        if not pending:
+            logger.info(f"Схема БД актуальна (версия {max(applied, default=0)})")
+            return []
+
+        done = []
+        for version, name, filename in pending:
+            with open(filename, encoding='utf-8') as f:
+                sql = f.read()
+            async with conn.transaction():
+                await conn.execute("SELECT pg_advisory_xact_lock($1)", _LOCK_ID)
+                await conn.execute('''
+                    CREATE TABLE IF NOT EXISTS schema_version (
+                        version INTEGER PRIMARY KEY,
+                        name TEXT NOT NULL,
+                        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                # Пока ждали блокировку, миграцию мог применить другой процесс
+                if await conn.fetchval("SELECT 1 FROM schema_version WHERE version = $1", version):
+                    continue
+                await conn.execute(sql)
+                await conn.execute("INSERT INTO schema_version (version, name) VALUES ($1, $2)", version, name)
+            logger.info(f"Применена миграция {version:04d}_{name}")
+            done.append(version)
+        return done
+
+
+def _index_names(plan) -> set:
+    names = set()
+    if 'Index Name' in plan:
+        names.add(plan['Index Name'])
+    for child in plan.get('Plans', ()):
+        names |= _index_names(child)
+    return names
+
+
+async def hot_query_plans(db) -> list:
+    """
+    EXPLAIN горячих запросов: (название, индексы из плана, ожидаемые индексы) по HOT_QUERIES.
+    Последовательное чтение запрещается (enable_seqscan = off): на маленькой базе планировщик
+    иначе выбирает seq scan, а проверяем мы наличие и применимость индекса.
+    """
+    plans = []
+    async with db.pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL enable_seqscan = off")
+            for title, query, args, expected in HOT_QUERIES:
+                result = await conn.fetchval(f"EXPLAIN (FORMAT JSON) {query}", *args)
+                plan = (json.loads(result) if isinstance(result, str) else result)[0]['Plan']
+                plans.append((title, _index_names(plan), expected))
+    return plans
+
+
+async def explain_hot_queries(db) -> bool:
+    """Печатает, какими индексами обслуживаются горячие запросы; False - хотя бы один без нужного индекса"""
+    ok = True
+    for title, used, expected in await hot_query_plans(db):
+        passed = bool(used & set(expected))
+        ok &= passed
+        print(f"{'OK ' if passed else 'НЕТ'} {title:<30} индексы: {', '.join(sorted(used)) or '-'}"
+              f"{'' if passed else f' (ожидался {expected[0]})'}")
+    return ok
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', nargs='?', default='up', choices=('up', 'status', 'explain'))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    load_dotenv()
+    db = Database.from_env()
+    await db.connect()
+    try:
+        if args.command == 'up':
+            applied = await migrate(db)
+            print(f"Применено миграций: {len(applied)}")
+        elif args.command == 'status':
+            async with db.pool.acquire() as conn:
+                applied = await applied_versions(conn)
+            for version, name, _ in load_migrations():
+                print(f"{'+' if version in applied else ' '} {version:04d}_{name}")
+        else:
+            await migrate(db)
+            if not await explain_hot_queries(db):
+                sys.exit(1)
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,45 @@
+-- Keyset-пагинация новостей: WHERE news_type = $1 AND (created_at, id) < $cursor
+CREATE INDEX IF NOT EXISTS idx_news_type_created_id ON news (news_type, created_at DESC, id DESC);
+
+-- Уведомления об изменениях новостей для каталога категорий (LISTEN news_changed)
+CREATE OR REPLACE FUNCTION notify_news_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('news_changed', json_build_object(
+            'op', TG_OP, 'id', OLD.id, 'old_news_type', OLD.news_type)::text);
+        RETURN OLD;
+    ELSIF TG_OP = 'UPDATE' THEN
+        PERFORM pg_notify('news_changed', json_build_object(
+            'op', TG_OP, 'id', NEW.id, 'news_type', NEW.news_type,
+            'old_news_type', OLD.news_type)::text);
+    ELSE
+        PERFORM pg_notify('news_changed', json_build_object(
+            'op', TG_OP, 'id', NEW.id, 'news_type', NEW.news_type)::text);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS news_notify_change ON news;
+CREATE TRIGGER news_notify_change
+AFTER INSERT OR UPDATE OR DELETE ON news
+FOR EACH ROW EXECUTE FUNCTION notify_news_change();
+
+-- Уведомления об изменениях постов (поисковый индекс и кэши постов)
+CREATE OR REPLACE FUNCTION notify_posts_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('posts_changed', json_build_object(
+            'op', TG_OP, 'id', OLD.id, 'qr_id', OLD.qr_id)::text);
+        RETURN OLD;
+    END IF;
+    PERFORM pg_notify('posts_changed', json_build_object(
+        'op', TG_OP, 'id', NEW.id, 'qr_id', NEW.qr_id)::text);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS posts_notify_change ON posts;
+CREATE TRIGGER posts_notify_change
+AFTER INSERT OR UPDATE OR DELETE ON posts
+FOR EACH ROW EXECUTE FUNCTION notify_posts_change();
@@ -0,0 +1,38 @@
+-- Полнотекстовый поиск: tsvector-колонки (russian), триггеры и GIN-индексы
+ALTER TABLE news ADD COLUMN IF NOT EXISTS search_vector tsvector;
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+CREATE OR REPLACE FUNCTION news_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(NEW.news_type, '')), 'B');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION posts_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS news_search_vector ON news;
+CREATE TRIGGER news_search_vector
+BEFORE INSERT OR UPDATE OF title, news_type ON news
+FOR EACH ROW EXECUTE FUNCTION news_search_vector_update();
+
+DROP TRIGGER IF EXISTS posts_search_vector ON posts;
+CREATE TRIGGER posts_search_vector
+BEFORE INSERT OR UPDATE OF title, description ON posts
+FOR EACH ROW EXECUTE FUNCTION posts_search_vector_update();
+
+-- Заполняем вектор для строк, созданных до появления триггеров (UPDATE OF title запускает триггер)
+UPDATE news SET title = title WHERE search_vector IS NULL;
+UPDATE posts SET title = title WHERE search_vector IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_news_search ON news USING gin (search_vector);
+CREATE INDEX IF NOT EXISTS idx_posts_search ON posts USING gin (search_vector);
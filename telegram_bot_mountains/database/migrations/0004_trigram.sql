@@ -0,0 +1,18 @@
+-- Нечёткий поиск (pg_trgm). Если расширение недоступно, миграция проходит без него,
+-- а SearchEngine сам отключает нечёткий поиск.
+DO $$
+BEGIN
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+EXCEPTION WHEN others THEN
+    RAISE WARNING 'pg_trgm недоступно, нечёткий поиск отключён: %', SQLERRM;
+END
+$$;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+        CREATE INDEX IF NOT EXISTS idx_news_title_trgm ON news USING gin (title gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS idx_posts_title_trgm ON posts USING gin (title gin_trgm_ops);
+    END IF;
+END
+$$;
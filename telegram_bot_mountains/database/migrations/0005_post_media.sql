@@ -0,0 +1,7 @@
+-- file_id картинок постов в Telegram; действителен, пока image_url не изменился
+CREATE TABLE IF NOT EXISTS post_media (
+    post_id INTEGER PRIMARY KEY REFERENCES posts(id) ON DELETE CASCADE,
+    image_url VARCHAR(255) NOT NULL,
+    file_id TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
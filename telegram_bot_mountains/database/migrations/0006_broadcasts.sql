@@ -0,0 +1,27 @@
+-- Подписчики рассылок (все, кто запускал бота) и рассылки с результатом по каждому получателю
+CREATE TABLE IF NOT EXISTS subscribers (
+    user_id BIGINT PRIMARY KEY,
+    is_active BOOLEAN NOT NULL DEFAULT TRUE,
+    subscribed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id SERIAL PRIMARY KEY,
+    text TEXT NOT NULL,
+    created_by BIGINT,
+    status VARCHAR(20) NOT NULL DEFAULT 'new',
+    sent INTEGER NOT NULL DEFAULT 0,
+    blocked INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+    broadcast_id INTEGER NOT NULL REFERENCES broadcasts(id) ON DELETE CASCADE,
+    user_id BIGINT NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    error VARCHAR(255),
+    PRIMARY KEY (broadcast_id, user_id)
+);
@@ -0,0 +1,9 @@
+-- Состояния FSM (поиск, формы); брошенные удаляются по updated_at
+CREATE TABLE IF NOT EXISTS fsm_states (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data JSONB NOT NULL DEFAULT '{}',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_fsm_states_updated ON fsm_states (updated_at);
@@ -0,0 +1,14 @@
+-- Индексы под горячие запросы (проверка: python -m database.migrate explain)
+
+-- Страницы категории в режиме OFFSET: WHERE news_type = $1 ORDER BY id DESC
+CREATE INDEX IF NOT EXISTS idx_news_type_id ON news (news_type, id DESC);
+
+-- Лента всех новостей и выборки по времени: ORDER BY created_at, id
+CREATE INDEX IF NOT EXISTS idx_news_created_id ON news (created_at, id);
+
+-- Скан QR: WHERE qr_id = $1 AND is_active; частичный индекс меньше уникального и не содержит скрытых постов
+CREATE INDEX IF NOT EXISTS idx_posts_active_qr_id ON posts (qr_id) WHERE is_active;
+
+-- Отчёты по взаимодействиям: по времени и по пользователю
+CREATE INDEX IF NOT EXISTS idx_user_interactions_created ON user_interactions (created_at);
+CREATE INDEX IF NOT EXISTS idx_user_interactions_user ON user_interactions (user_id, created_at);
@@ -0,0 +1,48 @@
+-- Агрегаты user_interactions для /stats (services/interaction_rollup.py): заполняются порциями
+-- от водяного знака last_id, статистика читает только их, а не сырые события.
+
+-- События по часам и дням: тип действия и qr_id (для сканирований; у остальных типов - '')
+CREATE TABLE IF NOT EXISTS interaction_rollup_hourly (
+    bucket TIMESTAMP NOT NULL,
+    interaction_type VARCHAR(50) NOT NULL,
+    qr_id VARCHAR(50) NOT NULL DEFAULT '',
+    events BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, interaction_type, qr_id)
+);
+
+CREATE TABLE IF NOT EXISTS interaction_rollup_daily (
+    bucket DATE NOT NULL,
+    interaction_type VARCHAR(50) NOT NULL,
+    qr_id VARCHAR(50) NOT NULL DEFAULT '',
+    events BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, interaction_type, qr_id)
+);
+
+-- Уникальные пользователи за день и впервые появившиеся
+CREATE TABLE IF NOT EXISTS interaction_rollup_users (
+    bucket DATE PRIMARY KEY,
+    users INTEGER NOT NULL DEFAULT 0,
+    new_users INTEGER NOT NULL DEFAULT 0
+);
+
+-- Для подсчёта уникальных: кто уже учтён за день (старые дни удаляются) и кто встречался вообще
+CREATE TABLE IF NOT EXISTS interaction_day_users (
+    day DATE NOT NULL,
+    user_id BIGINT NOT NULL,
+    PRIMARY KEY (day, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS interaction_users (
+    user_id BIGINT PRIMARY KEY,
+    first_seen DATE NOT NULL
+);
+
+-- Одна строка: водяной знак и итоги за всё время
+CREATE TABLE IF NOT EXISTS interaction_rollup_state (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    last_id BIGINT NOT NULL DEFAULT 0,
+    events BIGINT NOT NULL DEFAULT 0,
+    users BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP
+);
+INSERT INTO interaction_rollup_state (id) VALUES (TRUE) ON CONFLICT DO NOTHING;
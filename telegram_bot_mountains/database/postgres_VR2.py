@@ -1,8 +1,143 @@
 import asyncpg
 import logging
+import os
+import time
+
+from database.queries import EXECUTE, FETCHROW, FETCHVAL, PAGE, QUERIES
+from database.query_stats import status_rows
 
 logger = logging.getLogger(__name__)
 
+
+class _Connection(asyncpg.Connection):
+    """Соединение пула с подготовленными запросами реестра: имя -> PreparedStatement"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = {}
+
+
+class _RecordedConnection:
+    """
+    Соединение из pool.acquire() с учётом execute/fetch/fetchrow/fetchval в QueryStats - это
+    и методы Database, и блоки pool.acquire() в сервисах. Служебный SQL самого asyncpg (сброс
+    соединения при возврате в пул, BEGIN/COMMIT транзакций) идёт мимо: он вызывается на самом
+    соединении. Остальное (transaction, cursor, copy_*, prepared ...) - как у соединения.
+    """
+    __slots__ = ('_conn', '_stats')
+
+    def __init__(self, conn, stats):
+        self._conn = conn
+        self._stats = stats
+
+    async def execute(self, query, *args, **kwargs):
+        started, status = time.perf_counter(), None
+        try:
+            status = await self._conn.execute(query, *args, **kwargs)
+            return status
+        finally:
+            self._record(query, args, started, None if status is None else status_rows(status))
+
+    async def fetch(self, query, *args, **kwargs):
+        started, rows = time.perf_counter(), None
+        try:
+            rows = await self._conn.fetch(query, *args, **kwargs)
+            return rows
+        finally:
+            self._record(query, args, started, None if rows is None else len(rows))
+
+    async def fetchrow(self, query, *args, **kwargs):
+        started, done, row = time.perf_counter(), False, None
+        try:
+            row = await self._conn.fetchrow(query, *args, **kwargs)
+            done = True
+            return row
+        finally:
+            self._record(query, args, started, (row is not None) if done else None)
+
+    async def fetchval(self, query, *args, **kwargs):
+        started, done = time.perf_counter(), False
+        try:
+            value = await self._conn.fetchval(query, *args, **kwargs)
+            done = True
+            return value
+        finally:
+            self._record(query, args, started, 1 if done else None)
+
+    def _record(self, query, args, started, rows):
+        self._stats.record(self._stats.key(query), query, args, time.perf_counter() - started, rows)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class _MeteredAcquire:
+    """
+    Контекст pool.acquire(): замеряет ожидание соединения и отдаёт его обёрнутым для учёта
+    запросов; работает и с await, и с async with
+    """
+    __slots__ = ('_context', '_wait', '_stats')
+
+    def __init__(self, context, wait, stats):
+        self._context = context
+        self._wait = wait
+        self._stats = stats
+
+    def __await__(self):
+        return self._acquire().__await__()
+
+    async def _acquire(self):
+        started = time.perf_counter()
+        conn = await self._context
+        return self._wrap(conn, started)
+
+    async def __aenter__(self):
+        started = time.perf_counter()
+        conn = await self._context.__aenter__()
+        return self._wrap(conn, started)
+
+    async def __aexit__(self, *exc):
+        return await self._context.__aexit__(*exc)
+
+    def _wrap(self, conn, started):
+        if self._wait is not None:
+            self._wait.observe((), time.perf_counter() - started)
+        return conn if self._stats is None else _RecordedConnection(conn, self._stats)
+
+
+class MeteredPool:
+    """
+    Пул asyncpg с замером ожидания в acquire() (wait - гистограмма BotMetrics) и учётом запросов
+    выданных соединений (stats - QueryStats); остальное (close, get_size ...) - как у пула
+    """
+
+    def __init__(self, pool, wait=None, stats=None):
+        self._pool = pool
+        self._wait = wait
+        self._stats = stats
+
+    def acquire(self, *args, **kwargs):
+        return _MeteredAcquire(self._pool.acquire(*args, **kwargs), self._wait, self._stats)
+
+    async def release(self, conn, *args, **kwargs):
+        if isinstance(conn, _RecordedConnection):
+            conn = conn._conn
+        return await self._pool.release(conn, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+
+def _row_count(kind, result) -> int:
+    if kind == FETCHVAL or kind == FETCHROW:
+        return int(result is not None)
+    if kind == EXECUTE:
+        return status_rows(result)
+    if kind == PAGE:
+        return len(result[0])
+    return len(result)
+
+
 class Database:
     def __init__(self, user, password, database, host, port):
         self.user = user
@@ -11,17 +146,106 @@ class Database:
         self.host = host
         self.port = port
         self.pool = None # Initialize pool to None
+        self.count_cache_ttl = 60 # Сколько секунд считать закэшированный COUNT(*) актуальным
+        self._news_count_cache = {} # news_type -> (count, expires_at)
+        self.metrics = None # BotMetrics: время запросов и ожидание пула; задаётся до connect()
+        self.stats = None # QueryStats: статистика и лог медленных запросов; задаётся до connect()
+
+    @classmethod
+    def from_env(cls):
+        """Настройки подключения из переменных окружения (.env), как у бота"""
+        return cls(
+            user=os.getenv('DB_USER', 'postgres'),
+            password=os.getenv('DB_PASSWORD'),
+            database=os.getenv('DB_NAME', 'vershinyrossii2'),
+            host=os.getenv('DB_HOST', '127.0.0.1'),
+            port=int(os.getenv('DB_PORT', 5433)),
+        )
 
     async def connect(self):
-        self.pool = await asyncpg.create_pool(
+        pool = await asyncpg.create_pool(
             user=self.user,
             password=self.password,
             database=self.database,
             host=self.host,
-            port=self.port
+            port=self.port,
+            connection_class=_Connection,
+            init=self._prepare_queries,
         )
+        if self.stats is not None:
+            self.stats.pool = pool # EXPLAIN медленных запросов - мимо учёта
+        if self.metrics is not None:
+            self.metrics.watch_pool(pool)
+        if self.metrics is not None or self.stats is not None:
+            pool = MeteredPool(pool, self.metrics.db_pool_wait if self.metrics is not None else None, self.stats)
+        self.pool = pool
         logger.info("Пул подключений к БД создан.")
 
+    async def _prepare_queries(self, conn):
+        """Хук init пула: готовит все запросы реестра на новом соединении"""
+        for query in QUERIES.values():
+            try:
+                conn.prepared[query.name] = await conn.prepare(query.sql)
+            except asyncpg.PostgresError as e:
+                # Например, таблиц ещё нет (до миграций) - запрос подготовится при первом вызове
+                logger.debug(f"Запрос {query.name} не подготовлен: {e}")
+
+    async def run(self, name: str, *args, conn=None):
+        """
+        Выполняет именованный запрос из реестра. conn - уже занятое соединение,
+        если нужно выполнить несколько запросов без повторного захвата из пула.
+        """
+        query = QUERIES[name]
+        if self.metrics is not None or self.stats is not None:
+            return await self._run_instrumented(query, args, conn)
+        if conn is not None:
+            return await self._run(conn, query, args)
+        async with self.pool.acquire() as conn:
+            return await self._run(conn, query, args)
+
+    async def _run_instrumented(self, query, args, conn):
+        # Время запроса - без ожидания пула (его пишет MeteredPool)
+        if conn is None:
+            async with self.pool.acquire() as conn:
+                return await self._run_instrumented(query, args, conn)
+        started, done, result = time.perf_counter(), False, None
+        try:
+            result = await self._run(conn, query, args)
+            done = True
+            return result
+        finally:
+            elapsed = time.perf_counter() - started
+            if self.metrics is not None:
+                self.metrics.db_query_seconds.observe((query.name,), elapsed)
+            if self.stats is not None:
+                self.stats.record(query.name, query.sql, args, elapsed, _row_count(query.kind, result) if done else None)
+
+    async def _run(self, conn, query, args):
+        statement = conn.prepared.get(query.name)
+        if statement is None:
+            statement = conn.prepared[query.name] = await conn.prepare(query.sql)
+        try:
+            return await self._execute(statement, query, args)
+        except asyncpg.InvalidCachedStatementError:
+            # Схема изменилась после подготовки (миграция) - готовим заново
+            statement = conn.prepared[query.name] = await conn.prepare(query.sql)
+            return await self._execute(statement, query, args)
+
+    @staticmethod
+    async def _execute(statement, query, args):
+        if query.kind == FETCHVAL:
+            return await statement.fetchval(*args)
+        if query.kind == FETCHROW:
+            record = await statement.fetchrow(*args)
+            return query.row(*record) if record is not None and query.row else record
+        records = await statement.fetch(*args)
+        if query.kind == EXECUTE:
+            return statement.get_statusmsg()
+        if query.kind == PAGE:
+            total = records[0][0] if records else 0
+            return [query.row(*record[1:]) for record in records if record[1] is not None], total
+        return [query.row(*record) for record in records] if query.row else records
+
     async def disconnect(self):
         """Closes the database connection pool."""
         if self.pool:
@@ -54,20 +278,34 @@ class Database:
         """
         Получает новости по типу с пагинацией и общее количество новостей для этого типа.
         """
-        async with self.pool.acquire() as conn:
-            # Запрос для получения новостей для текущей страницы
-            news_items = await conn.fetch("""
-                SELECT id, title, telegram_url, news_type, created_at
-                FROM news
-                WHERE news_type = $1
-                ORDER BY created_at DESC, id DESC -- Сортировка по дате создания и ID
-                LIMIT $2 OFFSET $3
-            """, news_type, limit, offset)
-
-            # Запрос для получения общего количества новостей данного типа
-            total_news = await conn.fetchval("""
-                SELECT COUNT(*) FROM news WHERE news_type = $1
-            """, news_type)
-
-            return news_items, total_news
+        # Страница и COUNT - одним запросом и одним обращением к БД
+        return await self.run('news_page_by_type', news_type, limit, offset)
+
+    async def get_news_page_after(self, news_type: str, cursor, limit: int, backward: bool = False):
+        """
+        Keyset-пагинация: страница новостей до (или после, если backward) курсора (created_at, id).
+        Возвращает новости в порядке показа (новые сверху) и флаг наличия ещё записей в направлении движения.
+        """
+        if cursor is None:
+            rows = await self.run('news_first', news_type, limit + 1)
+        elif backward:
+            rows = await self.run('news_after', news_type, cursor[0], cursor[1], limit + 1)
+        else:
+            rows = await self.run('news_before', news_type, cursor[0], cursor[1], limit + 1)
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if backward:
+            rows.reverse()
+        return rows, has_more
+
+    async def get_news_count(self, news_type: str):
+        """Количество новостей категории с кэшированием на count_cache_ttl секунд"""
+        cached = self._news_count_cache.get(news_type)
+        now = time.monotonic()
+        if cached and cached[1] > now:
+            return cached[0]
 
+        total = await self.run('news_count', news_type)
+        self._news_count_cache[news_type] = (total, now + self.count_cache_ttl)
+        return total
@@ -0,0 +1,113 @@
+"""
+Реестр именованных запросов. Каждый запрос объявляется здесь один раз, готовится
+(PREPARE) на каждом соединении пула при его создании и выполняется через Database.run(имя, ...).
+Строки возвращаются лёгкими объектами со __slots__ вместо asyncpg.Record.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+
+FETCH = 'fetch' # Список строк
+FETCHROW = 'fetchrow' # Одна строка или None
+FETCHVAL = 'fetchval' # Одно значение
+EXECUTE = 'execute' # Статус выполнения
+PAGE = 'page' # (строки, total): первая колонка каждой строки - общее количество
+
+
+class Row:
+    """Доступ по ключу оставлен для кода, который работал с asyncpg.Record: row['title']"""
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+
+@dataclass(slots=True)
+class NewsRow(Row):
+    id: int
+    telegram_url: str
+    news_type: str
+    title: str
+    created_at: datetime
+
+
+@dataclass(slots=True)
+class PostRow(Row):
+    id: int
+    qr_id: str
+    title: str
+    description: str
+    image_url: str
+    content_url: str
+    is_active: bool
+    created_at: datetime
+
+
+@dataclass(slots=True)
+class CategoryCountRow(Row):
+    news_type: str
+    count: int
+
+
+@dataclass(frozen=True)
+class Query:
+    name: str
+    sql: str
+    kind: str = FETCH
+    row: type = None # Класс строки; колонки SELECT идут в порядке его полей
+
+
+NEWS_COLUMNS = "id, telegram_url, news_type, title, created_at"
+POST_FIELDS = ('id', 'qr_id', 'title', 'description', 'image_url', 'content_url', 'is_active', 'created_at')
+POST_COLUMNS = ", ".join(POST_FIELDS)
+
+
+def post_row(record) -> PostRow:
+    """PostRow из строки запроса вне реестра (asyncpg.Record или dict с колонками posts, лишние игнорируются)"""
+    return PostRow(*(record[name] for name in POST_FIELDS))
+
+# Страница и общее количество одним запросом: COUNT считается один раз, страница присоединяется LATERAL.
+# Если страница пуста, приходит одна строка с total и NULL в остальных колонках.
+_PAGE_SQL = """
+    SELECT c.total, p.* FROM (SELECT COUNT(*) AS total FROM news {where}) c
+    LEFT JOIN LATERAL (
+        SELECT {columns} FROM news {where} ORDER BY {order} LIMIT ${limit} OFFSET ${offset}
+    ) p ON TRUE
+"""
+
+QUERIES = {query.name: query for query in (
+    Query('post_by_qr_id',
+          f"SELECT {POST_COLUMNS} FROM posts WHERE qr_id = $1 AND is_active = TRUE",
+          FETCHROW, PostRow),
+    Query('news_page_by_type',
+          _PAGE_SQL.format(columns=NEWS_COLUMNS, where="WHERE news_type = $1",
+                           order="created_at DESC, id DESC", limit=2, offset=3),
+          PAGE, NewsRow),
+    Query('news_page_by_type_id',
+          _PAGE_SQL.format(columns=NEWS_COLUMNS, where="WHERE news_type = $1", order="id DESC", limit=2, offset=3),
+          PAGE, NewsRow),
+    Query('news_page_all',
+          _PAGE_SQL.format(columns=NEWS_COLUMNS, where="", order="id DESC", limit=1, offset=2),
+          PAGE, NewsRow),
+    Query('news_first',
+          f"SELECT {NEWS_COLUMNS} FROM news WHERE news_type = $1 ORDER BY created_at DESC, id DESC LIMIT $2",
+          FETCH, NewsRow),
+    Query('news_before',
+          f"SELECT {NEWS_COLUMNS} FROM news WHERE news_type = $1 AND (created_at, id) < ($2, $3) "
+          f"ORDER BY created_at DESC, id DESC LIMIT $4",
+          FETCH, NewsRow),
+    Query('news_after',
+          f"SELECT {NEWS_COLUMNS} FROM news WHERE news_type = $1 AND (created_at, id) > ($2, $3) "
+          f"ORDER BY created_at ASC, id ASC LIMIT $4",
+          FETCH, NewsRow),
+    Query('news_count', "SELECT COUNT(*) FROM news WHERE news_type = $1", FETCHVAL),
+    Query('news_category_counts',
+          "SELECT news_type, COUNT(*) AS count FROM news GROUP BY news_type",
+          FETCH, CategoryCountRow),
+    Query('subscriber_add',
+          "INSERT INTO subscribers (user_id) VALUES ($1) "
+          "ON CONFLICT (user_id) DO UPDATE SET is_active = TRUE WHERE NOT subscribers.is_active",
+          EXECUTE),
+)}
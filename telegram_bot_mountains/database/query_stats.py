@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+OTHER = '<прочие запросы>' # Сюда попадают запросы сверх max_statements (например, SQL, собранный с подстановками)
+
+
+class StatementStats:
+    __slots__ = ('key', 'sql', 'calls', 'errors', 'total', 'max', 'rows')
+
+    def __init__(self, key: str, sql: str):
+        self.key = key
+        self.sql = sql
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.calls if self.calls else 0.0
+
+
+class QueryStats:
+    """
+    Статистика по запросам процесса: вызовы, ошибки, суммарное и максимальное время, строки.
+    Ключ - имя запроса реестра (Database.run) или текст SQL с нормализованными пробелами.
+    Запросы дольше slow_ms пишутся в лог с параметрами; с explain=True для SELECT
+    в фоне снимается EXPLAIN (ANALYZE, BUFFERS) - не чаще раза в explain_interval секунд
+    на запрос, по одному за раз и в транзакции только для чтения.
+    """
+
+    def __init__(self, slow_ms: float = 200, explain: bool = False, explain_interval: float = 600,
+                 max_statements: int = 500, max_param_length: int = 200):
+        self.slow = slow_ms / 1000
+        self.explain = explain
+        self.explain_interval = explain_interval
+        self.max_statements = max_statements
+        self.max_param_length = max_param_length
+        self.slow_queries = 0
+        self.pool = None # Пул для EXPLAIN, задаёт Database.connect: исходный, без учёта запросов
+        self._statements = {} # ключ -> StatementStats
+        self._keys = {} # исходный текст SQL -> ключ
+        self._explained = {} # ключ -> когда снимали план
+        self._explain_task = None
+        self.started = time.time()
+
+    def key(self, sql: str) -> str:
+        key = self._keys.get(sql)
+        if key is None:
+            key = ' '.join(sql.split())
+            if len(self._keys) < self.max_statements:
+                self._keys[sql] = key
+            elif key not in self._statements:
+                key = OTHER
+        return key
+
+    def record(self, key: str, sql: str, args, seconds: float, rows=None):
+        """rows=None - запрос завершился ошибкой"""
+        statement = self._statements.get(key)
+        if statement is None:
+            if key == OTHER or len(self._statements) >= self.max_statements:
+                key = OTHER
+                statement = self._statements.get(key)
+            if statement is None:
+                # У общей записи нет своего SQL: в неё попадают разные запросы
+                statement = self._statements[key] = StatementStats(key, OTHER if key == OTHER else sql)
+        statement.calls += 1
+        statement.total += seconds
+        if seconds > statement.max:
+            statement.max = seconds
+        if rows is None:
+            statement.errors += 1
+        else:
+            statement.rows += rows
+        if seconds >= self.slow:
+            self._on_slow(key, sql, args, seconds)
+
+    def _on_slow(self, key: str, sql: str, args, seconds: float):
+        self.slow_queries += 1
+        params = ', '.join(self._param(arg) for arg in args)
+        text = key if key != OTHER else ' '.join(sql.split())
+        logger.warning(f"Медленный запрос {seconds * 1000:.0f} мс: {text[:300]} | параметры: [{params}]")
+        if self.explain and self.pool is not None:
+            # План - только для SQL этого вызова: параметры относятся к нему, а не к тексту записи статистики
+            self._schedule_explain(key, sql, args)
+
+    def _param(self, value) -> str:
+        text = repr(value)
+        return text if len(text) <= self.max_param_length else text[:self.max_param_length] + '...'
+
+    def _schedule_explain(self, key: str, sql: str, args):
+        if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+            return # EXPLAIN ANALYZE выполняет запрос - только чтение
+        if self._explain_task is not None and not self._explain_task.done():
+            return
+        now = time.monotonic()
+        if now - self._explained.get(key, -self.explain_interval) < self.explain_interval:
+            return # Для OTHER интервал общий на все свёрнутые запросы
+        self._explained[key] = now
+        title = key if key != OTHER else ' '.join(sql.split())
+        self._explain_task = asyncio.create_task(self._explain(title, sql, tuple(args)))
+
+    async def _explain(self, title: str, sql: str, args):
+        try:
+            async with self.pool.acquire() as conn:
+                transaction = conn.transaction(readonly=True)
+                await transaction.start()
+                try:
+                    rows = await conn.fetch(f"EXPLAIN (ANALYZE, BUFFERS) {sql}", *args)
+                finally:
+                    await transaction.rollback()
+            plan = '\n'.join(row[0] for row in rows)
+            logger.warning(f"План медленного запроса {title[:100]}:\n{plan}")
+        except Exception as e:
+            logger.error(f"EXPLAIN для {title[:100]} не снят: {e}")
+
+    def top(self, n: int = 10, order: str = 'total'):
+        """n запросов с наибольшим total / max / calls / mean"""
+        return sorted(self._statements.values(), key=lambda s: getattr(s, order), reverse=True)[:n]
+
+    def report(self, n: int = 10) -> str:
+        """Текст для /dbstats: n запросов с наибольшим суммарным временем"""
+        lines = [f"Запросов: {self.stats['statements']}, вызовов: {self.stats['calls']}, "
+                 f"медленных (>{self.slow * 1000:.0f} мс): {self.slow_queries}, "
+                 f"с {time.strftime('%d.%m %H:%M', time.localtime(self.started))}"]
+        for i, s in enumerate(self.top(n), 1):
+            key = s.key if len(s.key) <= 60 else s.key[:57] + '...'
+            lines.append(f"\n{i}. {key}\n   вызовов {s.calls}, всего {s.total:.3f} с, среднее {s.mean * 1000:.1f} мс, "
+                         f"макс {s.max * 1000:.1f} мс, строк {s.rows}, ошибок {s.errors}")
+        return '\n'.join(lines)
+
+    def reset(self):
+        self._statements.clear()
+        self._explained.clear()
+        self.slow_queries = 0
+        self.started = time.time()
+
+    @property
+    def stats(self) -> dict:
+        return {'statements': len(self._statements), 'calls': sum(s.calls for s in self._statements.values()),
+                'slow': self.slow_queries}
+
+
+def status_rows(status) -> int:
+    """Число строк из статуса команды: 'INSERT 0 5' -> 5, 'UPDATE 3' -> 3"""
+    tail = status.rsplit(' ', 1)[-1] if isinstance(status, str) else ''
+    return int(tail) if tail.isdigit() else 0
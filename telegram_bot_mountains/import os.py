@@ -9,6 +9,7 @@ from aiogram.enums import ParseMode
 from urllib.parse import unquote
 import asyncpg
 from dotenv import load_dotenv
+from services.interaction_logger import BatchedEventWriter
 
 # Настройка логирования
 logging.basicConfig(
@@ -28,6 +29,7 @@ class TelegramBot:
         self.bot = None
         self.dp = None
         self.db_pool = None
+        self.usage_log = None
         
     async def setup_database(self):
         """Настройка подключения к базе данных"""
@@ -47,6 +49,8 @@ class TelegramBot:
         
         self.db_pool = await asyncpg.create_pool(db_uri)
         await self.init_tables()
+        self.usage_log = BatchedEventWriter(self.db_pool, 'usage_stats', ('user_id', 'action', 'post_id'))
+        self.usage_log.start()
         await self.insert_test_data()
         logger.info("База данных подключена.")
 
@@ -104,6 +108,37 @@ class TelegramBot:
                     )
                 ''')
 
+                # Итоги по действиям для /stats: пополняются триггером на каждую вставку (и COPY) в usage_stats,
+                # поэтому статистика не пересчитывает всю историю
+                async with conn.transaction():
+                    if await conn.fetchval("SELECT to_regclass('usage_stats_totals') IS NULL"):
+                        await conn.execute("LOCK TABLE usage_stats IN SHARE MODE") # Досчёт истории без гонки со вставками
+                        await conn.execute('''
+                            CREATE TABLE usage_stats_totals (
+                                action VARCHAR(100) PRIMARY KEY,
+                                count BIGINT NOT NULL DEFAULT 0
+                            )
+                        ''')
+                        await conn.execute('''
+                            CREATE OR REPLACE FUNCTION usage_stats_rollup() RETURNS trigger AS $$
+                            BEGIN
+                                INSERT INTO usage_stats_totals AS t (action, count)
+                                SELECT COALESCE(action, ''), COUNT(*) FROM new_rows GROUP BY 1
+                                ON CONFLICT (action) DO UPDATE SET count = t.count + EXCLUDED.count;
+                                RETURN NULL;
+                            END
+                            $$ LANGUAGE plpgsql
+                        ''')
+                        await conn.execute('''
+                            CREATE TRIGGER usage_stats_rollup AFTER INSERT ON usage_stats
+                            REFERENCING NEW TABLE AS new_rows
+                            FOR EACH STATEMENT EXECUTE FUNCTION usage_stats_rollup()
+                        ''')
+                        await conn.execute('''
+                            INSERT INTO usage_stats_totals (action, count)
+                            SELECT COALESCE(action, ''), COUNT(*) FROM usage_stats GROUP BY 1
+                        ''')
+
                 logger.info("Все таблицы успешно созданы/проверены")
         except Exception as e:
             logger.error(f"Ошибка создания таблиц: {e}")
@@ -112,11 +147,7 @@ class TelegramBot:
     async def log_user_action(self, user_id: int, action: str, post_id: int = None):
         """Логирование действий пользователя"""
         try:
-            async with self.db_pool.acquire() as conn:
-                await conn.execute(
-                    "INSERT INTO usage_stats (user_id, action, post_id) VALUES ($1, $2, $3)",
-                    user_id, action, post_id
-                )
+            await self.usage_log.log((user_id, action, post_id))
         except Exception as e:
             logger.error(f"Ошибка логирования действия пользователя: {e}")
 
@@ -476,13 +507,13 @@ class TelegramBot:
                 total_users = await conn.fetchval("SELECT COUNT(DISTINCT user_id) FROM user_chats")
                 total_posts = await conn.fetchval("SELECT COUNT(*) FROM posts WHERE is_active = TRUE")
                 total_news = await conn.fetchval("SELECT COUNT(*) FROM news")
-                total_actions = await conn.fetchval("SELECT COUNT(*) FROM usage_stats")
+                # Действия - по итогам usage_stats_totals, а не по всей истории
+                total_actions = await conn.fetchval("SELECT COALESCE(SUM(count), 0) FROM usage_stats_totals")
                 
                 # Популярные действия
                 popular_actions = await conn.fetch("""
-                    SELECT action, COUNT(*) as count 
-                    FROM usage_stats 
-                    GROUP BY action 
+                    SELECT action, count 
+                    FROM usage_stats_totals 
                     ORDER BY count DESC 
                     LIMIT 5
                 """)
@@ -505,7 +536,7 @@ class TelegramBot:
                     }
                     
                     for action in popular_actions:
-                        action_name = action_names.get(action['action'], action['action'])
+                        action_name = action_names.get(action['action'], action['action'] or '-')
                         stats_text += f"  • {action_name}: {action['count']}\n"
                 
                 keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -700,6 +731,8 @@ class TelegramBot:
         logger.info("Очистка ресурсов...")
         if self.bot:
             await self.bot.session.close()
+        if self.usage_log:
+            await self.usage_log.stop()
         if self.db_pool:
             await self.db_pool.close()
         logger.info("Бот завершен.")
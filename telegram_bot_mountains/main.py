@@ -3,35 +3,57 @@ import os
 import logging
 import asyncio
 import hashlib
+import html
+import time
 from urllib.parse import unquote, quote_plus
 from aiogram import Bot, Dispatcher, F, types
 from aiogram.filters import Command
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.enums import ParseMode
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.utils.keyboard import InlineKeyboardBuilder # Импортируем InlineKeyboardBuilder для удобства
+from bot.callbacks import (CallbackRouter, Category, MainMenu, NewsCategories, NewsNav, SearchMore, SearchPrompt, ShowPost,
+                           show_post_data)
+from bot.templates import (BACK_TO_MENU_MARKUP, CATEGORIES_TEXT, HELP_TEXT, MAIN_MENU_MARKUP, MAIN_MENU_ROW,
+                           MAIN_MENU_TEXT, NEWS_NOT_FOUND_MARKUP, NEWS_PAGE_FOOTER, POST_MARKUP,
+                           POSTS_NOT_FOUND_MARKUP, QR_WELCOME_TEXT, SEARCH_NEWS_FOOTER, START_TEXT, KeyboardCache,
+                           PrebuiltMarkupSession, build_categories_markup)
+from bot.log_setup import HandlerNameMiddleware, UpdateLogMiddleware, setup_logging
+from bot.metrics import BotAPIMetricsMiddleware, BotMetrics, HandlerMetricsMiddleware, UpdateMetricsMiddleware
+from bot.webhook import WebhookServer
 from database.postgres_VR2 import Database 
+from database.fsm_storage import FSMFlushMiddleware, PostgresStorage
+from database.migrate import migrate
+from database.query_stats import QueryStats
+from services.broadcast import BroadcastEngine
+from services.db_events import DatabaseEvents
+from services.qr_batch import generate_batch_async
+from services.qr_generator import QRRenderCache, qr_deep_link
+from services.interaction_logger import BatchedEventWriter
+from services.interaction_rollup import InteractionRollup
+from services.media_cache import PostMediaCache
+from services.metrics import MetricsServer
+from services.news_page_cache import NewsPageCache
+from services.post_cache import PostCache
+from services.news_catalog import NewsCategoryCatalog
+from services.search import SearchEngine
+from services.search_index import InMemorySearchIndex
+from utils.pagination import NAV_FORWARD, NAV_BACKWARD, encode_cursor, decode_cursor
 from dotenv import load_dotenv
 import hashlib
-from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Message, CallbackQuery
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Message, CallbackQuery, BufferedInputFile
 from aiogram import F
 
 ADMIN_IDS = (709108561, 7637004765)
+load_dotenv()
+
 # --- Настройка логирования ---
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('bot.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+# Запись в файл и консоль - в фоновом потоке; уровни, выборка и ротация - из окружения (bot/log_setup.py)
+setup_logging()
 logger = logging.getLogger(__name__)
 
-load_dotenv()
-
 # --- Состояния для FSM ---
 class SearchStates(StatesGroup):
     waiting_for_post_keyword = State()
@@ -39,6 +61,14 @@ class SearchStates(StatesGroup):
 
 # --- Константы ---
 NEWS_PER_PAGE = 5 # Количество новостей на одной странице
+# Режим пагинации новостей: 'cursor' (keyset по created_at, id) или 'offset' (старый LIMIT/OFFSET)
+NEWS_PAGINATION_MODE = os.getenv('NEWS_PAGINATION_MODE', 'cursor')
+SEARCH_PAGE_SIZE = 5 # Результатов поиска новостей на странице
+SEARCH_POSTS_PAGE_SIZE = 10 # Результатов поиска постов на странице
+BOT_MODE = os.getenv('BOT_MODE', 'polling') # 'polling' или 'webhook'
+FSM_STORAGE = os.getenv('FSM_STORAGE', 'postgres') # 'postgres' или 'memory' (состояния теряются при перезапуске)
+METRICS_PORT = os.getenv('METRICS_PORT') # Порт GET /metrics для Prometheus; не задан - метрики не собираются
+QUERY_STATS = os.getenv('QUERY_STATS', '1') == '1' # Статистика запросов к БД и лог медленных (/dbstats)
 
 
 # --- Основной класс бота ---
@@ -47,400 +77,124 @@ class TelegramBot:
         self.bot = None
         self.dp = None
         self.db = None
+        self.db_events = None
+        self.news_catalog = None
+        self.news_pages = None
+        self.post_cache = None
+        self.interaction_log = None
+        self.rollup = None
+        self.search_engine = None
+        self.search_index = None
+        self.media_cache = None
+        self.broadcast = None
+        self.fsm_storage = None
+        self.callbacks = None
+        self.metrics = BotMetrics() if METRICS_PORT else None
+        self.metrics_server = None
+        self.query_stats = QueryStats(
+            slow_ms=float(os.getenv('SLOW_QUERY_MS', 200)),
+            explain=os.getenv('SLOW_QUERY_EXPLAIN', '0') == '1',
+        ) if QUERY_STATS else None
+        self.keyboards = KeyboardCache(max_items=int(os.getenv('KEYBOARD_CACHE_SIZE', 64)))
+        self.qr_cache = QRRenderCache(max_items=int(os.getenv('QR_CACHE_SIZE', 256)))
         self.bot_username = os.getenv('BOT_USERNAME', 'vershiny_rossii_bot')
         self.admin_id = os.getenv('ADMIN_ID')
 
     async def setup_database(self):
         """Настройка подключения к базе данных"""
-        db_config = {
-            'user': os.getenv('DB_USER', 'postgres'),
-            'password': os.getenv('DB_PASSWORD'),
-            'database': os.getenv('DB_NAME', 'vershinyrossii2'),
-            'host': os.getenv('DB_HOST', '127.0.0.1'),
-            'port': int(os.getenv('DB_PORT', 5433)),
-        }
-        
         try:
-            self.db = Database(**db_config)
-            await self.db.connect() # Предполагаем, что у вашего класса Database есть метод connect()
-            await self.init_tables()
-            await self.insert_test_data()
+            if self.db is None: # Нагрузочный прогон и тесты подставляют свою БД заранее
+                self.db = Database.from_env()
+            if self.db.pool is None:
+                self.db.metrics = self.metrics
+                self.db.stats = self.query_stats
+                await self.db.connect()
+            await migrate(self.db) # При актуальной схеме - один SELECT, без DDL
+
+            self.search_engine = SearchEngine(self.db)
+            self.media_cache = PostMediaCache(self.db)
+            await self.media_cache.load()
+            self.db_events = DatabaseEvents(self.db)
+            self.post_cache = PostCache(
+                self.db, self.db_events,
+                max_items=int(os.getenv('POST_CACHE_SIZE', 2000)),
+                ttl=float(os.getenv('POST_CACHE_TTL', 600)),
+                negative_ttl=float(os.getenv('POST_CACHE_NEGATIVE_TTL', 60)),
+            )
+            if self.fsm_storage:
+                await self.fsm_storage.start(self.db, self.db_events)
+            self.news_catalog = NewsCategoryCatalog(
+                self.db, self.db_events,
+                reconcile_interval=float(os.getenv('NEWS_CATALOG_RECONCILE', 300))
+            )
+            await self.news_catalog.start()
+            self.news_pages = NewsPageCache(
+                self.db_events,
+                max_items=int(os.getenv('NEWS_PAGE_CACHE_SIZE', 2000)),
+                ttl=float(os.getenv('NEWS_PAGE_CACHE_TTL', 300)),
+            )
+            if os.getenv('SEARCH_INDEX', '0') == '1':
+                # Поиск из памяти процесса: без запросов к БД на каждый поиск
+                self.search_index = InMemorySearchIndex(self.db, self.db_events)
+                await self.search_index.start()
+            await self.db_events.start()
+
+            # Взаимодействия пишутся пачками через COPY в фоне, а не INSERT-ом на каждый апдейт
+            self.interaction_log = BatchedEventWriter(
+                self.db.pool, 'user_interactions',
+                ('user_id', 'username', 'first_name', 'last_name', 'qr_id', 'post_id', 'interaction_type'),
+                max_queue=int(os.getenv('INTERACTION_LOG_QUEUE', 10000)),
+                batch_size=int(os.getenv('INTERACTION_LOG_BATCH', 500)),
+                flush_interval=float(os.getenv('INTERACTION_LOG_INTERVAL', 1.0)),
+                drop_policy=os.getenv('INTERACTION_LOG_POLICY', 'drop_new'),
+            )
+            self.interaction_log.start()
+            # Агрегаты для /stats: догоняют журнал в фоне, статистика не сканирует user_interactions
+            self.rollup = InteractionRollup(
+                self.db,
+                interval=float(os.getenv('ROLLUP_INTERVAL', 60)),
+                batch_size=int(os.getenv('ROLLUP_BATCH', 10000)),
+                lag=float(os.getenv('ROLLUP_LAG', 30)),
+                hourly_days=int(os.getenv('ROLLUP_HOURLY_DAYS', 90)),
+            )
+            self.rollup.start()
+
+            self.broadcast = BroadcastEngine(
+                self.bot, self.db,
+                rate=float(os.getenv('BROADCAST_RATE', 28)),
+                workers=int(os.getenv('BROADCAST_WORKERS', 25)),
+            )
+            for row in await self.broadcast.unfinished():
+                logger.warning(f"Рассылка #{row['id']} не завершена ({row['status']}), продолжить: /broadcast_resume {row['id']}")
             logger.info("База данных готова")
         except Exception as e:
             logger.error(f"Ошибка настройки БД: {e}")
             raise
 
-    async def init_tables(self):
-        """Создание таблиц в базе данных"""
-        try:
-            async with self.db.pool.acquire() as conn:
-                # Таблица постов
-                await conn.execute('''
-                    CREATE TABLE IF NOT EXISTS posts (
-                        id SERIAL PRIMARY KEY,
-                        qr_id VARCHAR(50) UNIQUE NOT NULL,
-                        title VARCHAR(255) NOT NULL,
-                        description TEXT NOT NULL,
-                        image_url VARCHAR(255) NOT NULL,
-                        content_url VARCHAR(255),
-                        is_active BOOLEAN DEFAULT TRUE,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-
-                # Таблица новостей (добавлен UNIQUE CONFLICT на telegram_url для on_conflict)
-                await conn.execute('''
-                    CREATE TABLE IF NOT EXISTS news (
-                        id SERIAL PRIMARY KEY,
-                        telegram_url TEXT UNIQUE NOT NULL, -- Добавлено UNIQUE
-                        news_type TEXT NOT NULL,
-                        title TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-
-                # Таблица взаимодействий пользователей
-                await conn.execute('''
-                    CREATE TABLE IF NOT EXISTS user_interactions (
-                        id SERIAL PRIMARY KEY,
-                        user_id BIGINT NOT NULL,
-                        username VARCHAR(255),
-                        first_name VARCHAR(255),
-                        last_name VARCHAR(255),
-                        qr_id VARCHAR(50),
-                        post_id INTEGER REFERENCES posts(id),
-                        interaction_type VARCHAR(50) NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-            
-            logger.info("Таблицы успешно созданы")
-        except Exception as e:
-            logger.error(f"Ошибка создания таблиц: {e}")
-            raise
-
     async def on_join(message: Message):
         if message.new_chat_members:
             for user in message.new_chat_members:
                 await message.reply(f"Привет, {user.full_name} 👋 Добро пожаловать!")
     
-    async def broadcast_message(application, text: str):
-        async with application.bot_data["db"].pool.acquire() as conn:
-            rows = await conn.fetch("SELECT user_id FROM subscribers")
-
-        for row in rows:
-            try:
-                await application.bot.send_message(chat_id=row["user_id"], text=text)
-                await asyncio.sleep(0.05)
-            except Exception as e:
-                logging.warning(f"Ошибка при отправке {row['user_id']}: {e}")
-
-
-
-            
-    async def insert_test_data(self):
-        """Добавление тестовых данных"""
-        async with self.db.pool.acquire() as conn:
-            # Проверяем, есть ли уже тестовые новости
-            if await conn.fetchval("SELECT COUNT(*) FROM news WHERE news_type = 'История восхождений и экспедиций'") < 10:
-                news_data = [
-                        ('https://t.me/TopRussiaBrand/288', 'История восхождений и экспедиций', 'Новость #1'),
-                        ('https://t.me/TopRussiaBrand/289', 'История восхождений и экспедиций', 'Новость #2'),
-                        ('https://t.me/TopRussiaBrand/290', 'История восхождений и экспедиций', 'Новость #3'),
-                        ('https://t.me/TopRussiaBrand/292', 'Культурное и историческое значение горы', 'Новость #4'),
-                        ('https://t.me/TopRussiaBrand/293', 'Культурное и историческое значение горы', 'Новость #5'),
-                        ('https://t.me/TopRussiaBrand/294', 'История восхождений и экспедиций', 'Новость #6'),
-                        ('https://t.me/TopRussiaBrand/296', 'История восхождений и экспедиций', 'Новость #7'),
-                        ('https://t.me/TopRussiaBrand/297', 'Природа и экология Эльбруса', 'Новость #8'),
-                        ('https://t.me/TopRussiaBrand/298', 'История восхождений и экспедиций', 'Новость #9'),
-                        ('https://t.me/TopRussiaBrand/299', 'Природа и экология Эльбруса', 'Новость #10'),
-                        ('https://t.me/TopRussiaBrand/300', 'История восхождений и экспедиций', 'Новость #11'),
-                        ('https://t.me/TopRussiaBrand/301', 'История восхождений и экспедиций', 'Новость #12'),
-                        ('https://t.me/TopRussiaBrand/303', 'Культурное и историческое значение горы', 'Новость #13'),
-                        ('https://t.me/TopRussiaBrand/304', 'Культурное и историческое значение горы', 'Новость #14'),
-                        ('https://t.me/TopRussiaBrand/306', 'Культурное и историческое значение горы', 'Новость #15'),
-                        ('https://t.me/TopRussiaBrand/307', 'Культурное и историческое значение горы', 'Новость #16'),
-                        ('https://t.me/TopRussiaBrand/308', 'История восхождений и экспедиций', 'Новость #17'),
-                        ('https://t.me/TopRussiaBrand/309', 'История восхождений и экспедиций', 'Новость #18'),
-                        ('https://t.me/TopRussiaBrand/311', 'Культурное и историческое значение горы', 'Новость #19'),
-                        ('https://t.me/TopRussiaBrand/312', 'Культурное и историческое значение горы', 'Новость #20'),
-                        ('https://t.me/TopRussiaBrand/313', 'Культурное и историческое значение горы', 'Новость #21'),
-                        ('https://t.me/TopRussiaBrand/314', 'История восхождений и экспедиций', 'Новость #22'),
-                        ('https://t.me/TopRussiaBrand/315', 'Природа и экология Эльбруса', 'Новость #23'),
-                        ('https://t.me/TopRussiaBrand/317', 'История восхождений и экспедиций', 'Новость #24'),
-                        ('https://t.me/TopRussiaBrand/318', 'Культурное и историческое значение горы', 'Новость #25'),
-                        ('https://t.me/TopRussiaBrand/320', 'Культурное и историческое значение горы', 'Новость #26'),
-                        ('https://t.me/TopRussiaBrand/321', 'История восхождений и экспедиций', 'Новость #27'),
-                        ('https://t.me/TopRussiaBrand/322', 'История восхождений и экспедиций', 'Новость #28'),
-                        ('https://t.me/TopRussiaBrand/323', 'История восхождений и экспедиций', 'Новость #29'),
-                        ('https://t.me/TopRussiaBrand/325', 'История восхождений и экспедиций', 'Новость #30'),
-                        ('https://t.me/TopRussiaBrand/326', 'История восхождений и экспедиций', 'Новость #31'),
-                        ('https://t.me/TopRussiaBrand/327', 'Культурное и историческое значение горы', 'Новость #32'),
-                        ('https://t.me/TopRussiaBrand/328', 'Культурное и историческое значение горы', 'Новость #33'),
-                        ('https://t.me/TopRussiaBrand/329', 'Культурное и историческое значение горы', 'Новость #34'),
-                        ('https://t.me/TopRussiaBrand/330', 'Культурное и историческое значение горы', 'Новость #35'),
-                        ('https://t.me/TopRussiaBrand/333', 'История восхождений и экспедиций', 'Новость #36'),
-                        ('https://t.me/TopRussiaBrand/334', 'История восхождений и экспедиций', 'Новость #37'),
-                        ('https://t.me/TopRussiaBrand/335', 'Культурное и историческое значение горы', 'Новость #38'),
-                        ('https://t.me/TopRussiaBrand/336', 'История восхождений и экспедиций', 'Новость #39'),
-                        ('https://t.me/TopRussiaBrand/337', 'Культурное и историческое значение горы', 'Новость #40'),
-                        ('https://t.me/TopRussiaBrand/339', 'История восхождений и экспедиций', 'Новость #41'),
-                        ('https://t.me/TopRussiaBrand/340', 'История восхождений и экспедиций', 'Новость #42'),
-                        ('https://t.me/TopRussiaBrand/341', 'История восхождений и экспедиций', 'Новость #43'),
-                        ('https://t.me/TopRussiaBrand/342', 'История восхождений и экспедиций', 'Новость #44'),
-                        ('https://t.me/TopRussiaBrand/343', 'История восхождений и экспедиций', 'Новость #45'),
-                        ('https://t.me/TopRussiaBrand/346', 'Культурное и историческое значение горы', 'Новость #46'),
-                        ('https://t.me/TopRussiaBrand/347', 'Природа и экология Эльбруса', 'Новость #47'),
-                        ('https://t.me/TopRussiaBrand/348?single', 'Культурное и историческое значение горы', 'Новость #48'),
-                        ('https://t.me/TopRussiaBrand/351', 'История восхождений и экспедиций', 'Новость #49'),
-                        ('https://t.me/TopRussiaBrand/352', 'Культурное и историческое значение горы', 'Новость #50'),
-                        ('https://t.me/TopRussiaBrand/353', 'История восхождений и экспедиций', 'Новость #51'),
-                        ('https://t.me/TopRussiaBrand/354', 'История восхождений и экспедиций', 'Новость #52'),
-                        ('https://t.me/TopRussiaBrand/355', 'История восхождений и экспедиций', 'Новость #53'),
-                        ('https://t.me/TopRussiaBrand/356', 'История восхождений и экспедиций', 'Новость #54'),
-                        ('https://t.me/TopRussiaBrand/357', 'Природа и экология Эльбруса', 'Новость #55'),
-                        ('https://t.me/TopRussiaBrand/358', 'Культурное и историческое значение горы', 'Новость #56'),
-                        ('https://t.me/TopRussiaBrand/359', 'Культурное и историческое значение горы', 'Новость #57'),
-                        ('https://t.me/TopRussiaBrand/360', 'История восхождений и экспедиций', 'Новость #58'),
-                        ('https://t.me/TopRussiaBrand/361', 'История восхождений и экспедиций', 'Новость #59'),
-                        ('https://t.me/TopRussiaBrand/362', 'Культурное и историческое значение горы', 'Новость #60'),
-                        ('https://t.me/TopRussiaBrand/363', 'Природа и экология Эльбруса', 'Новость #61'),
-                        ('https://t.me/TopRussiaBrand/364', 'История восхождений и экспедиций', 'Новость #62'),
-                        ('https://t.me/TopRussiaBrand/365', 'История восхождений и экспедиций', 'Новость #63'),
-                        ('https://t.me/TopRussiaBrand/366', 'Культурное и историческое значение горы', 'Новость #64'),
-                        ('https://t.me/TopRussiaBrand/367', 'Природа и экология Эльбруса', 'Новость #65'),
-                        ('https://t.me/TopRussiaBrand/368', 'Культурное и историческое значение горы', 'Новость #66'),
-                        ('https://t.me/TopRussiaBrand/369', 'Культурное и историческое значение горы', 'Новость #67'),
-                        ('https://t.me/TopRussiaBrand/370', 'История восхождений и экспедиций', 'Новость #68'),
-                        ('https://t.me/TopRussiaBrand/371', 'История восхождений и экспедиций', 'Новость #69'),
-                        ('https://t.me/TopRussiaBrand/372', 'История восхождений и экспедиций', 'Новость #70'),
-                        ('https://t.me/TopRussiaBrand/373', 'История восхождений и экспедиций', 'Новость #71'),
-                        ('https://t.me/TopRussiaBrand/374', 'История восхождений и экспедиций', 'Новость #72'),
-                        ('https://t.me/TopRussiaBrand/375', 'Культурное и историческое значение горы', 'Новость #73'),
-                        ('https://t.me/TopRussiaBrand/376', 'Культурное и историческое значение горы', 'Новость #74'),
-                        ('https://t.me/TopRussiaBrand/377', 'Культурное и историческое значение горы', 'Новость #75'),
-                        ('https://t.me/TopRussiaBrand/378', 'Культурное и историческое значение горы', 'Новость #76'),
-                        ('https://t.me/TopRussiaBrand/380', 'Культурное и историческое значение горы', 'Новость #77'),
-                        ('https://t.me/TopRussiaBrand/381', 'Культурное и историческое значение горы', 'Новость #78'),
-                        ('https://t.me/TopRussiaBrand/382?single', 'Культурное и историческое значение горы', 'Новость #79'),
-                        ('https://t.me/TopRussiaBrand/384', 'Культурное и историческое значение горы', 'Новость #80'),
-                        ('https://t.me/TopRussiaBrand/386', 'Культурное и историческое значение горы', 'Новость #81'),
-                        ('https://t.me/TopRussiaBrand/387', 'Культурное и историческое значение горы', 'Новость #82'),
-                        ('https://t.me/TopRussiaBrand/388', 'История восхождений и экспедиций', 'Новость #83'),
-                        ('https://t.me/TopRussiaBrand/389', 'История восхождений и экспедиций', 'Новость #84'),
-                        ('https://t.me/TopRussiaBrand/390', 'История восхождений и экспедиций', 'Новость #85'),
-                        ('https://t.me/TopRussiaBrand/392', 'История восхождений и экспедиций', 'Новость #86'),
-                        ('https://t.me/TopRussiaBrand/393', 'История восхождений и экспедиций', 'Новость #87'),
-                        ('https://t.me/TopRussiaBrand/394', 'Культурное и историческое значение горы', 'Новость #88'),
-                        ('https://t.me/TopRussiaBrand/395', 'История восхождений и экспедиций', 'Новость #89'),
-                        ('https://t.me/TopRussiaBrand/396', 'Природа и экология Эльбруса', 'Новость #90'),
-                        ('https://t.me/TopRussiaBrand/397', 'Культурное и историческое значение горы', 'Новость #91'),
-                        ('https://t.me/TopRussiaBrand/398', 'Природа и экология Эльбруса', 'Новость #92'),
-                        ('https://t.me/TopRussiaBrand/399', 'Культурное и историческое значение горы', 'Новость #93'),
-                        ('https://t.me/TopRussiaBrand/400', 'Культурное и историческое значение горы', 'Новость #94'),
-                        ('https://t.me/TopRussiaBrand/401', 'Культурное и историческое значение горы', 'Новость #95'),
-                        ('https://t.me/TopRussiaBrand/402', 'Культурное и историческое значение горы', 'Новость #96'),
-                        ('https://t.me/TopRussiaBrand/403', 'Культурное и историческое значение горы', 'Новость #97'),
-                        ('https://t.me/TopRussiaBrand/404', 'Природа и экология Эльбруса', 'Новость #98'),
-                        ('https://t.me/TopRussiaBrand/405?single', 'Культурное и историческое значение горы', 'Новость #99'),
-                        ('https://t.me/TopRussiaBrand/407', 'История восхождений и экспедиций', 'Новость #100'),
-                        ('https://t.me/TopRussiaBrand/408', 'История восхождений и экспедиций', 'Новость #101'),
-                        ('https://t.me/TopRussiaBrand/409', 'Культурное и историческое значение горы', 'Новость #102'),
-                        ('https://t.me/TopRussiaBrand/410', 'История восхождений и экспедиций', 'Новость #103'),
-                        ('https://t.me/TopRussiaBrand/412', 'История восхождений и экспедиций', 'Новость #104'),
-                        ('https://t.me/TopRussiaBrand/413', 'Природа и экология Эльбруса', 'Новость #105'),
-                        ('https://t.me/TopRussiaBrand/414', 'История восхождений и экспедиций', 'Новость #106'),
-                        ('https://t.me/TopRussiaBrand/415', 'История восхождений и экспедиций', 'Новость #107'),
-                        ('https://t.me/TopRussiaBrand/416', 'Культурное и историческое значение горы', 'Новость #108'),
-                        ('https://t.me/TopRussiaBrand/417', 'Культурное и историческое значение горы', 'Новость #109'),
-                        ('https://t.me/TopRussiaBrand/418', 'История восхождений и экспедиций', 'Новость #110'),
-                        ('https://t.me/TopRussiaBrand/423', 'История восхождений и экспедиций', 'Новость #111'),
-                        ('https://t.me/TopRussiaBrand/424', 'Культурное и историческое значение горы', 'Новость #112'),
-                        ('https://t.me/TopRussiaBrand/426', 'Природа и экология Эльбруса', 'Новость #113'),
-                        ('https://t.me/TopRussiaBrand/427', 'Культурное и историческое значение горы', 'Новость #114'),
-                        ('https://t.me/TopRussiaBrand/428', 'История восхождений и экспедиций', 'Новость #115'),
-                        ('https://t.me/TopRussiaBrand/429', 'Культурное и историческое значение горы', 'Новость #116'),
-                        ('https://t.me/TopRussiaBrand/430', 'Культурное и историческое значение горы', 'Новость #117'),
-                        ('https://t.me/TopRussiaBrand/431', 'Культурное и историческое значение горы', 'Новость #118'),
-                        ('https://t.me/TopRussiaBrand/432', 'Культурное и историческое значение горы', 'Новость #119'),
-                        ('https://t.me/TopRussiaBrand/433', 'Культурное и историческое значение горы', 'Новость #120'),
-                        ('https://t.me/TopRussiaBrand/435', 'История восхождений и экспедиций', 'Новость #121'),
-                        ('https://t.me/TopRussiaBrand/436', 'Культурное и историческое значение горы', 'Новость #122'),
-                        ('https://t.me/TopRussiaBrand/437', 'Культурное и историческое значение горы', 'Новость #123'),
-                        ('https://t.me/TopRussiaBrand/438', 'Культурное и историческое значение горы', 'Новость #124'),
-                        ('https://t.me/TopRussiaBrand/439', 'Культурное и историческое значение горы', 'Новость #125'),
-                        ('https://t.me/TopRussiaBrand/440', 'История восхождений и экспедиций', 'Новость #126'),
-                        ('https://t.me/TopRussiaBrand/442', 'Культурное и историческое значение горы', 'Новость #127'),
-                        ('https://t.me/TopRussiaBrand/443', 'Культурное и историческое значение горы', 'Новость #128'),
-                        ('https://t.me/TopRussiaBrand/444', 'Культурное и историческое значение горы', 'Новость #129'),
-                        ('https://t.me/TopRussiaBrand/445', 'Культурное и историческое значение горы', 'Новость #130'),
-                        ('https://t.me/TopRussiaBrand/446', 'Культурное и историческое значение горы', 'Новость #131'),
-                        ('https://t.me/TopRussiaBrand/447', 'Культурное и историческое значение горы', 'Новость #132'),
-                        ('https://t.me/TopRussiaBrand/448', 'Культурное и историческое значение горы', 'Новость #133'),
-                        ('https://t.me/TopRussiaBrand/449', 'Культурное и историческое значение горы', 'Новость #134'),
-                        ('https://t.me/TopRussiaBrand/450', 'История восхождений и экспедиций', 'Новость #135'),
-                        ('https://t.me/TopRussiaBrand/451', 'История восхождений и экспедиций', 'Новость #136'),
-                        ('https://t.me/TopRussiaBrand/452', 'История восхождений и экспедиций', 'Новость #137'),
-                        ('https://t.me/TopRussiaBrand/453', 'История восхождений и экспедиций', 'Новость #138'),
-                        ('https://t.me/TopRussiaBrand/454', 'Культурное и историческое значение горы', 'Новость #139'),
-                        ('https://t.me/TopRussiaBrand/455', 'История восхождений и экспедиций', 'Новость #140'),
-                        ('https://t.me/TopRussiaBrand/456', 'Природа и экология Эльбруса', 'Новость #141'),
-                        ('https://t.me/TopRussiaBrand/458', 'Природа и экология Эльбруса', 'Новость #142'),
-                        ('https://t.me/TopRussiaBrand/459', 'История восхождений и экспедиций', 'Новость #143'),
-                        ('https://t.me/TopRussiaBrand/460', 'История восхождений и экспедиций', 'Новость #144'),
-                        ('https://t.me/TopRussiaBrand/461', 'Культурное и историческое значение горы', 'Новость #145'),
-                        ('https://t.me/TopRussiaBrand/462', 'Культурное и историческое значение горы', 'Новость #146'),
-                        ('https://t.me/TopRussiaBrand/463', 'Культурное и историческое значение горы', 'Новость #147'),
-                        ('https://t.me/TopRussiaBrand/467', 'Культурное и историческое значение горы', 'Новость #148'),
-                        ('https://t.me/TopRussiaBrand/468', 'История восхождений и экспедиций', 'Новость #149'),
-                        ('https://t.me/TopRussiaBrand/469', 'Культурное и историческое значение горы', 'Новость #150'),
-                        ('https://t.me/TopRussiaBrand/470', 'Современные достижения связанные с Эльбрусом', 'Новость #151'),
-                        ('https://t.me/TopRussiaBrand/471', 'Современные достижения связанные с Эльбрусом', 'Новость #152'),
-                        ('https://t.me/TopRussiaBrand/472', 'Современные достижения связанные с Эльбрусом', 'Новость #153'),
-                        ('https://t.me/TopRussiaBrand/474', 'Современные достижения связанные с Эльбрусом', 'Новость #154'),
-                        ('https://t.me/TopRussiaBrand/475', 'Современные достижения связанные с Эльбрусом', 'Новость #155'),
-                        ('https://t.me/TopRussiaBrand/476', 'Культурное и историческое значение горы', 'Новость #156'),
-                        ('https://t.me/TopRussiaBrand/477', 'Современные достижения связанные с Эльбрусом', 'Новость #157'),
-                        ('https://t.me/TopRussiaBrand/478', 'Современные достижения связанные с Эльбрусом', 'Новость #158'),
-                        ('https://t.me/TopRussiaBrand/479', 'Современные достижения связанные с Эльбрусом', 'Новость #159'),
-                        ('https://t.me/TopRussiaBrand/480', 'Современные достижения связанные с Эльбрусом', 'Новость #160'),
-                        ('https://t.me/TopRussiaBrand/481', 'Современные достижения связанные с Эльбрусом', 'Новость #161'),
-                        ('https://t.me/TopRussiaBrand/482', 'Современные достижения связанные с Эльбрусом', 'Новость #162'),
-                        ('https://t.me/TopRussiaBrand/483', 'Современные достижения связанные с Эльбрусом', 'Новость #163'),
-                        ('https://t.me/TopRussiaBrand/484', 'Современные достижения связанные с Эльбрусом', 'Новость #164'),
-                        ('https://t.me/TopRussiaBrand/485', 'Современные достижения связанные с Эльбрусом', 'Новость #165'),
-                        ('https://t.me/TopRussiaBrand/488', 'История восхождений и экспедиций', 'Новость #166'),
-                        ('https://t.me/TopRussiaBrand/489', 'Современные достижения связанные с Эльбрусом', 'Новость #167'),
-                        ('https://t.me/TopRussiaBrand/490', 'Современные достижения связанные с Эльбрусом', 'Новость #168'),
-                        ('https://t.me/TopRussiaBrand/491', 'История восхождений и экспедиций', 'Новость #169'),
-                        ('https://t.me/TopRussiaBrand/492', 'Современные достижения связанные с Эльбрусом', 'Новость #170'),
-                        ('https://t.me/TopRussiaBrand/493', 'Современные достижения связанные с Эльбрусом', 'Новость #171'),
-                        ('https://t.me/TopRussiaBrand/494', 'Современные достижения связанные с Эльбрусом', 'Новость #172'),
-                        ('https://t.me/TopRussiaBrand/495', 'Современные достижения связанные с Эльбрусом', 'Новость #173'),
-                        ('https://t.me/TopRussiaBrand/496', 'Современные достижения связанные с Эльбрусом', 'Новость #174'),
-                        ('https://t.me/TopRussiaBrand/497', 'Современные достижения связанные с Эльбрусом', 'Новость #175'),
-                        ('https://t.me/TopRussiaBrand/498', 'История восхождений и экспедиций', 'Новость #176'),
-                        ('https://t.me/TopRussiaBrand/499', 'Современные достижения связанные с Эльбрусом', 'Новость #177'),
-                        ('https://t.me/TopRussiaBrand/500', 'Современные достижения связанные с Эльбрусом', 'Новость #178'),
-                        ('https://t.me/TopRussiaBrand/501', 'Современные достижения связанные с Эльбрусом', 'Новость #179'),
-                        ('https://t.me/TopRussiaBrand/502', 'История восхождений и экспедиций', 'Новость #180'),
-                        ('https://t.me/TopRussiaBrand/503', 'Современные достижения связанные с Эльбрусом', 'Новость #181'),
-                        ('https://t.me/TopRussiaBrand/504', 'Современные достижения связанные с Эльбрусом', 'Новость #182'),
-                        ('https://t.me/TopRussiaBrand/505', 'Культурное и историческое значение горы', 'Новость #183'),
-                        ('https://t.me/TopRussiaBrand/506', 'Современные достижения связанные с Эльбрусом', 'Новость #184'),
-                        ('https://t.me/TopRussiaBrand/507', 'Современные достижения связанные с Эльбрусом', 'Новость #185'),
-                        ('https://t.me/TopRussiaBrand/508', 'Современные достижения связанные с Эльбрусом', 'Новость #186'),
-                        ('https://t.me/TopRussiaBrand/509', 'Современные достижения связанные с Эльбрусом', 'Новость #187'),
-                        ('https://t.me/TopRussiaBrand/510', 'Современные достижения связанные с Эльбрусом', 'Новость #188'),
-                        ('https://t.me/TopRussiaBrand/511', 'Современные достижения связанные с Эльбрусом', 'Новость #189'),
-                        ('https://t.me/TopRussiaBrand/512', 'Культурное и историческое значение горы', 'Новость #190'),
-                        ('https://t.me/TopRussiaBrand/513', 'Природа и экология Эльбруса', 'Новость #191'),
-                        ('https://t.me/TopRussiaBrand/514', 'Современные достижения связанные с Эльбрусом', 'Новость #192'),
-                        ('https://t.me/TopRussiaBrand/515', 'Природа и экология Эльбруса', 'Новость #193'),
-                        ('https://t.me/TopRussiaBrand/517', 'Современные достижения связанные с Эльбрусом', 'Новость #194'),
-                        ('https://t.me/TopRussiaBrand/519', 'Современные достижения связанные с Эльбрусом', 'Новость #195'),
-                        ('https://t.me/TopRussiaBrand/520', 'Современные достижения связанные с Эльбрусом', 'Новость #196'),
-                        ('https://t.me/TopRussiaBrand/521', 'Современные достижения связанные с Эльбрусом', 'Новость #197'),
-                        ('https://t.me/TopRussiaBrand/524', 'Культурное и историческое значение горы', 'Новость #198'),
-                        ('https://t.me/TopRussiaBrand/525', 'Современные достижения связанные с Эльбрусом', 'Новость #199'),
-                        ('https://t.me/TopRussiaBrand/527', 'Культурное и историческое значение горы', 'Новость #200'),
-                        ('https://t.me/TopRussiaBrand/528', 'Культурное и историческое значение горы', 'Новость #201'),
-                        ('https://t.me/TopRussiaBrand/529', 'Культурное и историческое значение горы', 'Новость #202'),
-                        ('https://t.me/TopRussiaBrand/532', 'Природа и экология Эльбруса', 'Новость #203'),
-                        ('https://t.me/TopRussiaBrand/533', 'Культурное и историческое значение горы', 'Новость #204'),
-                        ('https://t.me/TopRussiaBrand/534', 'Современные достижения связанные с Эльбрусом', 'Новость #205'),
-                        ('https://t.me/TopRussiaBrand/536', 'Современные достижения связанные с Эльбрусом', 'Новость #206'),
-                        ('https://t.me/TopRussiaBrand/538', 'Природа и экология Эльбруса', 'Новость #207'),
-                        ('https://t.me/TopRussiaBrand/542', 'Современные достижения связанные с Эльбрусом', 'Новость #208'),
-                        ('https://t.me/TopRussiaBrand/543', 'Современные достижения связанные с Эльбрусом', 'Новость #209'),
-                        ('https://t.me/TopRussiaBrand/549', 'Современные достижения связанные с Эльбрусом', 'Новость #210'),
-                        ('https://t.me/TopRussiaBrand/551', 'Культурное и историческое значение горы', 'Новость #211'),
-                        ('https://t.me/TopRussiaBrand/552', 'История восхождений и экспедиций', 'Новость #212'),
-                        ('https://t.me/TopRussiaBrand/553', 'Природа и экология Эльбруса', 'Новость #213'),
-                        ('https://t.me/TopRussiaBrand/554', 'Природа и экология Эльбруса', 'Новость #214'),
-                        ('https://t.me/TopRussiaBrand/555', 'Культурное и историческое значение горы', 'Новость #215'),
-                        ('https://t.me/TopRussiaBrand/556', 'Культурное и историческое значение горы', 'Новость #216'),
-                        ('https://t.me/TopRussiaBrand/557', 'Культурное и историческое значение горы', 'Новость #217'),
-                        ('https://t.me/TopRussiaBrand/558', 'История восхождений и экспедиций', 'Новость #218'),
-                        ('https://t.me/TopRussiaBrand/562', 'Современные достижения связанные с Эльбрусом', 'Новость #219'),
-                        ('https://t.me/TopRussiaBrand/563', 'История восхождений и экспедиций', 'Новость #220'),
-                        ('https://t.me/TopRussiaBrand/568', 'Современные достижения связанные с Эльбрусом', 'Новость #221'),
-                        ('https://t.me/TopRussiaBrand/569', 'Культурное и историческое значение горы', 'Новость #222'),
-                        ('https://t.me/TopRussiaBrand/570', 'Современные достижения связанные с Эльбрусом', 'Новость #223'),
-                        ('https://t.me/TopRussiaBrand/571?single', 'Современные достижения связанные с Эльбрусом', 'Новость #224'),
-                        ('https://t.me/TopRussiaBrand/575', 'Современные достижения связанные с Эльбрусом', 'Новость #225'),
-                        ('https://t.me/TopRussiaBrand/576', 'Современные достижения связанные с Эльбрусом', 'Новость #226'),
-                        ('https://t.me/TopRussiaBrand/577', 'Природа и экология Эльбруса', 'Новость #227'),
-                        ('https://t.me/TopRussiaBrand/578', 'Природа и экология Эльбруса', 'Новость #228'),
-                        ('https://t.me/TopRussiaBrand/579', 'Современные достижения связанные с Эльбрусом', 'Новость #229'),
-                        ('https://t.me/TopRussiaBrand/580', 'Современные достижения связанные с Эльбрусом', 'Новость #230'),
-                        ('https://t.me/TopRussiaBrand/581', 'Современные достижения связанные с Эльбрусом', 'Новость #231'),
-                        ('https://t.me/TopRussiaBrand/582', 'Современные достижения связанные с Эльбрусом', 'Новость #232'),
-                        ('https://t.me/TopRussiaBrand/583', 'Современные достижения связанные с Эльбрусом', 'Новость #233'),
-                        ('https://t.me/TopRussiaBrand/584', 'Современные достижения связанные с Эльбрусом', 'Новость #234'),
-                        ('https://t.me/TopRussiaBrand/585', 'Современные достижения связанные с Эльбрусом', 'Новость #235'),
-                        ('https://t.me/TopRussiaBrand/586', 'Природа и экология Эльбруса', 'Новость #236'),
-                        ('https://t.me/TopRussiaBrand/587', 'Современные достижения связанные с Эльбрусом', 'Новость #237'),
-                        ('https://t.me/TopRussiaBrand/588', 'Современные достижения связанные с Эльбрусом', 'Новость #238'),
-                        ('https://t.me/TopRussiaBrand/589', 'Современные достижения связанные с Эльбрусом', 'Новость #239'),
-                        ('https://t.me/TopRussiaBrand/590', 'История восхождений и экспедиций', 'Новость #240'),
-                        ('https://t.me/TopRussiaBrand/591', 'Культурное и историческое значение горы', 'Новость #241'),
-                        ('https://t.me/TopRussiaBrand/593', 'Современные достижения связанные с Эльбрусом', 'Новость #242'),
-                        ('https://t.me/TopRussiaBrand/597', 'Культурное и историческое значение горы', 'Новость #243'),
-                        ('https://t.me/TopRussiaBrand/598', 'Культурное и историческое значение горы', 'Новость #244'),
-                        ('https://t.me/TopRussiaBrand/599', 'Культурное и историческое значение горы', 'Новость #245'),
-                        ('https://t.me/TopRussiaBrand/600', 'Современные достижения связанные с Эльбрусом', 'Новость #246'),
-                        ('https://t.me/TopRussiaBrand/601', 'Современные достижения связанные с Эльбрусом', 'Новость #247'),
-                        ('https://t.me/TopRussiaBrand/602', 'Культурное и историческое значение горы', 'Новость #248'),
-                        ('https://t.me/TopRussiaBrand/603', 'Культурное и историческое значение горы', 'Новость #249'),
-                        ('https://t.me/TopRussiaBrand/604', 'Современные достижения связанные с Эльбрусом', 'Новость #250')
-                                                    ]
-
-                for telegram_url, news_type, title in news_data:
-                    # Убедитесь, что у вас есть UNIQUE constraint на telegram_url в вашей таблице news,
-                    # чтобы ON CONFLICT DO NOTHING работал корректно.
-                    await conn.execute('''
-                        INSERT INTO news (telegram_url, news_type, title)
-                        VALUES ($1, $2, $3)
-                        ON CONFLICT (telegram_url) DO NOTHING;
-                    ''', telegram_url, news_type, title)
-                
-                logger.info("Тестовые новости добавлены (если их было меньше 10).")
-            else:
-                logger.info("Тестовые новости уже существуют в достаточном количестве.")
-
-
-    def generate_qr(self, qr_id: str):
-        """Генерирует QR-код для поста"""
-        qr_content_data = f"mountain:{qr_id}"
-        encoded_qr_data = quote_plus(qr_content_data)
-        full_qr_link = f"https://t.me/{self.bot_username}?start={encoded_qr_data}"
-        
-        qr = qrcode.QRCode(version=1, box_size=10, border=4)
-        qr.add_data(full_qr_link)
-        qr.make()
-        img = qr.make_image(fill_color="black", back_color="white")
-        filename = f"qr_{qr_id}.png"
-        img.save(filename)
+    async def generate_qr(self, qr_id: str):
+        """Генерирует QR-код для поста в памяти (вне цикла событий, с кэшем). Возвращает (PNG, ссылка)."""
+        full_qr_link = qr_deep_link(self.bot_username, qr_id)
+        png = await self.qr_cache.render(full_qr_link)
         logger.info(f"QR-код для '{qr_id}' сгенерирован: {full_qr_link}")
-        return filename, full_qr_link
+        return png, full_qr_link
 
     async def log_user_interaction(self, user, interaction_type, qr_id=None, post_id=None):
-        """Логирование взаимодействий пользователя"""
+        """Логирование взаимодействий пользователя (через очередь фоновой записи)"""
         try:
-            async with self.db.pool.acquire() as conn:
-                await conn.execute('''
-                    INSERT INTO user_interactions 
-                    (user_id, username, first_name, last_name, qr_id, post_id, interaction_type)
-                    VALUES ($1, $2, $3, $4, $5, $6, $7)
-                ''', user.id, user.username, user.first_name, user.last_name, qr_id, post_id, interaction_type)
+            await self.interaction_log.log(
+                (user.id, user.username, user.first_name, user.last_name, qr_id, post_id, interaction_type)
+            )
         except Exception as e:
             logger.error(f"Ошибка логирования взаимодействия: {e}")
 
     # --- Методы для работы с БД (ОБНОВЛЕНО!) ---
     async def get_post_by_qr_id(self, qr_id: str):
-        async with self.db.pool.acquire() as conn:
-            return await conn.fetchrow("SELECT * FROM posts WHERE qr_id = $1 AND is_active = TRUE", qr_id)
+        return await self.post_cache.get(qr_id) # Кэш в памяти, в том числе для неизвестных кодов
 
     async def get_news_by_type(self, news_type: str, offset: int = 0, limit: int = NEWS_PER_PAGE):
         """
@@ -448,16 +202,7 @@ class TelegramBot:
         Возвращает список новостей и общее количество новостей для этой категории.
         """
         try:
-            async with self.db.pool.acquire() as conn:
-                news = await conn.fetch(
-                    "SELECT telegram_url, news_type, title FROM news WHERE news_type = $1 ORDER BY id DESC OFFSET $2 LIMIT $3",
-                    news_type, offset, limit
-                )
-                total_news = await conn.fetchval(
-                    "SELECT COUNT(*) FROM news WHERE news_type = $1",
-                    news_type
-                )
-                return news, total_news
+            return await self.db.run('news_page_by_type_id', news_type, limit, offset)
         except Exception as e:
             logger.error(f"Ошибка при получении новостей по типу: {e}")
             return [], 0 # Возвращаем пустой список и 0 при ошибке
@@ -468,10 +213,7 @@ class TelegramBot:
         Возвращает список новостей и общее количество всех новостей.
         """
         try:
-            async with self.db.pool.acquire() as conn:
-                news = await conn.fetch("SELECT telegram_url, news_type, title FROM news ORDER BY id DESC OFFSET $1 LIMIT $2", offset, limit)
-                total_news = await conn.fetchval("SELECT COUNT(*) FROM news")
-                return news, total_news
+            return await self.db.run('news_page_all', limit, offset)
         except Exception as e:
             logger.error(f"Ошибка при получении всех новостей: {e}")
             return [], 0
@@ -479,78 +221,25 @@ class TelegramBot:
 
     # --- Создание кнопок ---
     def create_main_menu_markup(self):
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [
-                InlineKeyboardButton(text="💬 Общий чат", url="https://t.me/topofrussia"),
-                InlineKeyboardButton(text="📢 Наш канал", url="https://t.me/TopRussiaBrand")
-            ],
-            [
-                InlineKeyboardButton(text="📸 Фотомарафон", url="https://t.me/TopRussiaBrand/618"), # Закомментировано по запросу
-                InlineKeyboardButton(text="📰 Новости", callback_data="show_news")
-            ],
-            [
-                InlineKeyboardButton(text="🌟 Официальный сайт", url="https://xn--80adjmba6ajodma8f.xn--p1ai/")
-            ]
-        ])
+        return MAIN_MENU_MARKUP # Общий объект, собран один раз (bot/templates.py)
 
     def create_post_markup(self, post_id):
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [
-                InlineKeyboardButton(text="💬 Обсудить в чате", url="https://t.me/topofrussia"),
-                InlineKeyboardButton(text="📢 Больше новостей", url="https://t.me/TopRussiaBrand")
-            ],
-            [
-                #InlineKeyboardButton(text="➡️ Следующий пост", callback_data=f"next_{post_id}"),
-                #InlineKeyboardButton(text="🔍 Найти похожее", callback_data="search_posts")
-            ],
-            [
-                InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")
-            ]
-        ])
+        return POST_MARKUP
 
     # --- Обработчики команд ---
     async def start_command(self, message: Message):
         """Обработчик команды /start с поддержкой QR-параметров"""
         args = message.text.split()
-        
         if len(args) > 1:
             qr_url = unquote(args[1])
             await self.handle_qr_url(message, qr_url)
         else:
-            msg = (
-                "🏔️ <b>Добро пожаловать в бот сообщества \"Вершина России\"!</b>\n\n"
-                "Этот бот поможет вам узнать больше о горах России через QR-коды "
-                "и получить актуальные новости о восхождениях и экспедициях.\n\n"
-                "🔍 <b>Возможности:</b>\n"
-                "• Сканирование QR-кодов для получения информации о горах\n"
-                "• Поиск новостей и статей\n"
-                "• Доступ к сообществу любителей гор\n\n"
-                "📱 <b>Команды:</b>\n"
-                "/start - Главное меню\n"
-                "/news - Последние новости\n"
-                "/help - Подробная справка"
-            )
-            
-            await message.answer(msg, reply_markup=self.create_main_menu_markup(), parse_mode=ParseMode.HTML)
+            await message.answer(START_TEXT, reply_markup=MAIN_MENU_MARKUP, parse_mode=ParseMode.HTML)
+        # Запись в подписчики - после ответа, чтобы не задерживать его
+        await self.add_subscriber(message.from_user.id)
 
     async def help_command(self, message: Message):
-        msg = (
-            "📖 <b>Справка по боту \"Вершины России\"</b>\n\n"
-            "🔍 <b>Основные функции:</b>\n"
-            "• Получение информации о горах через QR-коды\n"
-            "• Поиск новостей и статей о восхождениях\n"
-            "• Доступ к сообществу любителей гор\n\n"
-            "🎯 <b>Как работать с QR-кодами:</b>\n"
-            "1. Найдите QR-код рядом с информацией о горе\n"
-            "2. Отсканируйте его камерой телефона\n"
-            "3. Нажмите на ссылку - откроется этот бот\n"
-            "4. Получите подробную информацию\n\n"
-            "💬 <b>Сообщество:</b>\n"
-            "• Общий чат: https://t.me/topofrussia\n"
-            "• Канал новостей: https://t.me/TopRussiaBrand\n"
-            "• Официальный сайт: https://xn--80adjmba6ajodma8f.xn--p1ai/"
-        )
-        await message.answer(msg, parse_mode=ParseMode.HTML, disable_web_page_preview=True)
+        await message.answer(HELP_TEXT, parse_mode=ParseMode.HTML, disable_web_page_preview=True)
 
     async def news_command(self, message: Message, state: FSMContext):
         """Показать последние новости (категории)"""
@@ -575,25 +264,147 @@ class TelegramBot:
             return
 
         try:
-            filename, qr_link = self.generate_qr(qr_id)
-            
-            with open(filename, 'rb') as qr_file:
-                await message.answer_photo(
-                    photo=qr_file,
-                    caption=(
-                        f"📱 <b>QR-код для: {post['title']}</b>\n\n"
-                        f"🔗 Ссылка: <code>{qr_link}</code>\n\n"
-                        f"При сканировании пользователи попадут к информации о {post['title']}."
-                    ),
-                    parse_mode=ParseMode.HTML
-                )
-            
-            os.remove(filename)
+            qr_link = qr_deep_link(self.bot_username, qr_id)
+            # Картинка уже загружалась в Telegram - отправляем по file_id без рендера и загрузки
+            file_id = self.qr_cache.get_file_id(qr_link)
+            if file_id:
+                photo = file_id
+            else:
+                png, qr_link = await self.generate_qr(qr_id)
+                photo = BufferedInputFile(png, filename=f"qr_{qr_id}.png")
+
+            sent = await message.answer_photo(
+                photo=photo,
+                caption=(
+                    f"📱 <b>QR-код для: {post.title}</b>\n\n"
+                    f"🔗 Ссылка: <code>{qr_link}</code>\n\n"
+                    f"При сканировании пользователи попадут к информации о {post.title}."
+                ),
+                parse_mode=ParseMode.HTML
+            )
+            if not file_id and sent.photo:
+                self.qr_cache.remember_file_id(qr_link, sent.photo[-1].file_id)
             
         except Exception as e:
             logger.error(f"Ошибка генерации QR: {e}")
             await message.answer(f"❌ Ошибка при генерации QR-кода: {e}")
 
+    async def qr_batch_command(self, message: Message):
+        """Пакетная генерация QR-кодов по таблице (только для админов): /qr_batch [колонка_qr_id]"""
+        if not self.admin_id or str(message.from_user.id) != self.admin_id:
+            await message.answer("❌ У вас нет прав для выполнения этой команды.")
+            return
+
+        args = message.text.split()
+        qr_id_column = args[1] if len(args) > 1 else None
+        xlsx_path = os.getenv('QR_BATCH_XLSX', 'QR_spisok.xlsx')
+        await message.answer(f"⏳ Генерирую QR-коды по таблице {xlsx_path}...")
+
+        try:
+            started = asyncio.get_running_loop().time()
+            count, archive = await generate_batch_async(xlsx_path, self.bot_username, qr_id_column)
+            elapsed = asyncio.get_running_loop().time() - started
+            await message.answer_document(
+                BufferedInputFile(archive, filename="qr_codes.zip"),
+                caption=f"✅ QR-кодов: {count} за {elapsed:.1f} с\nPNG в qr/, листы A4 для печати - в sheets/"
+            )
+        except Exception as e:
+            logger.error(f"Ошибка пакетной генерации QR: {e}")
+            await message.answer(f"❌ Ошибка пакетной генерации QR-кодов: {e}")
+
+    async def add_subscriber(self, user_id: int):
+        """Добавляет пользователя в получатели рассылок (или возвращает, если он снова запустил бота)"""
+        try:
+            await self.db.run('subscriber_add', user_id)
+        except Exception as e:
+            logger.error(f"Ошибка добавления подписчика {user_id}: {e}")
+
+    # --- Рассылки (только для админов) ---
+    async def broadcast_command(self, message: Message):
+        """/broadcast <текст> - рассылка всем подписчикам"""
+        if not self.admin_id or str(message.from_user.id) != self.admin_id:
+            await message.answer("❌ У вас нет прав для выполнения этой команды.")
+            return
+
+        # html_text сохраняет форматирование, набранное в Telegram
+        parts = message.html_text.split(maxsplit=1)
+        if len(parts) < 2:
+            await message.answer("Использование: /broadcast <текст рассылки>")
+            return
+        if self.broadcast.running:
+            await message.answer(self.broadcast.progress.report(), parse_mode=None)
+            return
+
+        text = parts[1]
+        try:
+            # Предпросмотр администратору заодно проверяет разметку до отправки всем
+            await message.answer(text)
+        except Exception as e:
+            await message.answer(f"❌ Текст не отправляется: {e}")
+            return
+        broadcast_id = await self.broadcast.create(text, message.from_user.id)
+        self.broadcast.start(broadcast_id, report_chat_id=message.chat.id)
+        logger.info(f"Админ {message.from_user.id} запустил рассылку #{broadcast_id}")
+
+    async def broadcast_resume_command(self, message: Message):
+        """/broadcast_resume [id] - продолжить прерванную рассылку (по умолчанию - последнюю)"""
+        if not self.admin_id or str(message.from_user.id) != self.admin_id:
+            await message.answer("❌ У вас нет прав для выполнения этой команды.")
+            return
+        if self.broadcast.running:
+            await message.answer(self.broadcast.progress.report(), parse_mode=None)
+            return
+
+        args = message.text.split()
+        unfinished = await self.broadcast.unfinished()
+        if len(args) > 1 and args[1].isdigit():
+            broadcast_id = int(args[1])
+        elif unfinished:
+            broadcast_id = unfinished[-1]['id']
+        else:
+            await message.answer("Незавершённых рассылок нет.")
+            return
+        self.broadcast.start(broadcast_id, report_chat_id=message.chat.id)
+
+    async def broadcast_status_command(self, message: Message):
+        """/broadcast_status - ход текущей рассылки, /broadcast_stop - остановка"""
+        if not self.admin_id or str(message.from_user.id) != self.admin_id:
+            await message.answer("❌ У вас нет прав для выполнения этой команды.")
+            return
+        if message.text.startswith('/broadcast_stop') and self.broadcast.running:
+            await self.broadcast.stop()
+        if self.broadcast.progress is None:
+            await message.answer("Рассылок с момента запуска бота не было.")
+            return
+        await message.answer(self.broadcast.progress.report(), parse_mode=None)
+
+    async def stats_command(self, message: Message):
+        """/stats - статистика использования по агрегатам (services/interaction_rollup.py)"""
+        if not self.admin_id or str(message.from_user.id) != self.admin_id:
+            await message.answer("❌ У вас нет прав для выполнения этой команды.")
+            return
+        try:
+            await message.answer(await self.rollup.report(), parse_mode=ParseMode.HTML)
+        except Exception as e:
+            logger.error(f"Ошибка показа статистики: {e}")
+            await message.answer("Ошибка загрузки статистики")
+
+    async def dbstats_command(self, message: Message):
+        """/dbstats [N] - N запросов к БД с наибольшим суммарным временем, /dbstats reset - сброс"""
+        if not self.admin_id or str(message.from_user.id) != self.admin_id:
+            await message.answer("❌ У вас нет прав для выполнения этой команды.")
+            return
+        if self.query_stats is None:
+            await message.answer("Статистика запросов выключена (QUERY_STATS=0).")
+            return
+        args = message.text.split()
+        if len(args) > 1 and args[1] == 'reset':
+            self.query_stats.reset()
+            await message.answer("Статистика запросов сброшена.")
+            return
+        n = int(args[1]) if len(args) > 1 and args[1].isdigit() else 10
+        await message.answer(self.query_stats.report(min(n, 30)), parse_mode=None)
+
     # --- Обработчики QR и постов ---
     async def handle_qr_url(self, message: types.Message, qr_data: str):
         """Обработка данных из QR-кода"""
@@ -603,58 +414,55 @@ class TelegramBot:
                 post = await self.get_post_by_qr_id(qr_id)
             
                 if post:
-                    await self.log_user_interaction(message.from_user, 'qr_scan', qr_id=qr_id, post_id=post['id'])
-                    
-                    welcome_msg = (
-                        f"🏔️ <b>Добро пожаловать!</b>\n\n"
-                        f"Вы отсканировали QR-код!\n"
-                        f"📍 Информация о: <b>{post['title']}</b>\n\n"
-                        f"Присоединяйтесь к нашему сообществу! 👇"
-                    )
+                    await self.log_user_interaction(message.from_user, 'qr_scan', qr_id=qr_id, post_id=post.id)
                     
-                    await message.answer(welcome_msg, reply_markup=self.create_main_menu_markup(), parse_mode=ParseMode.HTML)
-                    await asyncio.sleep(1) # Небольшая задержка, чтобы сообщения не слипались
+                    welcome_msg = QR_WELCOME_TEXT.format(title=post.title)
+                    # Карточка уходит сразу после приветствия: порядок сохраняется, ждать не нужно
+                    await message.answer(welcome_msg, reply_markup=MAIN_MENU_MARKUP, parse_mode=ParseMode.HTML)
                     await self.show_post(message, post)
                 else:
                     await self.log_user_interaction(message.from_user, 'qr_scan_not_found', qr_id=qr_id) # Логируем, что QR не найден
                     await message.answer(
                         "🚫 Информация по этому QR-коду не найдена.",
-                        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                            [InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")]
-                        ])
+                        reply_markup=BACK_TO_MENU_MARKUP
                     )
             else:
                 await message.answer(
                     "👋 Привет! Вы перешли по ссылке в бота сообщества Вершина России!",
-                    reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                        [InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")]
-                    ])
+                    reply_markup=BACK_TO_MENU_MARKUP
                 )
             
         except Exception as e:
             logger.error(f"QR Error: {e}")
             await message.answer(
                 "⚠️ Произошла ошибка при обработке QR-кода.",
-                reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")]
-                ])
+                reply_markup=BACK_TO_MENU_MARKUP
             )
 
     async def show_post(self, message: types.Message, post):
         """Показываем пост с кнопками действий"""
+        # После первой отправки картинка уходит по file_id, Telegram не скачивает её заново
+        file_id = self.media_cache.get(post)
         try:
-            await message.answer_photo(
-                photo=post['image_url'],
-                caption=f"<b>{post['title']}</b>\n\n{post['description']}",
-                reply_markup=self.create_post_markup(post['id']),
+            sent = await message.answer_photo(
+                photo=file_id or post.image_url,
+                caption=f"<b>{post.title}</b>\n\n{post.description}",
+                reply_markup=self.create_post_markup(post.id),
                 parse_mode=ParseMode.HTML
             )
+            if file_id is None:
+                await self.media_cache.remember(post, sent)
         except Exception as e:
+            if file_id is not None:
+                logger.warning(f"file_id картинки поста {post.id} не принят, отправляю по URL: {e}")
+                await self.media_cache.forget(post.id)
+                await self.show_post(message, post)
+                return
             logger.error(f"Ошибка отправки фото: {e}")
             # Отправляем сообщение без фото, если фото не загрузилось
             await message.answer(
-                f"<b>{post['title']}</b>\n\n{post['description']}\n\n🖼️ Изображение: {post['image_url']}",
-                reply_markup=self.create_post_markup(post['id']),
+                f"<b>{post.title}</b>\n\n{post.description}\n\n🖼️ Изображение: {post.image_url}",
+                reply_markup=self.create_post_markup(post.id),
                 parse_mode=ParseMode.HTML
             )
 
@@ -662,36 +470,20 @@ class TelegramBot:
     async def show_news_categories(self, message: types.Message, state: FSMContext):
         """Показать категории новостей"""
         try:
-            async with self.db.pool.acquire() as conn:
-                categories_db = await conn.fetch(
-                    "SELECT DISTINCT news_type, COUNT(*) as count FROM news GROUP BY news_type ORDER BY count DESC"
-                )
+            # Категории, их количество и ключи берутся из каталога в памяти, без запроса к БД
+            categories = await self.news_catalog.categories()
 
-            if not categories_db:
+            if not categories:
                 await message.answer("📰 Новости не найдены.")
                 return
 
-            builder = InlineKeyboardBuilder()
-            # Сохраняем маппинг в FSMContext
-            category_slug_map = {} 
-
-            for category in categories_db:
-                category_hash = hashlib.md5(category['news_type'].encode('utf-8')).hexdigest()[:16] 
-                category_slug_map[category_hash] = category['news_type']
-
-                builder.button(
-                    text=f"📂 {category['news_type']} ({category['count']})",
-                    callback_data=f"news_category:{category_hash}" # Используем хеш и новый префикс
-                )
-            
-            builder.adjust(1) # По одной кнопке в ряд
-            await state.update_data(category_slug_map=category_slug_map) # Сохраняем map в FSMContext
-
-            builder.row(InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu"))
-            
+            # Ключи категорий берутся из общего реестра процесса, в FSMContext ничего не сохраняем.
+            # Клавиатура меняется только вместе с каталогом, поэтому ключ кэша - сам список категорий
+            categories = tuple(categories)
+            markup = self.keyboards.get(categories, lambda: build_categories_markup(categories))
             await message.answer(
-                "📰 <b>Категории новостей:</b>\n\nВыберите интересующую категорию:",
-                reply_markup=builder.as_markup(),
+                CATEGORIES_TEXT,
+                reply_markup=markup,
                 parse_mode=ParseMode.HTML
             )
 
@@ -700,62 +492,97 @@ class TelegramBot:
             await message.answer("Произошла ошибка при загрузке категорий новостей.")
 
     # Эта функция теперь будет отправлять пагинированные новости
-    async def send_paginated_news(self, message_or_callback_query: Message | CallbackQuery, news_type: str, offset: int):
+    async def render_news_page(self, news_type: str, offset: int, cursor=None, direction: str = NAV_FORWARD):
+        """
+        Текст и клавиатура страницы новостей или None, если страница пуста.
+        Готовая страница берётся из self.news_pages без запросов к БД и сборки строк.
+        """
+        # Кнопки без курсора (NewsNav без direction) обслуживаем через OFFSET
+        use_cursor = NEWS_PAGINATION_MODE == 'cursor' and (cursor is not None or offset == 0)
+        backward = use_cursor and direction == NAV_BACKWARD and cursor is not None
+        key = (news_type, use_cursor, offset, cursor, backward)
+
+        started = time.perf_counter()
+        page = self.news_pages.get(key)
+        if page is not None:
+            self.news_pages.observe(True, time.perf_counter() - started)
+            return page
+        version = self.news_pages.version(news_type)
+
+        if use_cursor:
+            news_items, has_more = await self.db.get_news_page_after(news_type, cursor, NEWS_PER_PAGE, backward)
+            total_news = self.news_catalog.count(news_type)
+            if total_news is None:
+                total_news = await self.db.get_news_count(news_type)
+            if backward:
+                has_prev, has_next = has_more, True
+                if not has_more:
+                    offset = 0 # Дошли до начала - нумерация с единицы
+            else:
+                has_prev, has_next = offset > 0, has_more
+        else:
+            news_items, total_news = await self.db.get_news_by_type(news_type, offset, NEWS_PER_PAGE)
+            has_prev, has_next = offset > 0, offset + NEWS_PER_PAGE < total_news
+
+        if not news_items:
+            return None
+
+        lines = [f"--- \n<b>{news_type}:</b>\n---"]
+        for i, item in enumerate(news_items, offset + 1):
+            lines.append(f"{i}. <a href='{item.telegram_url}'>{item.title or f'Новость #{item.id}'}</a>")
+        remaining_news = total_news - (offset + len(news_items))
+        if remaining_news > 0:
+            lines.append(f"\n... и ещё {remaining_news} новостей")
+        text = "\n".join(lines) + ("" if remaining_news > 0 else "\n")
+
+        # Ключ категории в callback_data вместо названия - чтобы уложиться в 64 байта
+        news_type_hash = self.news_catalog.key_for(news_type)
+        if use_cursor:
+            first, last = news_items[0], news_items[-1]
+            prev_data = NewsNav(key=news_type_hash, offset=max(offset - NEWS_PER_PAGE, 0), direction=NAV_BACKWARD,
+                                cursor=encode_cursor(first.created_at, first.id)).pack()
+            next_data = NewsNav(key=news_type_hash, offset=offset + len(news_items), direction=NAV_FORWARD,
+                                cursor=encode_cursor(last.created_at, last.id)).pack()
+        else:
+            prev_data = NewsNav(key=news_type_hash, offset=offset - NEWS_PER_PAGE).pack()
+            next_data = NewsNav(key=news_type_hash, offset=offset + NEWS_PER_PAGE).pack()
+
+        nav = []
+        if has_prev:
+            nav.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=prev_data))
+        if has_next:
+            nav.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data=next_data))
+        markup = InlineKeyboardMarkup(inline_keyboard=[nav, *NEWS_PAGE_FOOTER] if nav else NEWS_PAGE_FOOTER)
+
+        self.news_pages.put(key, version, text, markup)
+        self.news_pages.observe(False, time.perf_counter() - started)
+        return text, markup
+
+    async def send_paginated_news(self, message_or_callback_query: Message | CallbackQuery, news_type: str, offset: int,
+                                  cursor=None, direction: str = NAV_FORWARD):
         """
         Отправляет страницу новостей с кнопками навигации.
         Используется как для первого показа, так и для навигации.
+        offset - порядковый номер первой новости на странице (для нумерации),
+        cursor - (created_at, id) граничной новости соседней страницы для keyset-пагинации.
         """
-
         is_callback = isinstance(message_or_callback_query, CallbackQuery)
         message = message_or_callback_query.message if is_callback else message_or_callback_query
 
-    # Генерируем хэш для news_type, чтобы использовать его в callback_data
-    # Это гарантирует, что callback_data останется короткой
-        news_type_hash = hashlib.md5(news_type.encode('utf-8')).hexdigest()[:16]
-
-        news_items, total_news = await self.db.get_news_by_type(news_type, offset, NEWS_PER_PAGE)
-
-        if not news_items:
+        page = await self.render_news_page(news_type, offset, cursor, direction)
+        if page is None:
             if is_callback:
                 await message_or_callback_query.answer("Новостей на этой странице больше нет.")
             else:
                 await message.edit_text("Новостей в этой категории пока нет.", reply_markup=self.create_main_menu_markup(), parse_mode=ParseMode.HTML)
             return
-
-        message_text = f"--- \n<b>{news_type}:</b>\n---\n"
-        for i, item in enumerate(news_items):
-            title = item.get('title', f"Новость #{item['id']}")
-            message_text += f"{offset + i + 1}. <a href='{item['telegram_url']}'>{title}</a>\n"
-
-        remaining_news = total_news - (offset + len(news_items))
-        if remaining_news > 0:
-            message_text += f"\n... и ещё {remaining_news} новостей"
-
-        builder = InlineKeyboardBuilder()
-
-    # Кнопка "Назад"
-        if offset > 0:
-        # Используем хэш в callback_data
-            builder.button(text="⬅️ Назад", callback_data=f"news_nav:{news_type_hash}:{offset - NEWS_PER_PAGE}")
-
-    # Кнопка "Вперёд"
-        if offset + NEWS_PER_PAGE < total_news:
-        # Используем хэш в callback_data
-            builder.button(text="Вперёд ➡️", callback_data=f"news_nav:{news_type_hash}:{offset + NEWS_PER_PAGE}")
-
-        if offset > 0 and offset + NEWS_PER_PAGE < total_news:
-            builder.adjust(2)
-        else:
-            builder.adjust(1)
-
-        builder.row(InlineKeyboardButton(text="◀️ В меню категорий", callback_data="show_categories_menu"))
-        builder.row(InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu"))
+        message_text, markup = page
 
         try:
             if is_callback:
                 await message.edit_text(
                     message_text,
-                    reply_markup=builder.as_markup(),
+                    reply_markup=markup,
                     parse_mode=ParseMode.HTML,
                     disable_web_page_preview=True
                 )
@@ -763,7 +590,7 @@ class TelegramBot:
             else:
                 await message.answer(
                     message_text,
-                    reply_markup=builder.as_markup(),
+                    reply_markup=markup,
                     parse_mode=ParseMode.HTML,
                     disable_web_page_preview=True
                 )
@@ -792,100 +619,95 @@ class TelegramBot:
             await message.answer("Произошла ошибка при поиске.")
             await state.clear()
 
-    async def search_news(self, message: types.Message, keyword: str):
-        """Поиск новостей"""
-        async with self.db.pool.acquire() as conn:
-            results = await conn.fetch("""
-                SELECT telegram_url, news_type, title FROM news 
-                WHERE LOWER(title) LIKE $1 OR LOWER(news_type) LIKE $1
-                ORDER BY id DESC LIMIT 15
-            """, f"%{keyword}%")
+    async def search_news(self, message: types.Message, keyword: str, cursor: str = None, offset: int = 0,
+                          edit: bool = False):
+        """Поиск новостей (полнотекстовый с ранжированием, постранично)"""
+        engine = self.search_index or self.search_engine
+        results, next_cursor = await engine.search_news(keyword, cursor, SEARCH_PAGE_SIZE)
+        safe_keyword = html.escape(keyword)
         
         if not results:
             await message.answer(
-                f"🔍 По запросу '<b>{message.text}</b>' новости не найдены.",
-                reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="📰 Все категории", callback_data="show_news")],
-                    [InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")]
-                ]),
+                f"🔍 По запросу '<b>{safe_keyword}</b>' новости не найдены.",
+                reply_markup=NEWS_NOT_FOUND_MARKUP,
                 parse_mode=ParseMode.HTML
             )
             return
         
-        msg_parts = ["---", f"<b>Результаты поиска по запросу '{message.text}':</b>", "---", ""]
-        
-        display_limit = 5
-        total_displayed = 0
+        msg_parts = ["---", f"<b>Результаты поиска по запросу '{safe_keyword}':</b>", "---", ""]
 
         for i, result in enumerate(results):
-            title = result.get('title', f"Новость #{result['id']}")
-            msg_parts.append(f"{i + 1}. <a href='{result['telegram_url']}'>{title}</a>")
-            total_displayed += 1
-            if total_displayed >= display_limit and len(results) > display_limit:
-                break
-
-        if len(results) > display_limit:
-            msg_parts.append(f"\n... и ещё {len(results) - display_limit} результатов")
-        
-        markup = InlineKeyboardMarkup(inline_keyboard=[
-            [
-                InlineKeyboardButton(text="🔍 Новый поиск", callback_data="search_news"),
-                InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")
-            ]
-        ])
-        
-        await message.answer(
+            title = result['title'] or f"Новость #{result['id']}"
+            msg_parts.append(f"{offset + i + 1}. <a href='{result['telegram_url']}'>{title}</a>")
+
+        buttons = []
+        if next_cursor:
+            query_key = self.search_engine.remember_query(keyword)
+            buttons.append([InlineKeyboardButton(
+                text="Ещё ➡️",
+                callback_data=SearchMore(kind='n', query=query_key, offset=offset + len(results), cursor=next_cursor).pack()
+            )])
+        buttons.append(SEARCH_NEWS_FOOTER)
+        markup = InlineKeyboardMarkup(inline_keyboard=buttons)
+
+        send = message.edit_text if edit else message.answer
+        await send(
             "\n".join(msg_parts)[:4000],
             reply_markup=markup,
             parse_mode=ParseMode.HTML,
             disable_web_page_preview=True
         )
 
-    async def search_posts(self, message: types.Message, keyword: str):
-        """Поиск постов"""
-        async with self.db.pool.acquire() as conn:
-            results = await conn.fetch("""
-                SELECT * FROM posts 
-                WHERE (LOWER(title) LIKE $1 OR LOWER(description) LIKE $1) AND is_active = TRUE
-                ORDER BY id LIMIT 10
-            """, f"%{keyword}%")
+    async def search_posts(self, message: types.Message, keyword: str, cursor: str = None, offset: int = 0,
+                           edit: bool = False):
+        """Поиск постов (полнотекстовый с ранжированием, постранично)"""
+        engine = self.search_index or self.search_engine
+        results, next_cursor = await engine.search_posts(keyword, cursor, SEARCH_POSTS_PAGE_SIZE)
         
         if not results:
             await message.answer(
-                f"🔍 По запросу '<b>{message.text}</b>' информация не найдена.",
-                reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="🔍 Новый поиск", callback_data="search_posts")],
-                    [InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")]
-                ]),
+                f"🔍 По запросу '<b>{html.escape(keyword)}</b>' информация не найдена.",
+                reply_markup=POSTS_NOT_FOUND_MARKUP,
                 parse_mode=ParseMode.HTML
             )
             return
         
-        await self.log_user_interaction(message.from_user, 'search', qr_id=keyword) 
+        if cursor is None:
+            await self.log_user_interaction(message.from_user, 'search', qr_id=keyword) 
         
-        if len(results) == 1:
+        if len(results) == 1 and cursor is None:
             await self.show_post(message, results[0])
             return
         
-        msg_parts = [f"🔍 <b>Найдено {len(results)} результатов:</b>\n"]
+        msg_parts = [f"🔍 <b>Результаты {offset + 1}–{offset + len(results)}:</b>\n"]
         buttons = []
         
-        for i, post in enumerate(results, 1):
-            msg_parts.append(f"{i}. <b>{post['title']}</b>\n   {post['description'][:100]}{'...' if len(post['description']) > 100 else ''}\n")
+        for i, post in enumerate(results, offset + 1):
+            msg_parts.append(f"{i}. <b>{post['title']}</b>\n   {post['description'][:100]}{'...' if len(post['description']) > 100 else ''}\n")
+            callback_data = show_post_data(post['qr_id'])
+            if callback_data is None:
+                logger.warning(f"Кнопка поста {post['qr_id']!r} не помещается в callback_data, пропущена")
+                continue
             buttons.append([
                 InlineKeyboardButton(
                     text=f"📍 {post['title']}",
-                    callback_data=f"show_post_{post['qr_id']}"
+                    callback_data=callback_data
                 )
             ])
+
+        if next_cursor:
+            query_key = self.search_engine.remember_query(keyword)
+            buttons.append([InlineKeyboardButton(
+                text="Ещё ➡️",
+                callback_data=SearchMore(kind='p', query=query_key, offset=offset + len(results), cursor=next_cursor).pack()
+            )])
         
-        buttons.extend([
-            [InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")]
-        ])
+        buttons.append(MAIN_MENU_ROW)
         
         markup = InlineKeyboardMarkup(inline_keyboard=buttons)
-        
-        await message.answer(
+
+        send = message.edit_text if edit else message.answer
+        await send(
             "\n".join(msg_parts)[:4000],
             reply_markup=markup,
             parse_mode=ParseMode.HTML
@@ -910,7 +732,7 @@ class TelegramBot:
     async def text_message_handler(self, message: Message, state: FSMContext):
         """Обработка текстовых сообщений"""
         current_state = await state.get_state()
-        logger.info(f"Получено текстовое сообщение: '{message.text}'. Текущее состояние: {current_state}")
+        logger.debug(f"Текстовое сообщение, {len(message.text or '')} символов, состояние: {current_state}")
         
         if current_state == SearchStates.waiting_for_news_keyword:
             await self.process_search_keyword(message, state, "news")
@@ -924,124 +746,95 @@ class TelegramBot:
         else:
             await message.answer(
                 "🤖 Добро пожаловать на канал Вершина России! Используйте кнопки меню для навигации.",
-                reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")]
-                ])
+                reply_markup=BACK_TO_MENU_MARKUP
             )
 
-    async def callback_handler(self, callback: types.CallbackQuery, state: FSMContext):
-        """Обработчик инлайн кнопок"""
-        try:
-            # Добавляем логирование для отладки
-            logger.info(f"Получен callback: {callback.data}")
-            
-            if callback.data == "main_menu":
-                await state.clear() # Очищаем состояние при возврате в главное меню
-                await callback.message.edit_text( # Используем edit_text для обновления
-                    "🏔️ Главное меню\nВыберите действие:",
-                    reply_markup=self.create_main_menu_markup()
-                )
-                await callback.answer() # Отвечаем на коллбэк после редактирования
-            
-            elif callback.data == "show_news":
-                # Это кнопка "Новости" из главного меню, ведет к категориям
-                await self.show_news_categories(callback.message, state) 
-                await callback.answer() 
-
-            elif callback.data == "show_categories_menu":
-                # Это кнопка "Назад в меню категорий" из просмотра новостей
-                await self.show_news_categories(callback.message, state)
-                await callback.answer()
-            
-            elif callback.data.startswith("news_category:"): # ОБНОВЛЕНО: новый префикс и двоеточие
-                category_hash = callback.data.split(":")[1] # Парсим хеш
-                logger.info(f"Парсим категорию, хеш: {category_hash}")
-                current_data = await state.get_data()
-                category_slug_map = current_data.get('category_slug_map', {})
-                full_category_name = category_slug_map.get(category_hash)
-                logger.info(f"Найдена категория: {full_category_name}")
-                
-                if full_category_name:
-                    logger.info(f"Получена категория через хеш: {full_category_name}")
-                    # При первом показе категории начинаем с offset=0
-                    await self.send_paginated_news(callback, full_category_name, 0)
-                else:
-                    await callback.message.edit_text("К сожалению, категория не найдена. Возможно, данные устарели.")
-                    await callback.answer("Категория не найдена.")
-            
-            elif callback.data.startswith("news_nav:"): # НОВЫЙ ОБРАБОТЧИК ДЛЯ НАВИГАЦИИ
-                logger.info(f"Обрабатываем навигацию: {callback.data}")
-                parts = callback.data.split(':')
-                news_type_hash = parts[1]  # Исправлено: переименована переменная
-                offset = int(parts[2])
-                
-                current_data = await state.get_data()
-                category_slug_map = current_data.get('category_slug_map', {})
-               
-                # Разрешаем хэш обратно в полное название категории
-                full_news_type = category_slug_map.get(news_type_hash)  # Исправлено: используется правильная переменная
-                logger.info(f"Навигация: хеш={news_type_hash}, полное название={full_news_type}")
-
-                if full_news_type:
-                    # Передаем ПОЛНОЕ название категории в send_paginated_news
-                    await self.send_paginated_news(callback, full_news_type, offset)
-                else:
-                    # Обрабатываем случай, когда карта категорий потеряна (например, бот перезапущен)
-                    await callback.message.edit_text(
-                        "К сожалению, категория новостей не найдена. "
-                        "Пожалуйста, вернитесь в главное меню и попробуйте снова.",
-                        reply_markup=self.create_main_menu_markup() # Предоставляем путь назад
-                    )
-                    await callback.answer("Категория не найдена.")
-            
-            elif callback.data == "search_news":
-                await callback.message.edit_text( # Используем edit_text
-                    "🔍 <b>Поиск новостей</b>\n\nВведите ключевое слово:",
-                    parse_mode=ParseMode.HTML
-                )
-                await state.set_state(SearchStates.waiting_for_news_keyword)
-                await callback.answer()
+    # --- Обработчики инлайн-кнопок: по одному на действие, маршрутизация в CallbackRouter ---
+    def create_callback_router(self) -> CallbackRouter:
+        router = CallbackRouter()
+        router.register(MainMenu, self.on_main_menu)
+        router.register(NewsCategories, self.on_news_categories)
+        router.register(Category, self.on_category)
+        router.register(NewsNav, self.on_news_nav)
+        router.register(SearchPrompt, self.on_search_prompt)
+        router.register(SearchMore, self.on_search_more)
+        router.register(ShowPost, self.on_show_post)
+        return router
+
+    async def on_main_menu(self, callback: CallbackQuery, data: MainMenu, state: FSMContext):
+        await state.clear() # Очищаем состояние при возврате в главное меню
+        await callback.message.edit_text(
+            MAIN_MENU_TEXT,
+            reply_markup=MAIN_MENU_MARKUP
+        )
+        await callback.answer()
 
-            elif callback.data.startswith("next_"):
-                # Эта логика теперь не нужна, так как пагинация для новостей реализована через news_nav
-                await callback.message.answer("Функция 'Следующий пост' в разработке.") # Заглушка
-                await callback.answer()
-            
-            elif callback.data.startswith("show_post_"):
-                qr_id = callback.data.replace("show_post_", "")
-                post = await self.get_post_by_qr_id(qr_id)
-                if post:
-                    # Важно: если это редактирование существующего сообщения,
-                    # то post['image_url'] должен быть Telegram file_id, а не URL.
-                    # Если URL, то нужно отправить новое фото.
-                    try:
-                        await callback.message.edit_media(
-                            media=types.InputMediaPhoto(media=post['image_url'], caption=f"<b>{post['title']}</b>\n\n{post['description']}", parse_mode=ParseMode.HTML),
-                            reply_markup=self.create_post_markup(post['id'])
-                        )
-                    except Exception as media_e:
-                        logger.warning(f"Не удалось отредактировать медиа, отправляю новое сообщение: {media_e}")
-                        await callback.message.delete() # Удаляем старое сообщение, чтобы не было дублей
-                        await self.show_post(callback.message, post)
-                    
-                    await callback.answer()
-                else:
-                    await callback.message.answer("Информация по этому посту не найдена.")
-                    await callback.answer("Пост не найден.")
-            
-            # Обработка других коллбэков, если они есть
-            else:
-                logger.warning(f"Неизвестный callback: {callback.data}")
-                await callback.answer("Неизвестное действие.")
+    async def on_news_categories(self, callback: CallbackQuery, data: NewsCategories, state: FSMContext):
+        await self.show_news_categories(callback.message, state)
+        await callback.answer()
 
-        except asyncio.exceptions.CancelledError:
-            logger.warning("Задача callback_handler отменена.")
-        except Exception as e:
-            logger.error(f"Ошибка в callback_handler: {e}")
-            await callback.message.answer("Произошла ошибка при обработке запроса.")
-            await state.clear()
-            await callback.answer("Произошла ошибка.")
+    async def on_category(self, callback: CallbackQuery, data: Category, state: FSMContext):
+        full_category_name = await self.news_catalog.resolve(data.key)
+        if full_category_name:
+            # При первом показе категории начинаем с offset=0
+            await self.send_paginated_news(callback, full_category_name, 0)
+        else:
+            await callback.message.edit_text("К сожалению, категория не найдена. Возможно, данные устарели.")
+            await callback.answer("Категория не найдена.")
+
+    async def on_news_nav(self, callback: CallbackQuery, data: NewsNav, state: FSMContext):
+        full_news_type = await self.news_catalog.resolve(data.key)
+        if full_news_type:
+            cursor = decode_cursor(data.cursor) if data.cursor else None
+            await self.send_paginated_news(callback, full_news_type, data.offset, cursor, data.direction or NAV_FORWARD)
+        else:
+            # Категория исчезла из каталога - даём путь назад
+            await callback.message.edit_text(
+                "К сожалению, категория новостей не найдена. "
+                "Пожалуйста, вернитесь в главное меню и попробуйте снова.",
+                reply_markup=self.create_main_menu_markup()
+            )
+            await callback.answer("Категория не найдена.")
+
+    async def on_search_prompt(self, callback: CallbackQuery, data: SearchPrompt, state: FSMContext):
+        if data.kind == 'p':
+            text, next_state = "🔍 <b>Поиск</b>\n\nВведите ключевое слово:", SearchStates.waiting_for_post_keyword
+        else:
+            text, next_state = "🔍 <b>Поиск новостей</b>\n\nВведите ключевое слово:", SearchStates.waiting_for_news_keyword
+        await callback.message.edit_text(text, parse_mode=ParseMode.HTML)
+        await state.set_state(next_state)
+        await callback.answer()
+
+    async def on_search_more(self, callback: CallbackQuery, data: SearchMore, state: FSMContext):
+        keyword = self.search_engine.recall_query(data.query)
+        if keyword is None:
+            await callback.answer("Результаты поиска устарели, повторите поиск.", show_alert=True)
+            return
+        if data.kind == 'n':
+            await self.search_news(callback.message, keyword, data.cursor, data.offset, edit=True)
+        else:
+            await self.search_posts(callback.message, keyword, data.cursor, data.offset, edit=True)
+        await callback.answer()
 
+    async def on_show_post(self, callback: CallbackQuery, data: ShowPost, state: FSMContext):
+        post = await self.get_post_by_qr_id(data.qr_id)
+        if not post:
+            await callback.answer("Пост не найден.", show_alert=True)
+            return
+        # По file_id из кэша edit_media не требует повторной загрузки картинки
+        file_id = self.media_cache.get(post)
+        try:
+            edited = await callback.message.edit_media(
+                media=types.InputMediaPhoto(media=file_id or post.image_url, caption=f"<b>{post.title}</b>\n\n{post.description}", parse_mode=ParseMode.HTML),
+                reply_markup=self.create_post_markup(post.id)
+            )
+            if file_id is None:
+                await self.media_cache.remember(post, edited)
+        except Exception as media_e:
+            logger.warning(f"Не удалось отредактировать медиа, отправляю новое сообщение: {media_e}")
+            await callback.message.delete() # Удаляем старое сообщение, чтобы не было дублей
+            await self.show_post(callback.message, post)
+        await callback.answer()
 
     async def on_startup(self):
         """Выполняется при запуске бота"""
@@ -1052,40 +845,125 @@ class TelegramBot:
         except Exception as e:
             logger.critical(f"Критическая ошибка при запуске: Не удалось подключиться к базе данных. {e}")
             exit(1)
+        if self.metrics:
+            self.metrics_server = MetricsServer(self.metrics, host=os.getenv('METRICS_HOST', '127.0.0.1'),
+                                                port=int(METRICS_PORT))
+            try:
+                await self.metrics_server.start()
+            except OSError as e:
+                logger.error(f"Не удалось открыть порт метрик {METRICS_PORT}: {e}") # Бот работает и без них
+                self.metrics_server = None
 
     async def on_shutdown(self):
         """Выполняется при остановке бота"""
         logger.info("Бот останавливается...")
+        if self.metrics_server:
+            await self.metrics_server.stop()
+        if self.broadcast:
+            await self.broadcast.stop() # Рассылку можно будет продолжить через /broadcast_resume
+        if self.interaction_log:
+            await self.interaction_log.stop() # Дописываем накопленные события до закрытия пула
+            logger.info(f"Журнал взаимодействий остановлен: {self.interaction_log.stats}")
+        if self.rollup:
+            await self.rollup.stop()
+            logger.info(f"Агрегаты взаимодействий: {self.rollup.stats}")
+        if self.news_catalog:
+            await self.news_catalog.stop()
+        if self.news_pages:
+            logger.info(f"Кэш страниц новостей: {self.news_pages.stats}")
+        if self.post_cache:
+            logger.info(f"Кэш постов по QR: {self.post_cache.stats}")
+        if self.db_events:
+            await self.db_events.stop()
+        if self.search_index:
+            await self.search_index.stop() # Уведомления уже не приходят, отложенное перечитывание не нужно
+        if self.fsm_storage:
+            await self.fsm_storage.close()
+            logger.info(f"FSM-хранилище: {self.fsm_storage.stats}")
+        if self.query_stats:
+            logger.info(f"Запросы к БД: {self.query_stats.stats}")
         if self.db:
             await self.db.disconnect() # Предполагаем, что у вашего класса Database есть метод disconnect()
             logger.info("Соединение с базой данных закрыто.")
         logger.info("Бот остановлен.")
 
-    async def run(self):
-        token = os.getenv("TELEGRAM_BOT_TOKEN")
-        if not token:
-            logger.error("TELEGRAM_BOT_TOKEN не установлен в переменных окружения.")
-            return
+    async def run_webhook(self):
+        """Приём апдейтов через вебхук (BOT_MODE=webhook); можно запускать несколько процессов за балансировщиком"""
+        server = WebhookServer(
+            self.dp, self.bot,
+            path=os.getenv('WEBHOOK_PATH', '/webhook'),
+            secret_token=os.getenv('WEBHOOK_SECRET'),
+            max_concurrency=int(os.getenv('WEBHOOK_CONCURRENCY', 100)),
+            max_pending=int(os.getenv('WEBHOOK_MAX_PENDING', 1000)),
+            drain_timeout=float(os.getenv('WEBHOOK_DRAIN_TIMEOUT', 30)),
+            record_path=os.getenv('WEBHOOK_RECORD'),
+        )
+        await server.serve(
+            host=os.getenv('WEBHOOK_HOST', '0.0.0.0'),
+            port=int(os.getenv('WEBHOOK_PORT', 8080)),
+            webhook_url=os.getenv('WEBHOOK_URL'), # Без URL вебхук не регистрируется (он уже задан или это прогон)
+        )
 
-        self.bot = Bot(token=token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-        self.dp = Dispatcher()
+    def build(self, token: str, api_url: str = None):
+        """
+        Создаёт Bot и Dispatcher и регистрирует обработчики, ничего не запуская.
+        api_url - свой сервер Bot API (локальный telegram-bot-api или заглушка нагрузочного прогона).
+        """
+        session = PrebuiltMarkupSession(api=TelegramAPIServer.from_base(api_url)) if api_url else PrebuiltMarkupSession()
+        if self.metrics:
+            session.middleware(BotAPIMetricsMiddleware(self.metrics))
+        self.bot = Bot(token=token, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+        if FSM_STORAGE == 'postgres':
+            # Состояния в БД: переживают перезапуск и общие для нескольких процессов (режим вебхука)
+            self.fsm_storage = PostgresStorage(ttl=float(os.getenv('FSM_STATE_TTL', 7 * 24 * 3600)))
+            self.dp = Dispatcher(storage=self.fsm_storage)
+        else:
+            self.dp = Dispatcher()
+        self.dp.update.outer_middleware(UpdateLogMiddleware(slow_ms=float(os.getenv('LOG_SLOW_UPDATE_MS', 1000))))
+        self.dp.message.middleware(HandlerNameMiddleware())
+        if self.metrics:
+            # Раньше FSMFlush, чтобы время апдейта включало запись FSM
+            self.dp.update.outer_middleware(UpdateMetricsMiddleware(self.metrics))
+            self.dp.message.middleware(HandlerMetricsMiddleware(self.metrics))
+        if self.fsm_storage:
+            self.dp.update.outer_middleware(FSMFlushMiddleware(self.fsm_storage))
 
         # Регистрация обработчиков команд
         self.dp.message.register(self.start_command, Command("start"))
         self.dp.message.register(self.help_command, Command("help"))
         self.dp.message.register(self.news_command, Command("news"))
         self.dp.message.register(self.generate_qr_command, Command("qr"))
+        self.dp.message.register(self.qr_batch_command, Command("qr_batch"))
+        self.dp.message.register(self.broadcast_command, Command("broadcast"))
+        self.dp.message.register(self.broadcast_resume_command, Command("broadcast_resume"))
+        self.dp.message.register(self.broadcast_status_command, Command("broadcast_status", "broadcast_stop"))
+        self.dp.message.register(self.stats_command, Command("stats"))
+        self.dp.message.register(self.dbstats_command, Command("dbstats"))
 
         # Регистрация обработчика текстовых сообщений (после команд)
         self.dp.message.register(self.text_message_handler)
 
-        self.dp.callback_query.register(self.callback_handler)
+        # Все инлайн-кнопки - один обработчик с таблицей префиксов (см. bot/callbacks.py)
+        self.callbacks = self.create_callback_router()
+        self.callbacks.metrics = self.metrics
+        self.dp.callback_query.register(self.callbacks.dispatch)
         self.dp.startup.register(self.on_startup)
         self.dp.shutdown.register(self.on_shutdown)
         # регистрация
         self.dp.message.register(self.on_join, F.new_chat_members)
+
+    async def run(self):
+        token = os.getenv("TELEGRAM_BOT_TOKEN")
+        if not token:
+            logger.error("TELEGRAM_BOT_TOKEN не установлен в переменных окружения.")
+            return
+
+        self.build(token, api_url=os.getenv('TELEGRAM_API_URL'))
         try:
-            await self.dp.start_polling(self.bot)
+            if BOT_MODE == 'webhook':
+                await self.run_webhook()
+            else:
+                await self.dp.start_polling(self.bot)
         except asyncio.exceptions.CancelledError:
             logger.info("Запуск бота отменен.")
         except KeyboardInterrupt:
@@ -0,0 +1,312 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+from services.interaction_logger import BLOCK, BatchedEventWriter
+
+logger = logging.getLogger(__name__)
+
+STATUS_SENT = 'sent'
+STATUS_BLOCKED = 'blocked' # Пользователь заблокировал бота или удалил аккаунт
+STATUS_FAILED = 'failed'
+
+# Получатели, которым эта рассылка ещё не доставлялась: при возобновлении уже обработанные пропускаются
+_PENDING = '''
+    s.is_active = TRUE
+    AND NOT EXISTS (
+        SELECT 1 FROM broadcast_deliveries d WHERE d.broadcast_id = $1 AND d.user_id = s.user_id
+    )
+'''
+RECIPIENTS_COUNT_SQL = f"SELECT COUNT(*) FROM subscribers s WHERE {_PENDING}"
+
+# Следующая порция после последнего выданного user_id: каждая - отдельный короткий запрос по первичному ключу,
+# без транзакции и курсора на всю рассылку. Результаты, ещё не записанные пачкой, не мешают: ключ только растёт
+RECIPIENTS_SQL = f'''
+    SELECT s.user_id FROM subscribers s
+    WHERE s.user_id > $2 AND {_PENDING}
+    ORDER BY s.user_id
+    LIMIT $3
+'''
+
+
+class TokenBucket:
+    """Общий лимит отправки: rate сообщений в секунду, не больше capacity подряд"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """RetryAfter действует на весь бот - останавливаем всех отправителей"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+        self._updated = self._paused_until
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + max(0.0, now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class ChatRateLimiter:
+    """Не чаще одного сообщения в interval секунд в один чат"""
+
+    def __init__(self, interval: float = 1.0, max_chats: int = 100_000):
+        self.interval = interval
+        self.max_chats = max_chats
+        self._next = OrderedDict() # chat_id -> момент, с которого можно писать снова
+
+    async def wait(self, chat_id: int):
+        now = time.monotonic()
+        slot = max(now, self._next.get(chat_id, 0.0))
+        self._next[chat_id] = slot + self.interval
+        self._next.move_to_end(chat_id)
+        while len(self._next) > self.max_chats:
+            self._next.popitem(last=False)
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class BroadcastProgress:
+    """Счётчики текущей рассылки для отчёта администратору"""
+
+    def __init__(self, broadcast_id: int, total: int, done_before: dict):
+        self.broadcast_id = broadcast_id
+        self.total = total
+        self.sent = done_before.get(STATUS_SENT, 0)
+        self.blocked = done_before.get(STATUS_BLOCKED, 0)
+        self.failed = done_before.get(STATUS_FAILED, 0)
+        self.retries = 0
+        self.status = 'running'
+        self._processed_before = self.processed
+        self._started = time.monotonic()
+
+    @property
+    def processed(self) -> int:
+        return self.sent + self.blocked + self.failed
+
+    @property
+    def rate(self) -> float:
+        """Сообщений в секунду с момента запуска (возобновления)"""
+        elapsed = time.monotonic() - self._started
+        return (self.processed - self._processed_before) / elapsed if elapsed > 0 else 0.0
+
+    def report(self) -> str:
+        percent = self.processed * 100 / self.total if self.total else 100
+        lines = [
+            f"📣 Рассылка #{self.broadcast_id}: {self.status}",
+            f"Обработано: {self.processed} из {self.total} ({percent:.1f}%)",
+            f"✅ Доставлено: {self.sent}  🚫 Заблокировали: {self.blocked}  ⚠️ Ошибок: {self.failed}",
+            f"Скорость: {self.rate:.1f} сообщ./с, повторов после RetryAfter: {self.retries}",
+        ]
+        remaining = self.total - self.processed
+        if self.status == 'running' and remaining > 0 and self.rate > 0:
+            lines.append(f"Осталось примерно {remaining / self.rate / 60:.0f} мин")
+        return "\n".join(lines)
+
+
+class BroadcastEngine:
+    """
+    Рассылка подписчикам с учётом лимитов Telegram: общий token bucket (~30 сообщ./с),
+    лимит на чат, ограниченное число параллельных отправителей. Получатели читаются
+    порциями по fetch_size (keyset по user_id), результат по каждому пишется в broadcast_deliveries, поэтому
+    прерванную рассылку можно продолжить с того же места.
+
+    Доставка - не менее одного раза: результат записывается после ответа send_message. При остановке
+    повторно (после возобновления) получат сообщение только чаты, отправка в которые шла в этот момент -
+    не больше workers; при падении процесса - ещё и те, чьи результаты не успели записаться пачкой.
+    """
+
+    def __init__(self, bot, db, rate: float = 28.0, per_chat_interval: float = 1.0, workers: int = 25,
+                 fetch_size: int = 500, max_retries: int = 3, report_interval: float = 10.0):
+        self.bot = bot
+        self.db = db
+        self.bucket = TokenBucket(rate)
+        self.chat_limiter = ChatRateLimiter(per_chat_interval)
+        self.workers = workers
+        self.fetch_size = fetch_size
+        self.max_retries = max_retries
+        self.report_interval = report_interval
+        self.progress = None # BroadcastProgress текущей или последней рассылки
+        self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def create(self, text: str, created_by: int) -> int:
+        return await self.db.fetchval(
+            "INSERT INTO broadcasts (text, created_by) VALUES ($1, $2) RETURNING id", text, created_by
+        )
+
+    async def unfinished(self):
+        """Рассылки, прерванные остановкой бота или командой"""
+        return await self.db.fetch(
+            "SELECT id, created_at, status FROM broadcasts WHERE status IN ('new', 'running', 'paused') ORDER BY id"
+        )
+
+    def start(self, broadcast_id: int, report_chat_id: int = None):
+        """Запускает (или возобновляет) рассылку в фоне; отчёт о ходе - сообщением в report_chat_id"""
+        if self.running:
+            raise RuntimeError(f"Уже идёт рассылка #{self.progress.broadcast_id}")
+        self._task = asyncio.create_task(self._run(broadcast_id, report_chat_id))
+
+    async def stop(self):
+        """Останавливает рассылку; продолжить можно через start с тем же id"""
+        if not self.running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self, broadcast_id: int, report_chat_id: int = None):
+        broadcast = await self.db.fetchrow("SELECT id, text FROM broadcasts WHERE id = $1", broadcast_id)
+        if broadcast is None:
+            logger.error(f"Рассылка #{broadcast_id} не найдена")
+            return
+
+        done_rows = await self.db.fetch(
+            "SELECT status, COUNT(*) AS count FROM broadcast_deliveries WHERE broadcast_id = $1 GROUP BY status",
+            broadcast_id
+        )
+        done_before = {row['status']: row['count'] for row in done_rows}
+        remaining = await self.db.fetchval(RECIPIENTS_COUNT_SQL, broadcast_id)
+        progress = self.progress = BroadcastProgress(broadcast_id, sum(done_before.values()) + remaining, done_before)
+        await self.db.execute(
+            "UPDATE broadcasts SET status = 'running', started_at = COALESCE(started_at, CURRENT_TIMESTAMP) WHERE id = $1",
+            broadcast_id
+        )
+        logger.info(f"Рассылка #{broadcast_id}: осталось {remaining} получателей из {progress.total}")
+
+        # Результаты пишутся пачками; при переполнении очереди отправители ждут, а не теряют записи
+        deliveries = BatchedEventWriter(
+            self.db.pool, 'broadcast_deliveries', ('broadcast_id', 'user_id', 'status', 'error'),
+            batch_size=200, drop_policy=BLOCK, put_timeout=60
+        )
+        deliveries.start()
+        queue = asyncio.Queue(maxsize=self.workers * 4)
+        workers = [
+            asyncio.create_task(self._worker(queue, broadcast, progress, deliveries)) for _ in range(self.workers)
+        ]
+        reporter = asyncio.create_task(self._report_loop(report_chat_id, progress)) if report_chat_id else None
+
+        try:
+            last_user_id = 0
+            while True:
+                # Соединение занято только на время запроса порции, а не пока она рассылается
+                batch = await self.db.fetch(RECIPIENTS_SQL, broadcast_id, last_user_id, self.fetch_size)
+                for record in batch:
+                    await queue.put(record['user_id'])
+                if len(batch) < self.fetch_size:
+                    break
+                last_user_id = batch[-1]['user_id']
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+            progress.status = 'done'
+        except asyncio.CancelledError:
+            progress.status = 'paused'
+            raise
+        except Exception as e:
+            progress.status = 'paused'
+            logger.error(f"Рассылка #{broadcast_id} прервана: {e}")
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await deliveries.stop()
+            await self._finish(progress)
+            if reporter:
+                reporter.cancel()
+                await self._send_report(report_chat_id, progress)
+
+    async def _finish(self, progress: BroadcastProgress):
+        try:
+            await self.db.execute('''
+                UPDATE broadcasts SET status = $2, sent = $3, blocked = $4, failed = $5,
+                    finished_at = CASE WHEN $2 = 'done' THEN CURRENT_TIMESTAMP END
+                WHERE id = $1
+            ''', progress.broadcast_id, progress.status, progress.sent, progress.blocked, progress.failed)
+            # Заблокировавшие бота больше не получают рассылки
+            await self.db.execute('''
+                UPDATE subscribers s SET is_active = FALSE
+                FROM broadcast_deliveries d
+                WHERE d.broadcast_id = $1 AND d.status = 'blocked' AND s.user_id = d.user_id AND s.is_active
+            ''', progress.broadcast_id)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения итогов рассылки #{progress.broadcast_id}: {e}")
+        logger.info(f"Рассылка #{progress.broadcast_id} {progress.status}: отправлено {progress.sent}, "
+                    f"заблокировали {progress.blocked}, ошибок {progress.failed}, {progress.rate:.1f} сообщ./с")
+
+    async def _worker(self, queue, broadcast, progress, deliveries):
+        while True:
+            chat_id = await queue.get()
+            if chat_id is None:
+                return
+            # Между отправкой и записью результата возможна остановка - см. "не менее одного раза" выше
+            status, error = await self._deliver(chat_id, broadcast['text'], progress)
+            if status == STATUS_SENT:
+                progress.sent += 1
+            elif status == STATUS_BLOCKED:
+                progress.blocked += 1
+            else:
+                progress.failed += 1
+            await deliveries.log((broadcast['id'], chat_id, status, error))
+
+    async def _deliver(self, chat_id: int, text: str, progress: BroadcastProgress):
+        error = None
+        for attempt in range(self.max_retries + 1):
+            await self.chat_limiter.wait(chat_id)
+            await self.bucket.acquire()
+            try:
+                await self.bot.send_message(chat_id, text)
+                return STATUS_SENT, None
+            except TelegramRetryAfter as e:
+                progress.retries += 1
+                logger.warning(f"RetryAfter {e.retry_after} с при отправке в {chat_id}, пауза рассылки")
+                self.bucket.pause(e.retry_after)
+                error = str(e)
+            except TelegramForbiddenError as e:
+                return STATUS_BLOCKED, str(e)[:255]
+            except TelegramBadRequest as e:
+                return STATUS_FAILED, str(e)[:255]
+            except Exception as e:
+                # Сетевые ошибки - повторяем с нарастающей паузой
+                error = str(e)
+                await asyncio.sleep(attempt + 1)
+        return STATUS_FAILED, (error or '')[:255]
+
+    async def _report_loop(self, chat_id: int, progress: BroadcastProgress):
+        message = None
+        while True:
+            message = await self._send_report(chat_id, progress, message)
+            await asyncio.sleep(self.report_interval)
+
+    async def _send_report(self, chat_id: int, progress: BroadcastProgress, message=None):
+        try:
+            if message is None:
+                return await self.bot.send_message(chat_id, progress.report(), parse_mode=None)
+            await message.edit_text(progress.report(), parse_mode=None)
+        except TelegramBadRequest:
+            pass # Текст не изменился
+        except Exception as e:
+            logger.error(f"Ошибка отправки отчёта о рассылке: {e}")
+        return message
@@ -0,0 +1,40 @@
+import hashlib
+
+
+def category_key(news_type: str) -> str:
+    """Короткий стабильный ключ категории для callback_data (одинаков между перезапусками)"""
+    return hashlib.md5(news_type.encode('utf-8')).hexdigest()[:16]
+
+
+class CategoryRegistry:
+    """
+    Общий для процесса реестр ключ категории -> news_type.
+    Ключи детерминированы, поэтому кнопки, отправленные до перезапуска бота, продолжают работать,
+    как только категория снова загружена из БД.
+    """
+
+    def __init__(self):
+        self._by_key = {}
+        self._by_type = {}
+
+    def register(self, news_type: str) -> str:
+        key = self._by_type.get(news_type)
+        if key is None:
+            key = category_key(news_type)
+            self._by_type[news_type] = key
+            self._by_key[key] = news_type
+        return key
+
+    def sync(self, news_types):
+        for news_type in news_types:
+            self.register(news_type)
+
+    def resolve(self, key: str):
+        """news_type по ключу или None"""
+        return self._by_key.get(key)
+
+    def __len__(self):
+        return len(self._by_key)
+
+
+category_registry = CategoryRegistry()
@@ -0,0 +1,89 @@
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseEvents:
+    """
+    Слушает уведомления Postgres (LISTEN/NOTIFY) на одном выделенном соединении из пула
+    и раздаёт их подписчикам. Payload уведомлений ожидается в JSON.
+    """
+
+    def __init__(self, db, reconnect_delay: float = 5.0):
+        self.db = db
+        self.reconnect_delay = reconnect_delay
+        self._conn = None
+        self._handlers = {} # channel -> [callback, ...]
+        self._tasks = set()
+        self._reconnect_task = None
+        self._closing = False
+
+    def subscribe(self, channel: str, callback):
+        """Подписка на канал. callback(payload: dict) может быть обычной функцией или корутиной."""
+        self._handlers.setdefault(channel, []).append(callback)
+
+    async def start(self):
+        """Занимает соединение из пула и выполняет LISTEN для всех каналов подписчиков"""
+        self._closing = False
+        self._conn = await self.db.pool.acquire()
+        self._conn.add_termination_listener(self._on_termination)
+        for channel in self._handlers:
+            await self._conn.add_listener(channel, self._dispatch)
+        logger.info(f"LISTEN на каналах: {', '.join(self._handlers) or '-'}")
+
+    async def stop(self):
+        """Снимает подписки и возвращает соединение в пул"""
+        self._closing = True
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+        if self._conn is not None:
+            try:
+                for channel in self._handlers:
+                    await self._conn.remove_listener(channel, self._dispatch)
+                self._conn.remove_termination_listener(self._on_termination)
+                await self.db.pool.release(self._conn)
+            except Exception as e:
+                logger.warning(f"Ошибка при остановке LISTEN-соединения: {e}")
+            self._conn = None
+        for task in list(self._tasks):
+            task.cancel()
+
+    def _dispatch(self, connection, pid, channel, payload):
+        try:
+            data = json.loads(payload) if payload else {}
+        except ValueError:
+            logger.warning(f"Некорректный payload в канале {channel}: {payload!r}")
+            return
+
+        for callback in self._handlers.get(channel, ()):
+            try:
+                result = callback(data)
+                if asyncio.iscoroutine(result):
+                    task = asyncio.create_task(result)
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика уведомления {channel}: {e}")
+
+    def _on_termination(self, connection):
+        if self._closing:
+            return
+        logger.warning("LISTEN-соединение с БД потеряно, переподключаемся...")
+        lost, self._conn = self._conn, None
+        self._reconnect_task = asyncio.create_task(self._reconnect(lost))
+
+    async def _reconnect(self, lost):
+        if lost is not None:
+            try:
+                await self.db.pool.release(lost) # Освобождаем слот пула, занятый оборванным соединением
+            except Exception as e:
+                logger.debug(f"Не удалось вернуть оборванное соединение в пул: {e}")
+        while not self._closing:
+            await asyncio.sleep(self.reconnect_delay)
+            try:
+                await self.start()
+                return
+            except Exception as e:
+                logger.error(f"Не удалось восстановить LISTEN-соединение: {e}")
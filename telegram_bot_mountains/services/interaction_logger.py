@@ -0,0 +1,156 @@
+import asyncio
+import logging
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+DROP_NEW = 'drop_new' # Очередь полна - новое событие отбрасывается
+DROP_OLD = 'drop_old' # Очередь полна - вытесняется самое старое событие
+BLOCK = 'block' # Очередь полна - обработчик ждёт до put_timeout секунд, затем событие отбрасывается
+
+
+class BatchedEventWriter:
+    """
+    Пишет события в таблицу пачками через COPY, вне пути обработки апдейта.
+    Обработчики кладут кортежи в ограниченную очередь, фоновая задача сбрасывает их,
+    когда набралось batch_size записей или прошло flush_interval секунд.
+    """
+
+    def __init__(self, pool, table: str, columns, max_queue: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 1.0, drop_policy: str = DROP_NEW, put_timeout: float = 0.5):
+        if drop_policy not in (DROP_NEW, DROP_OLD, BLOCK):
+            raise ValueError(f"Неизвестная политика переполнения: {drop_policy}")
+        self.pool = pool
+        self.table = table
+        self.columns = tuple(columns)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.drop_policy = drop_policy
+        self.put_timeout = put_timeout
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._task = None
+        self._closing = False
+        self._getter = None # Ожидание первого события пачки; переживает пустые интервалы, чтобы не терять событие
+
+    def start(self):
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10):
+        """Дописывает всё, что осталось в очереди, и останавливает фоновую задачу"""
+        if self._task is None:
+            return
+        self._closing = True
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"{self.table}: не успели дописать очередь за {timeout} с, потеряно {self._queue.qsize()} событий")
+            self._task.cancel()
+        self._task = None
+
+    async def log(self, record: tuple) -> bool:
+        """Ставит событие в очередь. Возвращает False, если событие отброшено из-за переполнения."""
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            if self.drop_policy == DROP_OLD:
+                self._queue.get_nowait()
+                self._queue.put_nowait(record)
+                self.dropped += 1
+            elif self.drop_policy == BLOCK:
+                try:
+                    await asyncio.wait_for(self._queue.put(record), self.put_timeout)
+                except asyncio.TimeoutError:
+                    self._drop()
+                    return False
+            else:
+                self._drop()
+                return False
+        self.enqueued += 1
+        return True
+
+    @property
+    def stats(self):
+        return {'queued': self._queue.qsize(), 'enqueued': self.enqueued,
+                'written': self.written, 'dropped': self.dropped}
+
+    def _drop(self):
+        self.dropped += 1
+        if self.dropped % 1000 == 1:
+            logger.warning(f"{self.table}: очередь событий переполнена, отброшено {self.dropped}")
+
+    async def _next_batch(self):
+        """
+        Пачка до batch_size событий или всё, что пришло за flush_interval. Ждём только появления
+        события, остальное забираем get_nowait(). get() не отменяется по таймауту (wait_for на 3.11
+        мог отменить get(), уже забравший событие, и оно терялось) - ожидание продолжается в следующем вызове.
+        """
+        batch = []
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            if self._getter is None:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    self._getter = asyncio.ensure_future(self._queue.get())
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            done, _ = await asyncio.wait((self._getter,), timeout=timeout)
+            if not done:
+                break
+            batch.append(self._getter.result())
+            self._getter = None
+        return batch
+
+    def _drained(self) -> bool:
+        return self._queue.empty() and not (self._getter is not None and self._getter.done())
+
+    async def _run(self):
+        try:
+            while not (self._closing and self._drained()):
+                batch = await self._next_batch()
+                if batch:
+                    await self._write(batch)
+        finally:
+            if self._getter is not None:
+                self._getter.cancel()
+                self._getter = None
+
+    async def _write(self, batch):
+        for attempt in (1, 2):
+            try:
+                async with self.pool.acquire() as conn:
+                    await conn.copy_records_to_table(self.table, records=batch, columns=self.columns)
+                self.written += len(batch)
+                return
+            except (asyncpg.IntegrityConstraintViolationError, asyncpg.DataError) as e:
+                # Одна плохая запись не должна стоить всей пачки
+                logger.warning(f"{self.table}: COPY отклонён ({e}), пишем пачку построчно")
+                await self._write_rows(batch)
+                return
+            except Exception as e:
+                if attempt == 2:
+                    self.dropped += len(batch)
+                    logger.error(f"{self.table}: не удалось записать {len(batch)} событий: {e}")
+                    return
+                logger.warning(f"{self.table}: ошибка записи пачки, повтор: {e}")
+                await asyncio.sleep(self.flush_interval)
+
+    async def _write_rows(self, batch):
+        placeholders = ', '.join(f'${i}' for i in range(1, len(self.columns) + 1))
+        query = f"INSERT INTO {self.table} ({', '.join(self.columns)}) VALUES ({placeholders})"
+        async with self.pool.acquire() as conn:
+            for record in batch:
+                try:
+                    await conn.execute(query, *record)
+                    self.written += 1
+                except asyncpg.PostgresError as e:
+                    self.dropped += 1
+                    logger.error(f"{self.table}: событие {record} не записано: {e}")
@@ -0,0 +1,194 @@
+import asyncio
+import html
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# qr_id хранится в агрегатах только для сканирований: у поиска в этой колонке ключевое слово
+_QR = "CASE WHEN interaction_type LIKE 'qr_scan%' THEN COALESCE(qr_id, '') ELSE '' END"
+_RANGE = "FROM user_interactions WHERE id > $1 AND id <= $2"
+
+# Верхняя граница порции: не больше $2 событий и только те, что записаны не позже $3 секунд назад.
+# created_at - время начала пишущей транзакции, так что id, выданные ещё не закоммиченным пачкам, не пропускаются.
+UPPER_SQL = '''
+    SELECT MAX(id) FROM (
+        SELECT id FROM user_interactions
+        WHERE id > $1 AND created_at < now()::timestamp - $3::float8 * interval '1 second'
+        ORDER BY id LIMIT $2
+    ) batch
+'''
+
+_EVENTS_SQL = '''
+    INSERT INTO {table} AS r (bucket, interaction_type, qr_id, events)
+    SELECT {bucket}, interaction_type, {qr}, COUNT(*) {range} GROUP BY 1, 2, 3
+    ON CONFLICT (bucket, interaction_type, qr_id) DO UPDATE SET events = r.events + EXCLUDED.events
+'''
+HOURLY_SQL = _EVENTS_SQL.format(table='interaction_rollup_hourly', bucket="date_trunc('hour', created_at)",
+                                qr=_QR, range=_RANGE)
+DAILY_SQL = _EVENTS_SQL.format(table='interaction_rollup_daily', bucket="created_at::date", qr=_QR, range=_RANGE)
+
+# Пользователь учитывается в дне один раз: считаются только новые пары (день, пользователь)
+DAY_USERS_SQL = f'''
+    WITH fresh AS (
+        INSERT INTO interaction_day_users (day, user_id)
+        SELECT DISTINCT created_at::date, user_id {_RANGE}
+        ON CONFLICT DO NOTHING RETURNING day
+    )
+    INSERT INTO interaction_rollup_users AS r (bucket, users)
+    SELECT day, COUNT(*) FROM fresh GROUP BY day
+    ON CONFLICT (bucket) DO UPDATE SET users = r.users + EXCLUDED.users
+'''
+
+NEW_USERS_SQL = f'''
+    WITH fresh AS (
+        INSERT INTO interaction_users (user_id, first_seen)
+        SELECT user_id, MIN(created_at)::date {_RANGE} GROUP BY user_id
+        ON CONFLICT DO NOTHING RETURNING first_seen
+    ), counted AS (
+        INSERT INTO interaction_rollup_users AS r (bucket, new_users)
+        SELECT first_seen, COUNT(*) FROM fresh GROUP BY first_seen
+        ON CONFLICT (bucket) DO UPDATE SET new_users = r.new_users + EXCLUDED.new_users
+    )
+    SELECT COUNT(*) FROM fresh
+'''
+
+STATE_SQL = '''
+    UPDATE interaction_rollup_state
+    SET last_id = $1, events = events + $2, users = users + $3, updated_at = now()::timestamp
+'''
+
+ACTION_NAMES = {
+    'qr_scan': 'Сканирование QR',
+    'qr_scan_not_found': 'QR не найден',
+    'search': 'Поиск',
+}
+
+
+class InteractionRollup:
+    """
+    Почасовые и дневные агрегаты user_interactions: события по типу и qr_id, уникальные и новые
+    пользователи по дням, итоги за всё время. Раз в interval секунд фоновая задача забирает события
+    после водяного знака (last_id) порциями по batch_size, каждую - в одной транзакции вместе
+    со сдвигом знака, поэтому событие не учитывается дважды. Несколько процессов не мешают друг другу:
+    строку состояния держит один (FOR UPDATE SKIP LOCKED). /stats читает только агрегаты, и время
+    ответа не зависит от длины истории. Первый запуск досчитывает всю историю теми же порциями.
+    """
+
+    def __init__(self, db, interval: float = 60, batch_size: int = 10000, lag: float = 30, hourly_days: int = 90):
+        self.db = db
+        self.interval = interval
+        self.batch_size = batch_size
+        self.lag = lag # Секунд: дольше должна идти самая длинная пишущая транзакция, чтобы её события пропустить
+        self.hourly_days = hourly_days
+        self.processed = 0
+        self.runs = 0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """Отменяет фоновую задачу и дожидается её: начатая порция откатывается до закрытия пула"""
+        task, self._task = self._task, None
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def run(self) -> int:
+        """Догоняет водяной знак до конца записанных событий; возвращает число учтённых событий"""
+        started, total = time.perf_counter(), 0
+        while True:
+            count = await self.step()
+            total += count
+            if count < self.batch_size:
+                break
+        if total:
+            # Пары (день, пользователь) нужны, пока в день ещё приходят события; удаляем после догона,
+            # иначе первая досчётка истории посчитала бы одного пользователя в старом дне дважды
+            await self.db.execute("DELETE FROM interaction_day_users WHERE day < current_date - 1")
+            await self.db.execute(
+                "DELETE FROM interaction_rollup_hourly WHERE bucket < now()::timestamp - $1::int * interval '1 day'",
+                self.hourly_days,
+            )
+            logger.info(f"Агрегаты взаимодействий: +{total} событий за {time.perf_counter() - started:.2f} с")
+        self.runs += 1
+        return total
+
+    async def step(self) -> int:
+        """Одна порция событий в одной транзакции; 0 - новых событий нет или агрегирует другой процесс"""
+        async with self.db.pool.acquire() as conn:
+            async with conn.transaction():
+                last_id = await conn.fetchval("SELECT last_id FROM interaction_rollup_state FOR UPDATE SKIP LOCKED")
+                if last_id is None:
+                    return 0
+                upper = await conn.fetchval(UPPER_SQL, last_id, self.batch_size, self.lag)
+                if upper is None:
+                    return 0
+                count = await conn.fetchval(f"SELECT COUNT(*) {_RANGE}", last_id, upper)
+                await conn.execute(HOURLY_SQL, last_id, upper)
+                await conn.execute(DAILY_SQL, last_id, upper)
+                await conn.execute(DAY_USERS_SQL, last_id, upper)
+                new_users = await conn.fetchval(NEW_USERS_SQL, last_id, upper)
+                await conn.execute(STATE_SQL, upper, count, new_users)
+        self.processed += count
+        return count
+
+    async def report(self, days: int = 7, top: int = 5) -> str:
+        """Текст /stats (HTML) только по агрегатам: объём чтения зависит от days и числа QR, но не от истории"""
+        state = await self.db.fetchrow("SELECT last_id, events, users, updated_at FROM interaction_rollup_state")
+        today = await self.db.fetchrow("SELECT users, new_users FROM interaction_rollup_users WHERE bucket = current_date")
+        period = await self.db.fetchrow(
+            "SELECT COALESCE(SUM(new_users), 0) AS new_users, COALESCE(MAX(users), 0) AS peak "
+            "FROM interaction_rollup_users WHERE bucket > current_date - $1::int", days,
+        )
+        hours = await self.db.fetchval(
+            "SELECT COALESCE(SUM(events), 0) FROM interaction_rollup_hourly "
+            "WHERE bucket >= date_trunc('hour', now()::timestamp) - interval '23 hours'"
+        )
+        actions = await self.db.fetch(
+            "SELECT interaction_type, SUM(events) AS events FROM interaction_rollup_daily "
+            "WHERE bucket > current_date - $1::int GROUP BY interaction_type ORDER BY events DESC", days,
+        )
+        scans = await self.db.fetch(
+            "SELECT qr_id, SUM(events) AS events FROM interaction_rollup_daily "
+            "WHERE bucket > current_date - $1::int AND interaction_type = 'qr_scan' "
+            "GROUP BY qr_id ORDER BY events DESC LIMIT $2", days, top,
+        )
+
+        lines = [
+            "📊 <b>Статистика бота 'Вершины России'</b>\n",
+            f"👥 Пользователей за всё время: <b>{state['users']}</b>",
+            f"🎯 Действий за всё время: <b>{state['events']}</b>",
+            f"🕐 Действий за 24 часа: <b>{hours}</b>",
+            f"📅 Сегодня: пользователей <b>{today['users'] if today else 0}</b>, "
+            f"новых <b>{today['new_users'] if today else 0}</b>",
+            f"📈 За {days} дн.: новых пользователей <b>{period['new_users']}</b>, максимум за день <b>{period['peak']}</b>",
+        ]
+        if actions:
+            lines.append(f"\n🔥 <b>Действия за {days} дн.:</b>")
+            lines.extend(f"  • {html.escape(ACTION_NAMES.get(row['interaction_type'], row['interaction_type']))}: "
+                         f"{row['events']}" for row in actions)
+        if scans:
+            lines.append(f"\n📷 <b>Сканирования QR за {days} дн.:</b>")
+            lines.extend(f"  • {html.escape(row['qr_id'] or '-')}: {row['events']}" for row in scans)
+        if state['updated_at']:
+            lines.append(f"\n<i>Обновлено {state['updated_at']:%d.%m %H:%M}</i>")
+        return '\n'.join(lines)
+
+    @property
+    def stats(self) -> dict:
+        return {'runs': self.runs, 'processed': self.processed}
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка обновления агрегатов взаимодействий: {e}")
+            await asyncio.sleep(self.interval)
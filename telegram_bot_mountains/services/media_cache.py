@@ -0,0 +1,72 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PostMediaCache:
+    """
+    file_id картинок постов в Telegram: после первой отправки фото по URL
+    посты отправляются по file_id, без повторной загрузки картинки серверами Telegram.
+    Хранится в таблице post_media и в памяти процесса. Запись действительна,
+    только пока image_url поста совпадает с тем, для которого получен file_id.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.hits = 0
+        self.misses = 0
+        self._entries = {} # post_id -> (image_url, file_id)
+
+    async def load(self):
+        """Загружает file_id в память, заодно удаляя записи для сменившихся картинок"""
+        await self.db.execute('''
+            DELETE FROM post_media m USING posts p
+            WHERE p.id = m.post_id AND p.image_url <> m.image_url
+        ''')
+        rows = await self.db.fetch("SELECT post_id, image_url, file_id FROM post_media")
+        self._entries = {row['post_id']: (row['image_url'], row['file_id']) for row in rows}
+        logger.info(f"Кэш file_id картинок постов загружен: {len(self._entries)}")
+
+    def get(self, post):
+        """file_id для картинки поста или None, если картинку нужно отправить по URL"""
+        entry = self._entries.get(post['id'])
+        if entry is not None and entry[0] == post['image_url']:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def photo(self, post):
+        """То, что передаётся в answer_photo / InputMediaPhoto: file_id или URL"""
+        return self.get(post) or post['image_url']
+
+    async def remember(self, post, sent):
+        """Запоминает file_id из отправленного сообщения (самый большой размер фото)"""
+        photo = getattr(sent, 'photo', None)
+        if not photo:
+            return
+        file_id = photo[-1].file_id
+        if self._entries.get(post['id']) == (post['image_url'], file_id):
+            return
+        self._entries[post['id']] = (post['image_url'], file_id)
+        try:
+            await self.db.execute('''
+                INSERT INTO post_media (post_id, image_url, file_id) VALUES ($1, $2, $3)
+                ON CONFLICT (post_id) DO UPDATE
+                SET image_url = EXCLUDED.image_url, file_id = EXCLUDED.file_id, updated_at = CURRENT_TIMESTAMP
+            ''', post['id'], post['image_url'], file_id)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения file_id для поста {post['id']}: {e}")
+
+    async def forget(self, post_id: int):
+        """Удаляет file_id, который Telegram больше не принимает"""
+        if self._entries.pop(post_id, None) is None:
+            return
+        try:
+            await self.db.execute("DELETE FROM post_media WHERE post_id = $1", post_id)
+        except Exception as e:
+            logger.error(f"Ошибка удаления file_id для поста {post_id}: {e}")
+
+    @property
+    def stats(self) -> dict:
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
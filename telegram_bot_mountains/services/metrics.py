@@ -0,0 +1,174 @@
+import logging
+from bisect import bisect_left
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм в секундах: от сотни микросекунд (кэш) до секунд (Bot API, медленный SQL)
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # Последняя корзина - +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class _Family:
+    kind = None
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+
+    def _label_text(self, values, extra: str = '') -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class HistogramFamily(_Family):
+    """Гистограммы одной метрики по значениям меток; ключ - кортеж значений в порядке labels"""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        self.children = {}
+
+    def observe(self, key: tuple, value: float):
+        child = self.children.get(key)
+        if child is None:
+            child = self.children[key] = Histogram(self.buckets)
+        child.observe(value)
+
+    def render(self):
+        lines = self.header()
+        bounds = [f'le="{_number(bound)}"' for bound in self.buckets] + ['le="+Inf"']
+        for key, child in sorted(self.children.items()):
+            total = 0
+            for bound, count in zip(bounds, child.counts):
+                total += count
+                lines.append(f"{self.name}_bucket{self._label_text(key, bound)} {total}")
+            labels = self._label_text(key)
+            lines.append(f"{self.name}_sum{labels} {_number(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {total}")
+        return lines
+
+
+class CounterFamily(_Family):
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self.values = {}
+
+    def inc(self, key: tuple = (), amount: float = 1):
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = self.header()
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{self._label_text(key)} {_number(value)}")
+        return lines
+
+
+class GaugeFamily(_Family):
+    """Значение читается при выдаче метрик: callback() -> число или {ключ меток: число}"""
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, callback, labels=()):
+        super().__init__(name, help_text, labels)
+        self.callback = callback
+
+    def render(self):
+        lines = self.header()
+        try:
+            values = self.callback()
+        except Exception as e:
+            logger.error(f"Метрика {self.name} не прочитана: {e}")
+            return lines
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{self._label_text(key)} {_number(value)}")
+        return lines
+
+
+class Metrics:
+    """
+    Реестр метрик процесса в текстовом формате Prometheus, без внешних зависимостей.
+    Запись - словарь и счётчик в памяти, всё форматирование - только при запросе /metrics.
+    """
+
+    def __init__(self):
+        self._families = {}
+
+    def histogram(self, name: str, help_text: str, labels=(), buckets=DEFAULT_BUCKETS) -> HistogramFamily:
+        return self._add(HistogramFamily(name, help_text, labels, buckets))
+
+    def counter(self, name: str, help_text: str, labels=()) -> CounterFamily:
+        return self._add(CounterFamily(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, callback, labels=()) -> GaugeFamily:
+        return self._add(GaugeFamily(name, help_text, callback, labels))
+
+    def _add(self, family):
+        if family.name in self._families:
+            raise ValueError(f"Метрика {family.name} уже зарегистрирована")
+        self._families[family.name] = family
+        return family
+
+    def render(self) -> str:
+        lines = []
+        for family in self._families.values():
+            lines.extend(family.render())
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """GET /metrics для Prometheus на отдельном порту (по умолчанию только localhost)"""
+
+    def __init__(self, metrics: Metrics, host: str = '127.0.0.1', port: int = 9108):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Метрики: http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        return web.Response(body=self.metrics.render().encode('utf-8'), headers={'Content-Type': CONTENT_TYPE})
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value) -> str:
+    return repr(value) if isinstance(value, float) else str(value)
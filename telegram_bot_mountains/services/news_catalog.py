@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import time
+
+from services.category_registry import category_registry
+
+logger = logging.getLogger(__name__)
+
+NEWS_CHANNEL = 'news_changed'
+
+
+class NewsCategoryCatalog:
+    """
+    Каталог категорий новостей в памяти процесса: названия, количество новостей и ключи для кнопок.
+    Обновляется по уведомлениям триггера на news (LISTEN/NOTIFY), раз в reconcile_interval секунд
+    полностью сверяется с БД на случай потерянных уведомлений.
+    """
+
+    def __init__(self, db, events=None, reconcile_interval: float = 300, registry=category_registry):
+        self.db = db
+        self.events = events
+        self.reconcile_interval = reconcile_interval
+        self.registry = registry
+        self.hits = 0
+        self.misses = 0
+        self._counts = None # news_type -> count; None, пока каталог не загружен
+        self._last_reconcile = 0.0
+        self._ordered = None # Отсортированный список для меню, сбрасывается при изменениях
+        self._task = None
+
+        if events is not None:
+            events.subscribe(NEWS_CHANNEL, self._on_news_changed)
+
+    async def start(self):
+        """Первичная загрузка и запуск периодической сверки"""
+        await self.reconcile()
+        self._task = asyncio.create_task(self._reconcile_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def reconcile(self):
+        """Полностью перечитывает категории из БД"""
+        rows = await self.db.run('news_category_counts')
+        self._counts = {row.news_type: row.count for row in rows}
+        self.registry.sync(self._counts)
+        self._ordered = None
+        self._last_reconcile = time.monotonic()
+
+    async def categories(self):
+        """Список (news_type, count, key) по убыванию количества новостей"""
+        if self._counts is None:
+            self.misses += 1
+            await self.reconcile()
+        else:
+            self.hits += 1
+
+        if self._ordered is None:
+            self._ordered = [
+                (news_type, count, self.registry.register(news_type))
+                for news_type, count in sorted(self._counts.items(), key=lambda item: item[1], reverse=True)
+            ]
+        return self._ordered
+
+    def count(self, news_type: str):
+        """Количество новостей категории из памяти или None, если каталог ещё не загружен"""
+        if self._counts is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self._counts.get(news_type, 0)
+
+    @property
+    def stats(self):
+        return {'categories': len(self._counts or ()), 'hits': self.hits, 'misses': self.misses}
+
+    def key_for(self, news_type: str) -> str:
+        return self.registry.register(news_type)
+
+    async def resolve(self, key: str, min_refresh_interval: float = 10):
+        """
+        news_type по ключу из callback_data. Если ключ неизвестен (категория появилась, а уведомление
+        ещё не дошло), один раз перечитывает каталог, но не чаще min_refresh_interval секунд.
+        """
+        news_type = self.registry.resolve(key)
+        if news_type is not None:
+            self.hits += 1
+            return news_type
+
+        self.misses += 1
+        if time.monotonic() - self._last_reconcile >= min_refresh_interval:
+            await self.reconcile()
+            return self.registry.resolve(key)
+        return None
+
+    def _adjust(self, news_type, delta: int):
+        if news_type is None:
+            return
+        count = self._counts.get(news_type, 0) + delta
+        if count > 0:
+            self._counts[news_type] = count
+            self.registry.register(news_type)
+        else:
+            self._counts.pop(news_type, None)
+        self._ordered = None
+
+    def _on_news_changed(self, payload: dict):
+        if self._counts is None:
+            return # Ещё не загружены - первая сверка всё равно прочитает актуальные данные
+
+        op = payload.get('op')
+        if op == 'INSERT':
+            self._adjust(payload.get('news_type'), 1)
+        elif op == 'DELETE':
+            self._adjust(payload.get('old_news_type'), -1)
+        elif op == 'UPDATE' and payload.get('news_type') != payload.get('old_news_type'):
+            self._adjust(payload.get('old_news_type'), -1)
+            self._adjust(payload.get('news_type'), 1)
+
+    async def _reconcile_loop(self):
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            try:
+                await self.reconcile()
+                logger.info(f"Каталог категорий сверен с БД: {self.stats}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка сверки каталога категорий: {e}")
@@ -0,0 +1,98 @@
+import time
+from collections import OrderedDict
+
+from services.news_catalog import NEWS_CHANNEL
+
+
+class _Page:
+    __slots__ = ('version', 'expires', 'text', 'markup')
+
+    def __init__(self, version, expires, text, markup):
+        self.version = version
+        self.expires = expires
+        self.text = text
+        self.markup = markup
+
+
+class NewsPageCache:
+    """
+    Готовые страницы новостей (текст и клавиатура) по ключу (категория, позиция страницы).
+
+    У каждой категории есть номер версии, он растёт при любом изменении её новостей
+    (уведомления news_changed). Страница хранит версию, с которой она собрана, и после
+    изменения категории считается устаревшей. ttl страхует от потерянных уведомлений.
+    """
+
+    def __init__(self, events=None, max_items: int = 2000, ttl: float = 300):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.hit_seconds = 0.0
+        self.miss_seconds = 0.0
+        self._pages = OrderedDict() # (news_type, ...) -> _Page
+        self._versions = {} # news_type -> версия
+        self._generation = 0 # Растёт при сбросе всех категорий сразу
+
+        if events is not None:
+            events.subscribe(NEWS_CHANNEL, self._on_news_changed)
+
+    def version(self, news_type: str):
+        """Версию нужно взять до чтения из БД: изменение во время чтения не даст закэшировать старую страницу"""
+        return self._generation, self._versions.get(news_type, 0)
+
+    def get(self, key):
+        """(текст, клавиатура) или None; key[0] - категория"""
+        page = self._pages.get(key)
+        if page is None:
+            return None
+        if page.version != self.version(key[0]) or page.expires < time.monotonic():
+            self.stale += 1
+            del self._pages[key]
+            return None
+        self._pages.move_to_end(key)
+        return page.text, page.markup
+
+    def put(self, key, version, text: str, markup):
+        if version != self.version(key[0]):
+            return # Категория изменилась, пока страница собиралась
+        self._pages[key] = _Page(version, time.monotonic() + self.ttl, text, markup)
+        self._pages.move_to_end(key)
+        while len(self._pages) > self.max_items:
+            self._pages.popitem(last=False)
+
+    def invalidate(self, news_type: str = None):
+        """Сбрасывает страницы категории или все страницы"""
+        if news_type is None:
+            self._generation += 1
+            self._pages.clear()
+        else:
+            self._versions[news_type] = self._versions.get(news_type, 0) + 1
+
+    def observe(self, hit: bool, seconds: float):
+        """Учёт обслуженной страницы: из кэша или с чтением из БД"""
+        if hit:
+            self.hits += 1
+            self.hit_seconds += seconds
+        else:
+            self.misses += 1
+            self.miss_seconds += seconds
+
+    def _on_news_changed(self, payload: dict):
+        for news_type in {payload.get('news_type'), payload.get('old_news_type')}:
+            if news_type is not None:
+                self.invalidate(news_type)
+
+    @property
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'cached': len(self._pages),
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale': self.stale,
+            'hit_rate': self.hits / total if total else 0.0,
+            'hit_ms': self.hit_seconds / self.hits * 1000 if self.hits else 0.0,
+            'miss_ms': self.miss_seconds / self.misses * 1000 if self.misses else 0.0,
+        }
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+POSTS_CHANNEL = 'posts_changed'
+MAX_QR_ID_LENGTH = 50 # posts.qr_id VARCHAR(50): более длинный код заведомо не существует
+
+
+class PostCache:
+    """
+    Активные посты по qr_id для сканирования QR-кодов. Найденные посты живут ttl секунд,
+    неизвестные коды запоминаются отдельно (negative_ttl) - перебор или опечатки в кодах
+    не доходят до БД и не вытесняют настоящие посты. Одновременные сканы одного кода
+    ждут один запрос. Записи сбрасываются по уведомлениям posts_changed.
+    """
+
+    def __init__(self, db, events=None, max_items: int = 2000, ttl: float = 600,
+                 max_negative: int = 10000, negative_ttl: float = 60):
+        self.db = db
+        self.max_items = max_items
+        self.ttl = ttl
+        self.max_negative = max_negative
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.coalesced = 0 # Дождались чужого запроса того же кода
+        self._posts = OrderedDict() # qr_id -> (истекает, пост)
+        self._missing = OrderedDict() # qr_id -> истекает
+        self._qr_by_post_id = {} # id поста -> qr_id, чтобы сбросить запись при смене qr_id
+        self._pending = {} # qr_id -> Future с результатом запроса
+        self._generation = 0 # Растёт при каждом изменении постов: запрос, начатый раньше, не кэшируется
+
+        if events is not None:
+            events.subscribe(POSTS_CHANNEL, self._on_posts_changed)
+
+    async def get(self, qr_id: str):
+        """Активный пост по qr_id или None"""
+        if not qr_id or len(qr_id) > MAX_QR_ID_LENGTH:
+            self.negative_hits += 1
+            return None
+        now = time.monotonic()
+
+        entry = self._posts.get(qr_id)
+        if entry is not None:
+            if entry[0] > now:
+                self.hits += 1
+                self._posts.move_to_end(qr_id)
+                return entry[1]
+            self._drop(qr_id)
+
+        expires = self._missing.get(qr_id)
+        if expires is not None:
+            if expires > now:
+                self.negative_hits += 1
+                return None
+            del self._missing[qr_id]
+
+        future = self._pending.get(qr_id)
+        if future is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise # Отменили нас самих
+                return await self.get(qr_id) # Отменили запрашивавшего - повторяем сами
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[qr_id] = future
+        generation = self._generation
+        try:
+            post = await self.db.run('post_by_qr_id', qr_id)
+        except Exception as e:
+            future.set_exception(e)
+            future.exception() # Ожидающих может не быть - не выводим "exception was never retrieved"
+            raise
+        else:
+            future.set_result(post)
+        finally:
+            self._pending.pop(qr_id, None)
+            if not future.done():
+                future.cancel() # CancelledError и прочие BaseException: ожидающие не должны зависнуть
+        if generation == self._generation:
+            self._remember(qr_id, post)
+        return post
+
+    def _remember(self, qr_id: str, post):
+        now = time.monotonic()
+        if post is None:
+            self._missing[qr_id] = now + self.negative_ttl
+            self._missing.move_to_end(qr_id)
+            while len(self._missing) > self.max_negative:
+                self._missing.popitem(last=False)
+            return
+        self._posts[qr_id] = (now + self.ttl, post)
+        self._posts.move_to_end(qr_id)
+        self._qr_by_post_id[post.id] = qr_id
+        while len(self._posts) > self.max_items:
+            _, (_, evicted) = self._posts.popitem(last=False)
+            self._qr_by_post_id.pop(evicted.id, None)
+
+    def _drop(self, qr_id: str):
+        entry = self._posts.pop(qr_id, None)
+        if entry is not None:
+            self._qr_by_post_id.pop(entry[1].id, None)
+        self._missing.pop(qr_id, None)
+
+    def invalidate(self, qr_id: str = None, post_id: int = None):
+        """Сбрасывает запись по qr_id и/или id поста; без аргументов - весь кэш"""
+        self._generation += 1
+        if qr_id is None and post_id is None:
+            self._posts.clear()
+            self._missing.clear()
+            self._qr_by_post_id.clear()
+            return
+        if post_id is not None and post_id in self._qr_by_post_id:
+            self._drop(self._qr_by_post_id[post_id])
+        if qr_id is not None:
+            self._drop(qr_id)
+
+    def _on_posts_changed(self, payload: dict):
+        # Новый пост снимает "не найден" со своего кода, изменение qr_id - старую запись по id
+        self.invalidate(payload.get('qr_id'), payload.get('id'))
+
+    @property
+    def stats(self) -> dict:
+        return {'cached': len(self._posts), 'missing': len(self._missing), 'hits': self.hits,
+                'negative_hits': self.negative_hits, 'coalesced': self.coalesced, 'misses': self.misses}
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Пакетная генерация QR-кодов по таблице (QR_spisok.xlsx): ZIP с PNG и листы для печати.
+
+Запуск из каталога telegram_bot_mountains:
+    python -m services.qr_batch QR_spisok.xlsx -o qr_codes.zip
+    python -m services.qr_batch posts.xlsx --qr-id-column qr_id --bot vershiny_rossii_bot
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import logging
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+
+from openpyxl import load_workbook
+from PIL import Image, ImageDraw, ImageFont
+
+from services.qr_generator import qr_deep_link, render_qr_png
+
+logger = logging.getLogger(__name__)
+
+LINK_COLUMN = 'Ссылка'
+LABEL_COLUMN = 'Порядковый номер новости'
+
+# Лист A4 при 150 dpi, сетка 4 x 5 кодов с подписями
+SHEET_SIZE = (1240, 1754)
+SHEET_GRID = (4, 5)
+SHEET_MARGIN = 60
+LABEL_HEIGHT = 40
+
+
+def iter_sheet_rows(path: str, link_column: str = LINK_COLUMN, label_column: str = LABEL_COLUMN,
+                    qr_id_column: str = None, bot_username: str = None):
+    """
+    Потоково читает таблицу (openpyxl read-only) и отдаёт пары (подпись, данные для QR).
+    Если задан qr_id_column, кодируется диплинк бота mountain:<qr_id>, иначе - ссылка из link_column.
+    """
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(cell).strip() if cell is not None else '' for cell in next(rows, ())]
+        source_column = qr_id_column or link_column
+        if source_column not in header:
+            raise ValueError(f"В таблице нет колонки '{source_column}'. Есть: {', '.join(filter(None, header))}")
+        source_idx = header.index(source_column)
+        label_idx = header.index(label_column) if label_column in header else None
+
+        for number, row in enumerate(rows, 1):
+            value = row[source_idx] if source_idx < len(row) else None
+            if value is None or not str(value).strip():
+                continue
+            value = str(value).strip()
+            label = row[label_idx] if label_idx is not None and label_idx < len(row) else None
+            label = str(label if label is not None else number).strip()
+            data = qr_deep_link(bot_username, value) if qr_id_column else value
+            yield label, data
+    finally:
+        workbook.close()
+
+
+def _safe_name(label: str) -> str:
+    return re.sub(r'[^\w.-]+', '_', label)[:60] or 'qr'
+
+
+class _SheetComposer:
+    """Раскладывает коды по листам A4 с подписями; заполненный лист сразу отдаётся в on_sheet(номер, лист)"""
+
+    def __init__(self, on_sheet):
+        self.on_sheet = on_sheet
+        self.count = 0
+        self._current = None
+        self._slot = 0
+        cols, rows = SHEET_GRID
+        self._cell_w = (SHEET_SIZE[0] - 2 * SHEET_MARGIN) // cols
+        self._cell_h = (SHEET_SIZE[1] - 2 * SHEET_MARGIN) // rows
+        self._qr_side = min(self._cell_w, self._cell_h - LABEL_HEIGHT) - 10
+        self._font = ImageFont.load_default(size=28)
+
+    def add(self, label: str, png: bytes):
+        cols, rows = SHEET_GRID
+        if self._current is None:
+            self._current = Image.new('RGB', SHEET_SIZE, 'white')
+            self._slot = 0
+
+        col, row = self._slot % cols, self._slot // cols
+        x = SHEET_MARGIN + col * self._cell_w
+        y = SHEET_MARGIN + row * self._cell_h
+        qr_image = Image.open(io.BytesIO(png)).convert('RGB').resize((self._qr_side, self._qr_side), Image.NEAREST)
+        self._current.paste(qr_image, (x + (self._cell_w - self._qr_side) // 2, y))
+        draw = ImageDraw.Draw(self._current)
+        text = f"#{label}" # Встроенный шрифт Pillow без кириллицы
+        text_w = draw.textlength(text, font=self._font)
+        draw.text((x + (self._cell_w - text_w) // 2, y + self._qr_side + 5), text, fill='black', font=self._font)
+        self._slot += 1
+        if self._slot == cols * rows:
+            self.finish()
+
+    def finish(self):
+        """Отдаёт начатый лист, даже неполный"""
+        if self._current is not None:
+            self.count += 1
+            self.on_sheet(self.count, self._current)
+            self._current = None
+
+
+def _render(render, rows, window: int):
+    """
+    (подпись, PNG) в порядке строк таблицы; render(список данных) -> итератор PNG (pool.map или map).
+    Строки берутся из rows окнами по window: пока разбирается одно окно, следующее уже рендерится
+    (у пула процессов), а вся таблица в память не читается.
+    """
+    rows = iter(rows)
+    batch = list(islice(rows, window))
+    results = render([data for _, data in batch])
+    while batch:
+        next_batch = list(islice(rows, window))
+        next_results = render([data for _, data in next_batch])
+        yield from zip((label for label, _ in batch), results)
+        batch, results = next_batch, next_results
+
+
+def generate_batch(rows, output, workers: int = None, chunksize: int = 32, sheets: bool = True) -> int:
+    """
+    Рендерит QR-коды для (подпись, данные) на пуле процессов и пишет ZIP в output (путь или файловый объект).
+    workers=0 - рендер в текущем процессе, без пула. Строки читаются по мере рендера, листы для печати (sheets/sheet_NNN.png) пишутся в архив по мере
+    заполнения - в памяти только текущий лист. Возвращает количество кодов.
+    """
+    count = 0
+    used_names = set()
+    window = (workers or os.cpu_count() or 1) * chunksize * 4
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers != 0 else None
+    with pool or contextlib.nullcontext(), zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_STORED) as archive:
+        # PNG уже сжат - повторно не сжимаем
+        render = partial(pool.map, render_qr_png, chunksize=chunksize) if pool else partial(map, render_qr_png)
+
+        def write_sheet(number, sheet):
+            page = io.BytesIO()
+            sheet.save(page, format='PNG', dpi=(150, 150)) # A4 при печати в натуральную величину
+            archive.writestr(f"sheets/sheet_{number:03d}.png", page.getvalue())
+
+        composer = _SheetComposer(write_sheet) if sheets else None
+        for label, png in _render(render, rows, window):
+            count += 1
+            name = _safe_name(label)
+            if name in used_names:
+                name = f"{name}_{len(used_names)}"
+            used_names.add(name)
+            archive.writestr(f"qr/{name}.png", png)
+            if composer:
+                composer.add(label, png)
+
+        if composer:
+            composer.finish()
+
+    return count
+
+
+async def generate_batch_async(path: str, bot_username: str = None, qr_id_column: str = None,
+                               workers: int = 0) -> tuple:
+    """
+    Для бота: вся работа в отдельном потоке, цикл событий не блокируется. Рендер - в том же потоке,
+    без пула процессов: fork процесса бота, где уже работают потоки (логирование, aiohttp, executor),
+    может зависнуть на захваченной блокировке, а spawn заново импортировал бы main с настройкой логов.
+    Пул процессов - у командной строки (python -m services.qr_batch).
+    """
+    def run():
+        buffer = io.BytesIO()
+        count = generate_batch(
+            iter_sheet_rows(path, qr_id_column=qr_id_column, bot_username=bot_username), buffer, workers
+        )
+        return count, buffer.getvalue()
+
+    return await asyncio.get_running_loop().run_in_executor(None, run)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('xlsx', nargs='?', default='QR_spisok.xlsx')
+    parser.add_argument('-o', '--output', default='qr_codes.zip')
+    parser.add_argument('--link-column', default=LINK_COLUMN)
+    parser.add_argument('--label-column', default=LABEL_COLUMN)
+    parser.add_argument('--qr-id-column', help='колонка с qr_id постов: кодировать диплинк бота вместо ссылки')
+    parser.add_argument('--bot', default=os.getenv('BOT_USERNAME', 'vershiny_rossii_bot'))
+    parser.add_argument('--workers', type=int, default=None, help='число процессов (по умолчанию - по числу ядер)')
+    parser.add_argument('--no-sheets', action='store_true', help='только PNG, без листов для печати')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    rows = iter_sheet_rows(args.xlsx, args.link_column, args.label_column, args.qr_id_column, args.bot)
+    count = generate_batch(rows, args.output, args.workers, sheets=not args.no_sheets)
+    elapsed = time.perf_counter() - started
+    print(f"QR-кодов: {count} -> {args.output} за {elapsed:.2f} с ({count / elapsed:.0f} шт./с)")
+
+
+if __name__ == "__main__":
+    main()
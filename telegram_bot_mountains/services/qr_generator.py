@@ -1,3 +1,76 @@
+import asyncio
+import io
+from collections import OrderedDict
+from urllib.parse import quote_plus
+
+import qrcode
+from PIL import Image
+
+
+def qr_deep_link(bot_username: str, qr_id: str) -> str:
+    """Ссылка, которую кодирует QR поста: /start mountain:<qr_id>"""
+    return f"https://t.me/{bot_username}?start={quote_plus(f'mountain:{qr_id}')}"
+
+
+def render_qr_png(data: str, box_size: int = 10, border: int = 4) -> bytes:
+    """Рисует QR-код и возвращает PNG в байтах (функция верхнего уровня - годится для ProcessPoolExecutor)"""
+    qr = qrcode.QRCode(version=1, box_size=box_size, border=border)
+    qr.add_data(data)
+    qr.make()
+    img = qr.make_image(fill_color="black", back_color="white")
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class QRRenderCache:
+    """
+    Рендер QR-кодов вне цикла событий с LRU-кэшем PNG по содержимому (диплинку)
+    и запоминанием file_id Telegram после первой отправки.
+    """
+
+    def __init__(self, max_items: int = 256, executor=None):
+        self.max_items = max_items
+        self.executor = executor # None - стандартный пул потоков цикла событий
+        self._png = OrderedDict()
+        self._file_ids = OrderedDict()
+        self._pending = {}
+
+    async def render(self, data: str) -> bytes:
+        png = self._png.get(data)
+        if png is not None:
+            self._png.move_to_end(data)
+            return png
+
+        # Одинаковые запросы во время рендера ждут один и тот же результат
+        future = self._pending.get(data)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(self.executor, render_qr_png, data)
+            self._pending[data] = future
+            try:
+                png = await future
+            finally:
+                self._pending.pop(data, None)
+            self._remember(self._png, data, png)
+            return png
+        return await asyncio.shield(future)
+
+    def get_file_id(self, data: str):
+        file_id = self._file_ids.get(data)
+        if file_id is not None:
+            self._file_ids.move_to_end(data)
+        return file_id
+
+    def remember_file_id(self, data: str, file_id: str):
+        self._remember(self._file_ids, data, file_id)
+
+    def _remember(self, store, key, value):
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > self.max_items:
+            store.popitem(last=False)
+
+
 class QRCodeService:
     @staticmethod
     def generate_qr_with_logo(data, logo_path):
@@ -14,4 +87,4 @@ class QRCodeService:
                (qr_image.size[1] - logo.size[1]) // 2)
         qr_image.paste(logo, pos, logo)
         
-        return qr_image
\ No newline at end of file
+        return qr_image
@@ -0,0 +1,146 @@
+import hashlib
+import logging
+import struct
+from collections import OrderedDict
+
+import asyncpg
+
+from database.queries import post_row
+
+logger = logging.getLogger(__name__)
+
+MODE_FTS = 't' # Полнотекстовый поиск по tsvector
+MODE_FUZZY = 'f' # Нечёткий поиск по триграммам (опечатки)
+
+
+def encode_search_cursor(mode: str, rank: float, row_id: int) -> str:
+    """Курсор (режим, rank, id); rank - float4 из Postgres, кодируем его биты без потери точности"""
+    return f"{mode}{struct.pack('>f', rank).hex()}{row_id:x}"
+
+
+def decode_search_cursor(token: str):
+    try:
+        mode, rank_hex, row_id = token[0], token[1:9], token[9:]
+        if mode not in (MODE_FTS, MODE_FUZZY):
+            return None
+        return mode, struct.unpack('>f', bytes.fromhex(rank_hex))[0], int(row_id, 16)
+    except (ValueError, IndexError, struct.error):
+        return None
+
+
+class SearchEngine:
+    """
+    Поиск по новостям и постам: полнотекстовый (tsvector, конфигурация russian, GIN-индексы)
+    с ранжированием по ts_rank и запасным нечётким поиском pg_trgm, если точных совпадений нет.
+    Выдача листается курсором (rank, id).
+    """
+
+    def __init__(self, db, fuzzy_threshold: float = 0.3, max_queries: int = 5000):
+        self.db = db
+        self.fuzzy_threshold = fuzzy_threshold
+        self.fuzzy_enabled = True
+        self.max_queries = max_queries
+        self._queries = OrderedDict() # короткий ключ -> текст запроса, для кнопок "Ещё"
+
+    def remember_query(self, keyword: str) -> str:
+        """Короткий ключ запроса для callback_data (сам текст в 64 байта не помещается)"""
+        key = hashlib.md5(keyword.encode('utf-8')).hexdigest()[:8]
+        self._queries[key] = keyword
+        self._queries.move_to_end(key)
+        if len(self._queries) > self.max_queries:
+            self._queries.popitem(last=False)
+        return key
+
+    def recall_query(self, key: str):
+        return self._queries.get(key)
+
+    async def search_news(self, keyword: str, cursor=None, limit: int = 5):
+        """Возвращает (новости, курсор следующей страницы или None). cursor - строка из предыдущего ответа."""
+        return await self._search(
+            keyword, cursor, limit,
+            fts_query="""
+                SELECT id, telegram_url, news_type, title, ts_rank(search_vector, q) AS rank
+                FROM news, websearch_to_tsquery('russian', $1) q
+                WHERE search_vector @@ q {after}
+                ORDER BY rank DESC, id DESC
+                LIMIT {limit}
+            """,
+            fts_after="AND (ts_rank(search_vector, q), id) < ($2, $3)",
+            fuzzy_query="""
+                SELECT id, telegram_url, news_type, title, similarity(title, $1) AS rank
+                FROM news
+                WHERE title % $1 {after}
+                ORDER BY rank DESC, id DESC
+                LIMIT {limit}
+            """,
+            fuzzy_after="AND (similarity(title, $1), id) < ($2, $3)",
+        )
+
+    async def search_posts(self, keyword: str, cursor=None, limit: int = 10):
+        """Возвращает (активные посты как PostRow, курсор следующей страницы или None)"""
+        rows, next_cursor = await self._search(
+            keyword, cursor, limit,
+            fts_query="""
+                SELECT p.*, ts_rank(p.search_vector, q) AS rank
+                FROM posts p, websearch_to_tsquery('russian', $1) q
+                WHERE p.is_active = TRUE AND p.search_vector @@ q {after}
+                ORDER BY rank DESC, p.id DESC
+                LIMIT {limit}
+            """,
+            fts_after="AND (ts_rank(p.search_vector, q), p.id) < ($2, $3)",
+            fuzzy_query="""
+                SELECT p.*, similarity(p.title, $1) AS rank
+                FROM posts p
+                WHERE p.is_active = TRUE AND p.title % $1 {after}
+                ORDER BY rank DESC, p.id DESC
+                LIMIT {limit}
+            """,
+            fuzzy_after="AND (similarity(p.title, $1), p.id) < ($2, $3)",
+        )
+        return [post_row(row) for row in rows], next_cursor
+
+    async def _search(self, keyword, cursor, limit, fts_query, fts_after, fuzzy_query, fuzzy_after):
+        if cursor:
+            cursor = decode_search_cursor(cursor)
+            if cursor is None:
+                return [], None
+        else:
+            rows = await self._page(MODE_FTS, keyword, None, limit, fts_query, fts_after)
+            if rows or not self.fuzzy_enabled:
+                return self._with_cursor(MODE_FTS, rows, limit)
+            rows = await self._page(MODE_FUZZY, keyword, None, limit, fuzzy_query, fuzzy_after)
+            return self._with_cursor(MODE_FUZZY, rows, limit)
+
+        mode = cursor[0]
+        if mode == MODE_FTS:
+            rows = await self._page(mode, keyword, cursor, limit, fts_query, fts_after)
+        else:
+            rows = await self._page(mode, keyword, cursor, limit, fuzzy_query, fuzzy_after)
+        return self._with_cursor(mode, rows, limit)
+
+    async def _page(self, mode, keyword, cursor, limit, query, after):
+        if cursor is None:
+            sql, args = query.format(after='', limit=limit + 1), (keyword,)
+        else:
+            sql, args = query.format(after=after, limit=limit + 1), (keyword, cursor[1], cursor[2])
+
+        async with self.db.pool.acquire() as conn:
+            if mode == MODE_FUZZY:
+                try:
+                    async with conn.transaction():
+                        await conn.execute(f"SET LOCAL pg_trgm.similarity_threshold = {float(self.fuzzy_threshold)}")
+                        return await conn.fetch(sql, *args)
+                except asyncpg.UndefinedFunctionError as e:
+                    # Расширение pg_trgm может быть недоступно - тогда работаем только с полнотекстовым поиском
+                    logger.warning(f"Нечёткий поиск недоступен: {e}")
+                    self.fuzzy_enabled = False
+                    return []
+            return await conn.fetch(sql, *args)
+
+    @staticmethod
+    def _with_cursor(mode, rows, limit):
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        last = rows[-1]
+        return rows, encode_search_cursor(mode, last['rank'], last['id'])
@@ -0,0 +1,262 @@
+import asyncio
+import logging
+import re
+from array import array
+from bisect import bisect_left, insort
+
+from database.queries import post_row
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r'\w+')
+
+# Окончания для лёгкого стемминга русских слов, от длинных к коротким
+_ENDINGS = sorted((
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ией', 'иях', 'иям',
+    'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ий', 'ый', 'ой', 'ей', 'ам', 'ям', 'ах', 'ях', 'ом', 'ем',
+    'ов', 'ев', 'ия', 'ья', 'ию', 'ью', 'ии', 'ую', 'юю',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+), key=len, reverse=True)
+_MIN_STEM = 3
+
+
+def stem(word: str) -> str:
+    """Отрезает типичное окончание: 'эльбруса' -> 'эльбрус', 'экспедиции' -> 'экспедиц'"""
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text: str):
+    return [stem(word) for word in _WORD_RE.findall((text or '').lower().replace('ё', 'е'))]
+
+
+class _Corpus:
+    """Инвертированный индекс одного вида документов: термин -> отсортированный array('I') id"""
+
+    def __init__(self):
+        self.postings = {}
+        self.docs = {} # id -> данные документа
+        self.doc_terms = {} # id -> термины документа, нужны для удаления
+        self._sorted_terms = None
+
+    def add(self, doc_id: int, text: str, doc):
+        self.remove(doc_id)
+        terms = tuple(set(tokenize(text)))
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                self.postings[term] = array('I', (doc_id,))
+                self._sorted_terms = None
+            else:
+                insort(posting, doc_id)
+        self.docs[doc_id] = doc
+        self.doc_terms[doc_id] = terms
+
+    def remove(self, doc_id: int):
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self.docs.pop(doc_id, None)
+        for term in terms:
+            posting = self.postings[term]
+            i = bisect_left(posting, doc_id)
+            if i < len(posting) and posting[i] == doc_id:
+                del posting[i]
+            if not posting:
+                del self.postings[term]
+                self._sorted_terms = None
+
+    def _prefix_postings(self, prefix: str):
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self.postings)
+        found = []
+        i = bisect_left(self._sorted_terms, prefix)
+        while i < len(self._sorted_terms) and self._sorted_terms[i].startswith(prefix):
+            found.append(self.postings[self._sorted_terms[i]])
+            i += 1
+        if len(found) == 1:
+            return found[0]
+        ids = set()
+        for posting in found:
+            ids.update(posting)
+        return array('I', sorted(ids))
+
+    def search(self, query: str, before_id=None, limit: int = 10):
+        """id документов (новые сверху), содержащих все слова запроса; последнее слово - как префикс"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        lists = [self.postings.get(term) for term in terms[:-1]]
+        if not all(lists):
+            return []
+        lists.append(self._prefix_postings(terms[-1]))
+        lists.sort(key=len)
+
+        # Идём по самому короткому списку от новых к старым и проверяем остальные бинарным поиском
+        shortest, others = lists[0], lists[1:]
+        end = len(shortest) if before_id is None else bisect_left(shortest, before_id)
+        result = []
+        for i in range(end - 1, -1, -1):
+            doc_id = shortest[i]
+            if all(_contains(posting, doc_id) for posting in others):
+                result.append(doc_id)
+                if len(result) >= limit:
+                    break
+        return result
+
+
+def _contains(posting, doc_id: int) -> bool:
+    i = bisect_left(posting, doc_id)
+    return i < len(posting) and posting[i] == doc_id
+
+
+class InMemorySearchIndex:
+    """
+    Поиск по заголовкам новостей и постам в памяти процесса, без обращения к пулу соединений.
+    Строится при запуске и обновляется по уведомлениям news_changed / posts_changed: изменённые id
+    копятся debounce секунд и перечитываются одним запросом WHERE id = ANY($1); если их больше
+    rebuild_threshold (массовый импорт, пересчёт search_vector), индекс строится заново.
+    Интерфейс совпадает с SearchEngine: search_*(keyword, cursor, limit) -> (строки, курсор).
+    """
+
+    def __init__(self, db, events=None, debounce: float = 0.5, rebuild_threshold: int = 5000):
+        self.db = db
+        self.debounce = debounce
+        self.rebuild_threshold = rebuild_threshold
+        self.news = _Corpus()
+        self.posts = _Corpus()
+        self.refreshes = 0
+        self.rebuilds = 0
+        self._pending_news = set()
+        self._pending_posts = set()
+        self._flush_task = None
+        self._rebuilding = False
+        if events is not None:
+            events.subscribe('news_changed', self._on_news_changed)
+            events.subscribe('posts_changed', self._on_posts_changed)
+
+    async def start(self):
+        await self.rebuild()
+        logger.info(f"Поисковый индекс в памяти построен: {len(self.news.docs)} новостей, {len(self.posts.docs)} постов")
+
+    async def stop(self):
+        task, self._flush_task = self._flush_task, None
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def rebuild(self):
+        """Строит индекс заново и подменяет текущий целиком"""
+        news, posts = _Corpus(), _Corpus()
+        self._rebuilding = True
+        try:
+            for row in await self.db.fetch("SELECT id, telegram_url, news_type, title FROM news"):
+                self._add_news(news, row)
+            for row in await self.db.fetch("SELECT * FROM posts WHERE is_active = TRUE"):
+                self._add_post(posts, row)
+        finally:
+            self._rebuilding = False
+        self.news, self.posts = news, posts
+        self.rebuilds += 1
+
+    @staticmethod
+    def _add_news(corpus, row):
+        corpus.add(row['id'], f"{row['title'] or ''} {row['news_type']}",
+                   (row['telegram_url'], row['news_type'], row['title']))
+
+    @staticmethod
+    def _add_post(corpus, row):
+        corpus.add(row['id'], f"{row['title']} {row['description']}", post_row(row))
+
+    async def search_news(self, keyword: str, cursor=None, limit: int = 5):
+        ids, next_cursor = self._page(self.news, keyword, cursor, limit)
+        docs = self.news.docs
+        return [
+            {'id': doc_id, 'telegram_url': docs[doc_id][0], 'news_type': docs[doc_id][1], 'title': docs[doc_id][2]}
+            for doc_id in ids
+        ], next_cursor
+
+    async def search_posts(self, keyword: str, cursor=None, limit: int = 10):
+        ids, next_cursor = self._page(self.posts, keyword, cursor, limit)
+        return [self.posts.docs[doc_id] for doc_id in ids], next_cursor
+
+    @staticmethod
+    def _page(corpus, keyword, cursor, limit):
+        before_id = None
+        if cursor:
+            if not cursor.startswith('i'):
+                return [], None # Курсор от поиска в БД (например, до перезапуска с другим режимом)
+            before_id = int(cursor[1:], 16)
+        ids = corpus.search(keyword, before_id, limit + 1)
+        if len(ids) > limit:
+            return ids[:limit], f"i{ids[limit - 1]:x}"
+        return ids, None
+
+    @property
+    def stats(self) -> dict:
+        return {'news': len(self.news.docs), 'posts': len(self.posts.docs),
+                'refreshes': self.refreshes, 'rebuilds': self.rebuilds}
+
+    # Триггеры миграции 0002 шлют уведомление на каждую строку: здесь только запоминаем id
+    def _on_news_changed(self, payload: dict):
+        self._changed(self.news, self._pending_news, payload)
+
+    def _on_posts_changed(self, payload: dict):
+        self._changed(self.posts, self._pending_posts, payload)
+
+    def _changed(self, corpus, pending, payload: dict):
+        doc_id = payload.get('id')
+        if doc_id is None:
+            return
+        if payload.get('op') == 'DELETE':
+            corpus.remove(doc_id)
+            if not self._rebuilding: # Иначе строка могла попасть в новый индекс - перечитаем после подмены
+                pending.discard(doc_id)
+                return
+        pending.add(doc_id)
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush())
+
+    async def _flush(self):
+        try:
+            await asyncio.sleep(self.debounce)
+            while self._pending_news or self._pending_posts:
+                news, self._pending_news = self._pending_news, set()
+                posts, self._pending_posts = self._pending_posts, set()
+                if len(news) + len(posts) > self.rebuild_threshold:
+                    await self.rebuild()
+                    logger.info(f"Поисковый индекс перестроен после {len(news) + len(posts)} изменений")
+                    continue
+                await self._refresh(news, posts)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка обновления поискового индекса: {e}")
+        finally:
+            if self._flush_task is asyncio.current_task():
+                self._flush_task = None
+
+    async def _refresh(self, news, posts):
+        if news:
+            for row in await self.db.fetch(
+                    "SELECT id, telegram_url, news_type, title FROM news WHERE id = ANY($1::int[])", list(news)):
+                self._add_news(self.news, row)
+                news.discard(row['id'])
+            for news_id in news: # Удалены раньше, чем дошла очередь
+                self.news.remove(news_id)
+        if posts:
+            for row in await self.db.fetch("SELECT * FROM posts WHERE id = ANY($1::int[])", list(posts)):
+                if row['is_active']:
+                    self._add_post(self.posts, row)
+                else:
+                    self.posts.remove(row['id'])
+                posts.discard(row['id'])
+            for post_id in posts:
+                self.posts.remove(post_id)
+        self.refreshes += 1
@@ -0,0 +1,31 @@
+"""
+Горячие запросы идут по индексам миграций (0002, 0008): миграции применяются к БД из DB_* окружения,
+затем EXPLAIN каждого запроса из HOT_QUERIES должен содержать один из ожидаемых индексов.
+Нужен Postgres (отдельная тестовая база): без DB_HOST и DB_NAME тест пропускается.
+"""
+import asyncio
+import os
+
+import pytest
+
+from database.migrate import HOT_QUERIES, hot_query_plans, migrate
+from database.postgres_VR2 import Database
+
+pytestmark = pytest.mark.skipif(not (os.getenv('DB_HOST') and os.getenv('DB_NAME')),
+                                reason="нет БД: задайте DB_HOST, DB_NAME, DB_USER, DB_PASSWORD, DB_PORT")
+
+
+def test_hot_queries_use_indexes():
+    async def scenario():
+        db = Database.from_env()
+        await db.connect()
+        try:
+            await migrate(db)
+            return await hot_query_plans(db)
+        finally:
+            await db.disconnect()
+
+    plans = asyncio.run(scenario())
+    assert [title for title, _, _ in plans] == [title for title, *_ in HOT_QUERIES]
+    for title, used, expected in plans:
+        assert used & set(expected), f"{title}: в плане {sorted(used) or 'нет индексов'}, ожидался один из {expected}"
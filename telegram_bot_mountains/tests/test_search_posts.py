@@ -0,0 +1,114 @@
+"""Поиск постов: оба движка отдают PostRow, единственный результат открывается карточкой поста"""
+import asyncio
+from dataclasses import asdict
+
+from benchmarks.bench_handlers import make_app, message
+from database.queries import PostRow
+from services.search import SearchEngine
+
+
+class _Connection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def fetch(self, sql, *args):
+        return self.rows
+
+
+class _Acquire:
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def __aenter__(self):
+        return self.conn
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _Pool:
+    def __init__(self, rows):
+        self.conn = _Connection(rows)
+
+    def acquire(self):
+        return _Acquire(self.conn)
+
+
+class _DB:
+    def __init__(self, rows):
+        self.pool = _Pool(rows)
+
+
+def _spy_show_post(app):
+    shown = []
+    show_post = app.show_post
+
+    async def spy(msg, post):
+        shown.append(post)
+        await show_post(msg, post)
+
+    app.show_post = spy
+    return shown
+
+
+def test_index_single_result_opens_post():
+    async def scenario():
+        app = await make_app()
+        shown = _spy_show_post(app)
+        await app.search_posts(message(app, '#7'), '#7')
+        await app.bot.session.close()
+        return app, shown
+
+    app, shown = asyncio.run(scenario())
+    assert len(shown) == 1
+    assert isinstance(shown[0], PostRow)
+    assert shown[0].qr_id == 'post-0007'
+    assert app.bot.session.requests['SendPhoto'] == 1
+
+
+def test_engine_returns_post_rows():
+    post = PostRow(7, 'post-0007', 'Эльбрус #7', 'Описание', 'https://example.com/7.jpg', None, True, None)
+    record = dict(asdict(post), search_vector="'эльбрус':1", rank=0.5)
+
+    async def scenario():
+        app = await make_app()
+        app.search_index = None
+        app.search_engine = SearchEngine(_DB([record]))
+        shown = _spy_show_post(app)
+        rows, cursor = await app.search_engine.search_posts('эльбрус')
+        await app.search_posts(message(app, 'эльбрус'), 'эльбрус')
+        await app.bot.session.close()
+        return rows, cursor, shown
+
+    rows, cursor, shown = asyncio.run(scenario())
+    assert rows == [post] and cursor is None
+    assert shown == [post]
+
+
+def test_post_buttons_survive_separator_in_qr_id():
+    qr_ids = ('elbrus:north', 'post-0002', 'эльбрус:' + 'ё' * 20) # Последний не помещается даже в старом формате
+    records = [dict(asdict(PostRow(i, qr_id, f"Эльбрус {i}", 'Описание', None, None, True, None)),
+                    search_vector="'эльбрус':1", rank=0.5) for i, qr_id in enumerate(qr_ids, 1)]
+
+    async def scenario():
+        app = await make_app()
+        app.search_index = None
+        app.search_engine = SearchEngine(_DB(records))
+        sent = []
+        make_request = app.bot.session.make_request
+
+        async def spy(bot, method, timeout=None):
+            sent.append(method)
+            return await make_request(bot, method, timeout)
+
+        app.bot.session.make_request = spy
+        await app.search_posts(message(app, 'эльбрус'), 'эльбрус')
+        await app.bot.session.close()
+        return app, sent
+
+    app, sent = asyncio.run(scenario())
+    assert len(sent) == 1
+    buttons = [button.callback_data for row in sent[0].reply_markup.inline_keyboard for button in row]
+    opened = [app.callbacks.resolve(data)[1] for data in buttons if app.callbacks.resolve(data)[0] is not None]
+    assert [data.qr_id for data in opened if hasattr(data, 'qr_id')] == ['elbrus:north', 'post-0002']
+    assert "Эльбрус 3" in sent[0].text # Пост без кнопки остаётся в списке
@@ -0,0 +1,23 @@
+"""Курсоры для keyset-пагинации новостей."""
+from datetime import datetime, timedelta
+
+# Направления навигации в callback_data
+NAV_FORWARD = "n"
+NAV_BACKWARD = "p"
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def encode_cursor(created_at: datetime, news_id: int) -> str:
+    """Кодирует позицию (created_at, id) в короткую строку для callback_data"""
+    micros = (created_at.replace(tzinfo=None) - _EPOCH) // timedelta(microseconds=1)
+    return f"{micros:x}.{news_id:x}"
+
+
+def decode_cursor(token: str):
+    """Разбирает строку курсора обратно в (created_at, id). Возвращает None, если курсор битый."""
+    try:
+        micros, news_id = token.split(".", 1)
+        return _EPOCH + timedelta(microseconds=int(micros, 16)), int(news_id, 16)
+    except (ValueError, OverflowError):
+        return None